@@ -1,7 +1,38 @@
 # -*- coding: utf-8 -*-
-"""Shared configuration defaults for Word Formatter Pro."""
+"""Shared configuration defaults for Word Formatter Pro.
 
-from wfp_core import DEFAULT_BLANK_LINE_MODE
+Option values live here rather than in wfp_core so the CLI can parse
+arguments and show configuration without importing python-docx.
+"""
+
+BLANK_LINE_MODE_PRESERVE = '不改动任何空行'
+BLANK_LINE_MODE_DELETE_SINGLE = '删除单个空行，多个空行保留至1个空行'
+BLANK_LINE_MODE_KEEP_SINGLE = '保留单个空行，多个空行保留至1个空行'
+BLANK_LINE_MODE_OPTIONS = [
+    BLANK_LINE_MODE_PRESERVE,
+    BLANK_LINE_MODE_DELETE_SINGLE,
+    BLANK_LINE_MODE_KEEP_SINGLE,
+]
+DEFAULT_BLANK_LINE_MODE = BLANK_LINE_MODE_DELETE_SINGLE
+SUPPORTED_FILE_EXTENSIONS = ('.docx', '.doc', '.wps', '.txt', '.md')
+OUTPUT_COMPRESSION_STORE = 'store'
+OUTPUT_COMPRESSION_FAST = 'fast'
+OUTPUT_COMPRESSION_DEFAULT = 'default'
+OUTPUT_COMPRESSION_MAX = 'max'
+OUTPUT_COMPRESSION_OPTIONS = (
+    OUTPUT_COMPRESSION_STORE, OUTPUT_COMPRESSION_FAST, OUTPUT_COMPRESSION_DEFAULT, OUTPUT_COMPRESSION_MAX,
+)
+DEFAULT_OUTPUT_COMPRESSION = OUTPUT_COMPRESSION_DEFAULT
+FORMAT_ENGINE_DOCX = 'python-docx'
+FORMAT_ENGINE_LXML = 'lxml'
+FORMAT_ENGINES = (FORMAT_ENGINE_DOCX, FORMAT_ENGINE_LXML)
+DEFAULT_FORMAT_ENGINE = FORMAT_ENGINE_DOCX
+# 'cell' writes w:tcBorders on every cell as well as w:tblBorders; 'table'
+# keeps cell borders only where the table style or a row overrides the table.
+TABLE_BORDER_MODE_CELL = 'cell'
+TABLE_BORDER_MODE_TABLE = 'table'
+TABLE_BORDER_MODES = (TABLE_BORDER_MODE_CELL, TABLE_BORDER_MODE_TABLE)
+DEFAULT_TABLE_BORDER_MODE = TABLE_BORDER_MODE_CELL
 
 FONT_SIZE_MAP = {
     '一号 (26pt)': 26, '小一 (24pt)': 24, '二号 (22pt)': 22, '小二 (18pt)': 18,
@@ -28,6 +59,9 @@ DEFAULT_CONFIG = {
     'table_row_height_cm': 0.7, 'table_auto_col_width': True, 'table_width_percent': 100,
     'table_header_bold': True, 'table_smart_align': False,
     'table_unified_borders': True, 'table_border_size_pt': 0.5,
+    'table_border_mode': DEFAULT_TABLE_BORDER_MODE,
+    'format_engine': DEFAULT_FORMAT_ENGINE, 'streaming_mode': False,
+    'output_compression': DEFAULT_OUTPUT_COMPRESSION,
 }
 
 PRESET_FONT_OPTIONS = {
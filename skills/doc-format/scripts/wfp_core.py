@@ -6,29 +6,76 @@ can reuse the same formatter implementation. This copy is maintained with the
 main release.
 """
 
+import bisect
+from collections import Counter, deque
+import contextlib
+from copy import deepcopy
+import functools
+import hashlib
+import io
 import logging
+import math
 import os
 from pathlib import Path
 import re
 import shutil
+import struct
 import subprocess
 import sys
 import tempfile
+import threading
+import time
+import tracemalloc
 import uuid
+import zipfile
+from xml.sax.saxutils import escape as xml_escape
 
 
 from docx import Document
+from lxml import etree
 from docx.document import Document as _Document
 from docx.enum.table import WD_ROW_HEIGHT_RULE
 from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_LINE_SPACING
-from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.oxml import serialize_part_xml
+from docx.opc.packuri import PACKAGE_URI
+from docx.opc.pkgwriter import PackageWriter
+from docx.oxml import OxmlElement, parse_xml
+from docx.oxml.ns import nsdecls, qn
+from docx.oxml.ns import nsmap
+from docx.oxml.parser import element_class_lookup as oxml_element_class_lookup
+from docx.oxml.simpletypes import ST_HpsMeasure, ST_OnOff, ST_SignedTwipsMeasure, ST_TwipsMeasure
 from docx.oxml.table import CT_Tbl
 from docx.oxml.text.paragraph import CT_P
-from docx.shared import Pt, Cm, RGBColor
+from docx.shared import Pt, Cm, Length
 from docx.table import Table, _Cell
+from docx.text.font import Font
 from docx.text.paragraph import Paragraph
-
+from docx.text.parfmt import ParagraphFormat
+
+from wfp_config import (
+    BLANK_LINE_MODE_DELETE_SINGLE,
+    BLANK_LINE_MODE_KEEP_SINGLE,
+    BLANK_LINE_MODE_OPTIONS,
+    BLANK_LINE_MODE_PRESERVE,
+    DEFAULT_BLANK_LINE_MODE,
+    DEFAULT_FORMAT_ENGINE,
+    DEFAULT_OUTPUT_COMPRESSION,
+    DEFAULT_TABLE_BORDER_MODE,
+    FORMAT_ENGINE_DOCX,
+    FORMAT_ENGINE_LXML,
+    FORMAT_ENGINES,
+    OUTPUT_COMPRESSION_DEFAULT,
+    OUTPUT_COMPRESSION_FAST,
+    OUTPUT_COMPRESSION_MAX,
+    OUTPUT_COMPRESSION_OPTIONS,
+    OUTPUT_COMPRESSION_STORE,
+    SUPPORTED_FILE_EXTENSIONS,
+    TABLE_BORDER_MODE_CELL,
+    TABLE_BORDER_MODE_TABLE,
+    TABLE_BORDER_MODES,
+)
+
 
 IS_WINDOWS = sys.platform.startswith('win')
 IS_LINUX = sys.platform.startswith('linux')
@@ -47,20 +94,34 @@ else:
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-BLANK_LINE_MODE_PRESERVE = '不改动任何空行'
-BLANK_LINE_MODE_DELETE_SINGLE = '删除单个空行，多个空行保留至1个空行'
-BLANK_LINE_MODE_KEEP_SINGLE = '保留单个空行，多个空行保留至1个空行'
-BLANK_LINE_MODE_OPTIONS = [
-    BLANK_LINE_MODE_PRESERVE,
-    BLANK_LINE_MODE_DELETE_SINGLE,
-    BLANK_LINE_MODE_KEEP_SINGLE,
-]
-DEFAULT_BLANK_LINE_MODE = BLANK_LINE_MODE_DELETE_SINGLE
-SUPPORTED_FILE_EXTENSIONS = ('.docx', '.doc', '.wps', '.txt', '.md')
 LARGE_FOLDER_FILE_CONFIRM_THRESHOLD = 1000
 
 RE_SAFE_FILENAME_CHARS = re.compile(r'[<>:"/\\|?*\x00-\x1f]+')
 RE_HAS_CHINESE = re.compile(r'[\u4e00-\u9fff]')
+RE_NON_SPACE = re.compile(r'\S')
+# Character classes for _normalize_symbols_in_text. Dot runs are matched
+# whole so the ellipsis rule can see their length.
+SYMBOL_DOTS = '.．。'
+SYMBOL_SIMPLE = {',': '，', '.': '。', '．': '。', ';': '；', ':': '：', '?': '？', '!': '！'}
+SYMBOL_BRACKET_KINDS = ('paren', 'square')
+SYMBOL_BRACKET_OPEN = {'(': ('paren', '（'), '（': ('paren', '（'), '[': ('square', '［'), '［': ('square', '［')}
+SYMBOL_BRACKET_CLOSE = {')': ('paren', '）'), '）': ('paren', '）'), ']': ('square', '］'), '］': ('square', '］')}
+SYMBOL_QUOTES = {
+    '"': 'double', '“': 'double', '”': 'double', '„': 'double', '‟': 'double', '「': 'double', '」': 'double',
+    "'": 'single', '‘': 'single', '’': 'single', '‚': 'single', '‛': 'single',
+}
+SYMBOL_QUOTE_MARKS = {'double': ('“', '”'), 'single': ('‘', '’')}
+RE_SYMBOL_CANDIDATE = re.compile(
+    '[' + re.escape(SYMBOL_DOTS) + ']+|['
+    + re.escape(''.join(sorted({*SYMBOL_SIMPLE, *SYMBOL_BRACKET_OPEN, *SYMBOL_BRACKET_CLOSE, *SYMBOL_QUOTES})))
+    + ']'
+)
+# Text without a match is left unchanged by _normalize_symbols_in_text:
+# full-width brackets only change when paired with an ASCII one, and '。'
+# only in runs of three or more.
+RE_SYMBOL_PRECHECK = re.compile(
+    '[' + re.escape(''.join(sorted({*SYMBOL_SIMPLE, '(', ')', '[', ']', *SYMBOL_QUOTES}))) + ']|。。。'
+)
 RE_MD_IMAGE = re.compile(r'!\[([^\]]*)\]\([^)]+\)')
 RE_MD_LINK = re.compile(r'\[([^\]]+)\]\([^)]+\)')
 RE_MD_HTML_TAG = re.compile(r'<[^>]+>')
@@ -86,23 +147,490 @@ RE_HEADING_H3 = re.compile(r'^\d+\s*[\.．]')
 RE_HEADING_H4 = re.compile(r'^[（\(]\d+[）\)]')
 RE_ATTACHMENT = re.compile(r'^附件\s*(\d+|[一二三四五六七八九十百千万零]+)?\s*[:：]?$')
 RE_H2_INLINE_TITLE = re.compile(r'^[（\(](.+?)[）\)](.*)', re.DOTALL)
+# Per-document summary categories, in the order they are reported.
+FORMAT_STAT_LABELS = (
+    '主标题', '副标题', '附件标识', '附件标题', '附件副标题', '一级标题', '二级标题',
+    '三级标题', '四级标题', '正文', '图片/嵌入对象', '图表标题', '表格', '空白',
+)
+TEXT_ROLE_STAT_LABELS = {
+    'blank': '空白', 'title': '主标题', 'attachment': '附件标识', 'attachment_title': '附件标题',
+    'h1': '一级标题', 'h2': '二级标题', 'h2_split': '二级标题', 'h3': '三级标题', 'h4': '四级标题',
+    'body': '正文',
+}
+# Formatting phases timed per document (WordProcessor.last_timings), in report order.
+TIMING_PHASES = (
+    'convert', 'soffice', 'preprocess', 'parse', 'normalize_symbols', 'caption_scan',
+    'title_detection', 'paragraphs', 'tables', 'page_setup', 'save',
+)
+RE_DIRECT_TEXT_UNSAFE = re.compile(r'[\x00-\x08\x0b-\x1f]')
+RE_XML_START_TAG_NAME = re.compile(rb'<[^\s/>]+')
+STREAM_BODY_PLACEHOLDER = 'wfp-stream-body'
+# Zip compression method and zlib level of the saved .docx per output_compression.
+OUTPUT_COMPRESSION_ZIP_ARGS = {
+    OUTPUT_COMPRESSION_STORE: (zipfile.ZIP_STORED, None),
+    OUTPUT_COMPRESSION_FAST: (zipfile.ZIP_DEFLATED, 1),
+    OUTPUT_COMPRESSION_DEFAULT: (zipfile.ZIP_DEFLATED, None),
+    OUTPUT_COMPRESSION_MAX: (zipfile.ZIP_DEFLATED, 9),
+}
+RE_XMLNS_DECL = re.compile(r'\s+xmlns(?::\w+)?="[^"]*"')
 
 
 class LegacyConversionUnavailable(RuntimeError):
     """Raised when an old Word/WPS file is intentionally skipped."""
 
 
+class SofficeTimeoutError(RuntimeError):
+    """Raised when a LibreOffice conversion does not finish within its timeout."""
+
+
+class SofficeStartupTimeoutError(SofficeTimeoutError):
+    """Raised when the persistent LibreOffice does not accept a connection in time."""
+
+
+class PhaseTimer:
+    """Wall-clock and CPU seconds spent in each named phase of one document.
+
+    Phases nest; time inside an inner phase is charged to that phase only,
+    so the phase totals never count the same second twice. With
+    ``record_spans`` every phase entry is also kept in ``spans`` as
+    ``(name, start, end)`` in ``time.perf_counter()`` seconds; a
+    MemoryTracker ``memory`` is told when each outermost phase starts and ends.
+    """
+
+    def __init__(self, record_spans=False, memory=None):
+        self._spent = {}
+        self._stack = []
+        self._started = self._mark = (time.perf_counter(), time.process_time())
+        self.spans = [] if record_spans else None
+        self.memory = memory
+
+    def _charge(self):
+        now = (time.perf_counter(), time.process_time())
+        if self._stack:
+            spent = self._spent.setdefault(self._stack[-1], [0.0, 0.0])
+            spent[0] += now[0] - self._mark[0]
+            spent[1] += now[1] - self._mark[1]
+        self._mark = now
+        return now
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        outermost = self.memory is not None and not self._stack
+        if outermost:
+            self.memory.enter(name)
+        start = self._charge()[0]
+        self._stack.append(name)
+        try:
+            yield
+        finally:
+            end = self._charge()[0]
+            self._stack.pop()
+            if self.spans is not None:
+                self.spans.append((name, start, end))
+            if outermost:
+                self.memory.exit(name)
+
+    def timings(self):
+        """``{phase: {'wall': s, 'cpu': s}}`` for the phases entered so far, plus ``'total'`` since creation."""
+        now = self._charge()
+        order = {name: i for i, name in enumerate(TIMING_PHASES)}
+        result = {
+            name: {'wall': round(wall, 6), 'cpu': round(cpu, 6)}
+            for name, (wall, cpu) in sorted(self._spent.items(), key=lambda item: order.get(item[0], len(order)))
+        }
+        result['total'] = {'wall': round(now[0] - self._started[0], 6), 'cpu': round(now[1] - self._started[1], 6)}
+        return result
+
+
+def summarize_timings(timings):
+    """p50/p95/max per phase over a batch of ``WordProcessor.last_timings`` dicts.
+
+    A phase a document never entered counts as zero for that document.
+    Returns ``{phase: {'wall': {'p50', 'p95', 'max'}, 'cpu': {...}}}``.
+    """
+    timings = [t for t in timings if t]
+    names = [name for name in TIMING_PHASES + ('total',) if any(name in t for t in timings)]
+    names += sorted({name for t in timings for name in t} - set(names))
+    summary = {}
+    for name in names:
+        summary[name] = {}
+        for clock in ('wall', 'cpu'):
+            values = sorted(t.get(name, {}).get(clock, 0.0) for t in timings)
+            summary[name][clock] = {
+                'p50': values[max(0, math.ceil(0.50 * len(values)) - 1)],
+                'p95': values[max(0, math.ceil(0.95 * len(values)) - 1)],
+                'max': values[-1],
+            }
+    return summary
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or None where it cannot be read."""
+    if IS_LINUX:
+        try:
+            with open('/proc/self/status', encoding='ascii') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError):
+            pass
+    if IS_WINDOWS:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                    'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage',
+                )
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        if ctypes.windll.psapi.GetProcessMemoryInfo(
+                ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+        return None
+    try:
+        import resource
+    except ImportError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def reset_peak_rss():
+    """Reset the peak RSS to the current RSS where the OS allows it (Linux); returns whether it did."""
+    if not IS_LINUX:
+        return False
+    try:
+        with open('/proc/self/clear_refs', 'w', encoding='ascii') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+class MemoryTracker:
+    """Peak memory of each phase of one document, for ``format --memory-report``.
+
+    tracemalloc gives the Python-heap peak per phase and the top allocation
+    sites at the document's largest phase-end heap. libxml2 trees are
+    allocated outside Python, so the peak RSS is recorded as well; it is
+    reset per phase on Linux and is the process-lifetime peak elsewhere.
+    """
+
+    TOP_SITES = 10
+
+    def __init__(self):
+        self.phases = {}
+        self._snapshot = None
+        self._snapshot_size = -1
+        self._rss_per_phase = False
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+
+    def enter(self, name):
+        tracemalloc.reset_peak()
+        self._rss_per_phase = reset_peak_rss()
+
+    def exit(self, name):
+        current, traced_peak = tracemalloc.get_traced_memory()
+        phase = self.phases.setdefault(name, {'rss_peak': None, 'traced_peak': 0})
+        phase['traced_peak'] = max(phase['traced_peak'], traced_peak)
+        rss = peak_rss()
+        if rss is not None:
+            phase['rss_peak'] = max(phase['rss_peak'] or 0, rss)
+        if current > self._snapshot_size:
+            self._snapshot = tracemalloc.take_snapshot()
+            self._snapshot_size = current
+
+    def report(self):
+        """Stop tracing and return ``{'rss_peak', 'traced_peak', 'rss_per_phase', 'phases', 'top'}``."""
+        if self._started_tracing:
+            tracemalloc.stop()
+        top = []
+        if self._snapshot is not None:
+            snapshot = self._snapshot.filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            ))
+            for stat in snapshot.statistics('lineno')[:self.TOP_SITES]:
+                frame = stat.traceback[0]
+                top.append({'site': f'{frame.filename}:{frame.lineno}', 'size': stat.size, 'count': stat.count})
+        rss_peaks = [phase['rss_peak'] for phase in self.phases.values() if phase['rss_peak'] is not None]
+        return {
+            'rss_peak': max(rss_peaks, default=None),
+            'traced_peak': max((phase['traced_peak'] for phase in self.phases.values()), default=0),
+            'rss_per_phase': self._rss_per_phase,
+            'phases': self.phases,
+            'top': top,
+        }
+
+
+def _soffice_creationflags():
+    if os.name == "nt" and hasattr(subprocess, "CREATE_NO_WINDOW"):
+        return subprocess.CREATE_NO_WINDOW
+    return 0
+
+
+def _soffice_profile_arg(profile_dir):
+    profile_uri = Path(profile_dir).resolve().as_posix()
+    if os.name == "nt":
+        profile_uri = "/" + profile_uri
+    return f"-env:UserInstallation=file://{profile_uri}"
+
+
+class SofficeServer:
+    """Long-lived headless LibreOffice instance driven over the UNO bridge.
+
+    One ``soffice`` process is started with a named-pipe listener and reused for
+    every conversion. A dead or unresponsive instance is restarted on the next
+    request, and a conversion exceeding ``timeout`` kills the instance so the
+    caller sees the same timeout error as with one-shot launches.
+    """
+
+    FILTER_NAME = "MS Word 2007 XML"
+
+    def __init__(self, soffice_path, timeout=120, startup_timeout=60):
+        self.soffice_path = soffice_path
+        self.timeout = int(timeout or 120)
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self.work_dir = None
+        self.desktop = None
+        self.restarts = 0
+
+    @staticmethod
+    def uno_available():
+        try:
+            import uno  # noqa: F401  LibreOffice's Python-UNO bridge is optional.
+        except ImportError:
+            return False
+        return True
+
+    @staticmethod
+    def _props(**values):
+        from com.sun.star.beans import PropertyValue
+
+        props = []
+        for name, value in values.items():
+            prop = PropertyValue()
+            prop.Name = name
+            prop.Value = value
+            props.append(prop)
+        return tuple(props)
+
+    def start(self, log=None):
+        import uno
+        from com.sun.star.connection import NoConnectException
+
+        self.work_dir = Path(tempfile.mkdtemp(prefix="wfp_soffice_server_"))
+        profile_dir = self.work_dir / "profile"
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        pipe_name = f"wfp_soffice_{os.getpid()}_{uuid.uuid4().hex[:8]}"
+        cmd = [
+            self.soffice_path,
+            "--headless",
+            "--invisible",
+            "--norestore",
+            "--nologo",
+            "--nodefault",
+            "--nolockcheck",
+            _soffice_profile_arg(profile_dir),
+            f"--accept=pipe,name={pipe_name};urp;StarOffice.ComponentContext",
+        ]
+        if log:
+            log("  > 正在启动常驻 LibreOffice 转换服务...")
+        try:
+            self.process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                creationflags=_soffice_creationflags(),
+            )
+        except FileNotFoundError as exc:
+            self.stop()
+            raise RuntimeError(f"找不到 soffice 可执行文件: {self.soffice_path}") from exc
+
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver", local_context
+        )
+        deadline = time.monotonic() + self.startup_timeout
+        while True:
+            if self.process.poll() is not None:
+                code = self.process.returncode
+                self.stop()
+                raise RuntimeError(f"常驻 LibreOffice 启动失败，进程已退出 (返回码 {code})。")
+            try:
+                context = resolver.resolve(
+                    f"uno:pipe,name={pipe_name};urp;StarOffice.ComponentContext"
+                )
+                break
+            except NoConnectException:
+                if time.monotonic() > deadline:
+                    self.stop()
+                    raise SofficeStartupTimeoutError(f"常驻 LibreOffice 启动超时 ({self.startup_timeout}s)。")
+                time.sleep(0.25)
+
+        self.desktop = context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.frame.Desktop", context
+        )
+        if log:
+            log(f"  > 常驻 LibreOffice 已就绪 (pid {self.process.pid})。")
+
+    def is_healthy(self):
+        if self.process is None or self.process.poll() is not None or self.desktop is None:
+            return False
+        try:
+            self.desktop.getFrames()
+        except Exception:
+            return False
+        return True
+
+    def ensure_running(self, log=None):
+        if self.is_healthy():
+            return
+        if self.process is not None:
+            self.restarts += 1
+            if log:
+                log("  > 常驻 LibreOffice 已失去响应，正在重启...")
+            self.stop()
+        self.start(log)
+
+    def _convert_once(self, input_path, output_path):
+        import uno
+
+        result = {}
+
+        def worker():
+            try:
+                doc = self.desktop.loadComponentFromURL(
+                    uno.systemPathToFileUrl(str(input_path)),
+                    "_blank",
+                    0,
+                    self._props(Hidden=True, ReadOnly=True),
+                )
+                if doc is None:
+                    raise RuntimeError("LibreOffice 无法打开该文件")
+                try:
+                    doc.storeToURL(
+                        uno.systemPathToFileUrl(str(output_path)),
+                        self._props(FilterName=self.FILTER_NAME, Overwrite=True),
+                    )
+                finally:
+                    doc.close(True)
+            except Exception as exc:
+                result["error"] = exc
+
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        thread.join(self.timeout)
+        if thread.is_alive():
+            self.stop()
+            raise SofficeTimeoutError(f"LibreOffice 转换超时 ({self.timeout}s): {input_path}")
+        if "error" in result:
+            raise result["error"]
+
+    def convert(self, input_path, output_path, log=None):
+        self.ensure_running(log)
+        try:
+            self._convert_once(input_path, output_path)
+        except SofficeTimeoutError:
+            # The instance was stopped on the timeout; a retry would only time out again.
+            raise
+        except Exception:
+            if self.is_healthy():
+                raise
+            # The instance crashed mid-conversion: restart once and retry.
+            self.ensure_running(log)
+            self._convert_once(input_path, output_path)
+
+    def stop(self):
+        if self.desktop is not None:
+            try:
+                self.desktop.terminate()
+            except Exception:
+                pass
+            self.desktop = None
+        if self.process is not None:
+            if self.process.poll() is None:
+                self.process.terminate()
+                try:
+                    self.process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+                    self.process.wait()
+            self.process = None
+        if self.work_dir is not None:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+            self.work_dir = None
+
+
 class SofficeConverter:
-    """LibreOffice wrapper for converting legacy .doc/.wps files to .docx."""
+    """LibreOffice wrapper for converting legacy .doc/.wps files to .docx.
+
+    With ``persistent=True`` the converter keeps one LibreOffice instance alive
+    for the whole batch (via :class:`SofficeServer` when Python-UNO is
+    importable), or at least reuses one warmed-up profile directory for every
+    one-shot launch. Call :meth:`close` when the batch is done.
+    """
 
-    def __init__(self, soffice_path=None, timeout=120):
+    def __init__(self, soffice_path=None, timeout=120, persistent=False):
         self.soffice_path = soffice_path or self._find_soffice()
         self.timeout = int(timeout or 120)
+        self.persistent = persistent
+        self.server = None
+        self._shared_profile_dir = None
+        self._persistent_mode_logged = False
 
     @property
     def available(self):
         return bool(self.soffice_path)
 
+    @property
+    def identity(self):
+        """Cache identity of the installed soffice; changes when LibreOffice is upgraded."""
+        if not self.available:
+            return None
+        real_path = os.path.realpath(self.soffice_path)
+        try:
+            stat = os.stat(real_path)
+        except OSError:
+            return f"soffice:{real_path}"
+        return f"soffice:{real_path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def close(self):
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
+        if self._shared_profile_dir is not None:
+            shutil.rmtree(self._shared_profile_dir, ignore_errors=True)
+            self._shared_profile_dir = None
+
+    def _get_server(self, log=None):
+        if self.server is None and SofficeServer.uno_available():
+            self.server = SofficeServer(self.soffice_path, self.timeout)
+        if self.server is None and log and not self._persistent_mode_logged:
+            log("  > 未找到 Python-UNO 模块，常驻模式改为复用同一个 LibreOffice 配置目录。")
+        self._persistent_mode_logged = True
+        return self.server
+
+    def _get_shared_profile_dir(self):
+        if self._shared_profile_dir is None:
+            self._shared_profile_dir = Path(tempfile.mkdtemp(prefix="wfp_soffice_profile_"))
+        return self._shared_profile_dir
+
     @staticmethod
     def _find_soffice():
         for executable in ("soffice", "soffice.com", "libreoffice"):
@@ -159,20 +687,40 @@ class SofficeConverter:
                 f"{input_path}。请安装 LibreOffice，或先将文档另存为 .docx 后再处理。"
             )
 
+        if self.persistent and self._get_server(log) is not None:
+            work_dir = Path(tempfile.mkdtemp(prefix="wfp_soffice_"))
+            output_path = work_dir / f"{input_path.stem}.docx"
+            if log:
+                log(f"  > 正在使用常驻 LibreOffice 转换为 .docx: {input_path.name}")
+            try:
+                self.server.convert(input_path, output_path, log)
+            except SofficeTimeoutError:
+                shutil.rmtree(work_dir, ignore_errors=True)
+                raise
+            except Exception as exc:
+                shutil.rmtree(work_dir, ignore_errors=True)
+                raise RuntimeError(
+                    f"LibreOffice 无法将 {input_path} 转为 .docx。"
+                    f"请先手动转为 .docx 后再处理。详细错误: {exc}"
+                ) from exc
+            if log:
+                log(f"  > LibreOffice 转换完成: {output_path.name}")
+            return output_path, work_dir
+
         work_dir = Path(tempfile.mkdtemp(prefix="wfp_soffice_"))
         out_dir = work_dir / "out"
-        profile_dir = work_dir / "profile"
         out_dir.mkdir(parents=True, exist_ok=True)
-        profile_dir.mkdir(parents=True, exist_ok=True)
-        profile_uri = profile_dir.resolve().as_posix()
-        if os.name == "nt":
-            profile_uri = "/" + profile_uri
+        if self.persistent:
+            profile_dir = self._get_shared_profile_dir()
+        else:
+            profile_dir = work_dir / "profile"
+            profile_dir.mkdir(parents=True, exist_ok=True)
 
         cmd = [
             self.soffice_path,
             "--headless",
             "--norestore",
-            f"-env:UserInstallation=file://{profile_uri}",
+            _soffice_profile_arg(profile_dir),
             "--convert-to",
             "docx",
             "--outdir",
@@ -182,10 +730,6 @@ class SofficeConverter:
         if log:
             log(f"  > 正在使用 LibreOffice 转换为 .docx: {input_path.name}")
 
-        creationflags = 0
-        if os.name == "nt" and hasattr(subprocess, "CREATE_NO_WINDOW"):
-            creationflags = subprocess.CREATE_NO_WINDOW
-
         try:
             proc = subprocess.run(
                 cmd,
@@ -193,12 +737,12 @@ class SofficeConverter:
                 stderr=subprocess.PIPE,
                 text=True,
                 timeout=self.timeout,
-                creationflags=creationflags,
+                creationflags=_soffice_creationflags(),
                 check=False,
             )
         except subprocess.TimeoutExpired as exc:
             shutil.rmtree(work_dir, ignore_errors=True)
-            raise RuntimeError(f"LibreOffice 转换超时 ({self.timeout}s): {input_path}") from exc
+            raise SofficeTimeoutError(f"LibreOffice 转换超时 ({self.timeout}s): {input_path}") from exc
         except FileNotFoundError as exc:
             shutil.rmtree(work_dir, ignore_errors=True)
             raise RuntimeError(f"找不到 soffice 可执行文件: {self.soffice_path}") from exc
@@ -227,6 +771,192 @@ class SofficeConverter:
             log(f"  > LibreOffice 转换完成: {generated_files[0].name}")
         return generated_files[0], work_dir
 
+    @staticmethod
+    def _chunk_by_unique_stem(input_paths, chunk_size):
+        """Split inputs into chunks whose output names (``<stem>.docx``) cannot collide."""
+        # First fit: a stem goes into the first open chunk after the last one
+        # holding it. Earlier chunks without it are already full, so only open
+        # chunk indices (ascending) and each stem's last chunk are tracked.
+        chunks = []
+        open_chunks = []
+        last_chunk = {}
+        for path in input_paths:
+            stem = path.stem.casefold()
+            pos = bisect.bisect_right(open_chunks, last_chunk.get(stem, -1))
+            if pos == len(open_chunks):
+                chunks.append([])
+                open_chunks.append(len(chunks) - 1)
+            idx = open_chunks[pos]
+            chunks[idx].append(path)
+            last_chunk[stem] = idx
+            if len(chunks[idx]) >= chunk_size:
+                del open_chunks[pos]
+        return chunks
+
+    def convert_many(self, input_paths, chunk_size=20, log=None):
+        """Convert many legacy files with one ``soffice --convert-to`` per chunk.
+
+        Returns ``(results, work_dir)``: ``results`` maps each resolved input
+        path to its generated ``.docx`` path, or to the exception describing
+        why that file failed. Inputs of a chunk that timed out are left out so
+        callers can retry them one by one. The caller owns ``work_dir``.
+        """
+        input_paths = [Path(path).expanduser().resolve() for path in input_paths]
+        if not self.available:
+            raise RuntimeError("LibreOffice (soffice) 不可用，无法批量转换旧格式文件。")
+
+        chunk_size = max(1, int(chunk_size or 1))
+        work_dir = Path(tempfile.mkdtemp(prefix="wfp_soffice_batch_"))
+        profile_dir = self._get_shared_profile_dir() if self.persistent else work_dir / "profile"
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        results = {}
+
+        chunks = self._chunk_by_unique_stem(input_paths, chunk_size)
+        for chunk_idx, chunk in enumerate(chunks, start=1):
+            out_dir = work_dir / f"out{chunk_idx}"
+            out_dir.mkdir()
+            cmd = [
+                self.soffice_path,
+                "--headless",
+                "--norestore",
+                _soffice_profile_arg(profile_dir),
+                "--convert-to",
+                "docx",
+                "--outdir",
+                str(out_dir),
+            ] + [str(path) for path in chunk]
+            if log:
+                log(f"  > LibreOffice 批量转换 {chunk_idx}/{len(chunks)}：本批 {len(chunk)} 个文件")
+
+            try:
+                proc = subprocess.run(
+                    cmd,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                    timeout=self.timeout * len(chunk),
+                    creationflags=_soffice_creationflags(),
+                    check=False,
+                )
+            except subprocess.TimeoutExpired:
+                if log:
+                    log(f"  > 警告：批量转换超时 ({self.timeout * len(chunk)}s)，本批文件将逐个重试。")
+                continue
+            except FileNotFoundError as exc:
+                shutil.rmtree(work_dir, ignore_errors=True)
+                raise RuntimeError(f"找不到 soffice 可执行文件: {self.soffice_path}") from exc
+
+            detail = (proc.stderr or proc.stdout or "").strip()
+            for path in chunk:
+                generated = out_dir / f"{path.stem}.docx"
+                if generated.is_file():
+                    results[path] = generated
+                else:
+                    results[path] = RuntimeError(
+                        f"LibreOffice 未生成 {path} 对应的 .docx。"
+                        f"请先手动转为 .docx 后再处理。详细信息: {detail}"
+                    )
+
+        if log:
+            converted = sum(1 for value in results.values() if isinstance(value, Path))
+            log(f"  > LibreOffice 批量转换完成：成功 {converted}/{len(input_paths)} 个，"
+                f"共启动 {len(chunks)} 次 soffice。")
+        return results, work_dir
+
+class ConversionCache:
+    """Content-addressed on-disk cache of legacy .doc/.wps -> .docx conversions.
+
+    Entries are keyed by the SHA-256 of the source bytes plus the converter
+    identity, so a cached conversion stays valid across config changes and
+    file renames. Total size is bounded with least-recently-used eviction;
+    writes are atomic so several worker processes can share one directory.
+    """
+
+    DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir).expanduser().resolve()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._digests = {}
+
+    def _source_digest(self, source_path):
+        source_path = Path(source_path).expanduser().resolve()
+        stat = source_path.stat()
+        memo_key = (source_path, stat.st_size, stat.st_mtime_ns)
+        digest = self._digests.get(memo_key)
+        if digest is None:
+            hasher = hashlib.sha256()
+            with open(source_path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    hasher.update(block)
+            digest = hasher.hexdigest()
+            self._digests[memo_key] = digest
+        return digest
+
+    def key(self, source_path, converter_id):
+        digest = self._source_digest(source_path)
+        return hashlib.sha256(f"{converter_id}\0{digest}".encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.docx"
+
+    def contains(self, key):
+        return self._entry_path(key).is_file()
+
+    def get(self, key, dest_path):
+        entry = self._entry_path(key)
+        try:
+            shutil.copyfile(entry, dest_path)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        self.hits += 1
+        return True
+
+    def put(self, key, docx_path):
+        entry = self._entry_path(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = entry.with_name(f"{entry.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            shutil.copyfile(docx_path, tmp_path)
+            os.replace(tmp_path, entry)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for path in self.cache_dir.glob("*/*.docx"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        if total <= self.max_bytes:
+            return 0
+        removed = 0
+        for _mtime, size, path in sorted(entries, key=lambda item: item[0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+
 def _initialize_com_for_thread(log_callback=None):
     if not (IS_WINDOWS and pythoncom is not None):
         return False
@@ -318,7 +1048,721 @@ class WPSAppManager:
                 self.com_app = None
                 self._log("  > 应用已关闭。")
 
+class BlockRecord:
+    """Classification features of one body block, read from the XML once.
+
+    ``format_document`` builds these up front so the caption scan, the
+    title scans and the paragraph loop share one view of each block instead
+    of re-joining run text and re-reading pPr at every stage. Call
+    ``refresh()`` after restyling a paragraph that a later stage may read.
+    """
+
+    __slots__ = ('block', 'is_table', 'text', 'stripped', 'alignment', 'has_drawing', 'has_object', '_font_info')
+
+    def __init__(self, block):
+        self.block = block
+        self.is_table = isinstance(block, Table)
+        if self.is_table:
+            self.text = self.stripped = ''
+            self.alignment = None
+            self.has_drawing = self.has_object = False
+            self._font_info = (None, None)
+        else:
+            self.refresh()
+
+    def refresh(self):
+        para = self.block
+        self.text = para.text
+        self.stripped = self.text.strip()
+        self.alignment = WordProcessor._get_paragraph_alignment(para)
+        self.has_drawing = WordProcessor._has_drawing_or_pict(para)
+        self.has_object = WordProcessor._has_embedded_object(para)
+        self._font_info = None
+
+    @property
+    def font_info(self):
+        """``(font_name, size_pt)`` of the first non-blank run, computed on first use."""
+        if self._font_info is None:
+            self._font_info = WordProcessor._get_paragraph_font_info(self.block)
+        return self._font_info
+
+
+class XmlBlockRecord(BlockRecord):
+    """A BlockRecord that reads its features straight from lxml (``lxml`` engine)."""
+
+    __slots__ = ()
+
+    TAGS_DRAWING = (qn('w:drawing'), qn('w:pict'))
+    TAG_OBJECT = qn('w:object')
+
+    def refresh(self):
+        p = self.block._p
+        self.text = ''.join(map(str, XPATH_PARAGRAPH_TEXT(p)))
+        self.stripped = self.text.strip()
+        self.alignment = ParagraphFormatXml(p).alignment
+        # iter() filters descendants in C and only wraps a match.
+        self.has_drawing = next(p.iter(*self.TAGS_DRAWING), None) is not None
+        self.has_object = next(p.iter(self.TAG_OBJECT), None) is not None
+        self._font_info = None
+
+
+class BlockIndex(list):
+    """The BlockRecords of a document body, shared by every title scan.
+
+    Besides plain indexing it answers "where would a title scan starting at
+    ``i`` stop?" in O(1), so attachment markers can look up their titles
+    without rescanning the rest of the body.
+    """
+
+    def __init__(self, records=()):
+        super().__init__(records)
+        self._next_candidate = {}
+
+    @staticmethod
+    def _is_title_candidate(record, is_from_txt):
+        if record.is_table or not record.stripped:
+            return False
+        if is_from_txt:
+            return True
+        text = record.text.lstrip()
+        return bool(
+            RE_TITLE_H1.match(text) or RE_TITLE_H2.match(text)
+            or record.alignment == WD_ALIGN_PARAGRAPH.CENTER
+        )
+
+    def next_title_candidate(self, start, is_from_txt):
+        """Index of the first block at or after ``start`` that ends a title search, or -1.
+
+        TXT sources stop on the first non-empty paragraph; other documents on
+        the first non-empty paragraph that is centered or an H1/H2 title. The
+        lookup table is built by one backward pass on first use. Restyling
+        titles and captions never changes these properties, so it stays valid
+        for the whole ``format_document`` run.
+        """
+        table = self._next_candidate.get(is_from_txt)
+        if table is None:
+            table = [-1] * (len(self) + 1)
+            for idx in range(len(self) - 1, -1, -1):
+                table[idx] = idx if self._is_title_candidate(self[idx], is_from_txt) else table[idx + 1]
+            self._next_candidate[is_from_txt] = table
+        return table[start] if 0 <= start < len(self) else -1
+
+
+class TableCellRecord:
+    """One unique ``w:tc`` of a table, with the text features table styling reads.
+
+    ``row_idx``/``col_idx`` are the last grid position the cell covers in
+    row order (the position ``row.cells`` would style it at last), and
+    ``in_header`` whether it covers a position in the first row.
+    """
+
+    __slots__ = ('tc', 'paragraphs', 'texts', 'text', 'weight', 'numeric', 'short', 'span',
+                 'row_idx', 'col_idx', 'in_header')
+
+    def __init__(self, tc, span, short_text_len=None):
+        self.tc = tc
+        self.span = span
+        self.paragraphs = tc.p_lst
+        self.texts = [''.join(map(str, XPATH_PARAGRAPH_TEXT(p))) for p in self.paragraphs]
+        self.text = ''.join(self.texts).strip()
+        self.weight = WordProcessor._table_text_weight(self.text)
+        if short_text_len is None:
+            self.numeric = self.short = None
+        else:
+            self.numeric = WordProcessor._is_numeric_table_text(self.text)
+            self.short = WordProcessor._is_short_table_text(self.text, short_text_len)
+        self.row_idx = self.col_idx = None
+        self.in_header = False
+
+
+class TableCellMatrix:
+    """The cells of a table read once: ``grid`` rows of TableCellRecords by grid position.
+
+    ``grid`` mirrors python-docx ``row.cells``: a cell spanning several grid
+    columns appears once per column, and a vertically merged cell appears
+    in every row it covers. ``cells`` holds each record once, in document
+    order, so per-cell styling touches every ``w:tc`` exactly once.
+    """
+
+    def __init__(self, table, short_text_len=None):
+        self.rows = table._tbl.tr_lst
+        self.grid = []
+        self.cells = []
+        above = {}
+        for row_idx, tr in enumerate(self.rows):
+            entries = []
+            row_cells = {}
+            offset = tr.grid_before
+            for tc in tr.tc_lst:
+                span = tc.grid_span
+                record = above.get(offset) if tc.vMerge == 'continue' else None
+                if record is None:
+                    record = TableCellRecord(tc, span, short_text_len)
+                    self.cells.append(record)
+                row_cells[offset] = record
+                for _ in range(record.span):
+                    record.row_idx = row_idx
+                    record.col_idx = len(entries)
+                    record.in_header = record.in_header or row_idx == 0
+                    entries.append(record)
+                offset += span
+            self.grid.append(entries)
+            above = row_cells
+        self.col_count = max((len(entries) for entries in self.grid), default=0)
+
+    def serial_column(self):
+        """Grid index of the 序号 column from the first row, or None."""
+        for col_idx, record in enumerate(self.grid[0] if self.grid else ()):
+            if '序号' in record.text or record.text == '序':
+                return col_idx
+        return None
+
+
+class DocumentBodyStream:
+    """The body-level blocks of a main document part, parsed incrementally.
+
+    Used by streaming mode. iterparse builds the tree ahead of the events it
+    reports, so a child of ``w:body`` is only handed out once the parser has
+    closed it or a later sibling. Blocks handed out stay in the tree until
+    ``release``d, so the tree holds no more than the caller does.
+    """
+
+    TAG_BODY = qn('w:body')
+    TAG_P = qn('w:p')
+    TAG_TBL = qn('w:tbl')
+
+    def __init__(self, source):
+        # Same parser options and element classes as python-docx.
+        self._events = etree.iterparse(
+            source, events=('start', 'end'), tag=(self.TAG_BODY, self.TAG_P, self.TAG_TBL),
+            remove_blank_text=True, resolve_entities=False, huge_tree=True,
+        )
+        self._events.set_element_class_lookup(oxml_element_class_lookup)
+        self.body = None
+        self._held = 0
+        self._inherited_ns = None
+
+    @property
+    def root(self):
+        return self._events.root
+
+    def __iter__(self):
+        """Yield each child of ``w:body``, in document order, once it is complete."""
+        for event, element in self._events:
+            if event == 'start':
+                if self.body is None and element.tag == self.TAG_BODY:
+                    self.body = element
+            elif self.body is not None and element.getparent() is self.body:
+                while True:
+                    child = self.body[self._held]
+                    self._held += 1
+                    yield child
+                    if child is element:
+                        break
+        while self.body is not None and self._held < len(self.body):
+            self._held += 1
+            yield self.body[self._held - 1]
+
+    def release(self, element):
+        """Detach ``element``, a block already handed out, from the tree."""
+        self.body.remove(element)
+        self._held -= 1
+
+    def serialize(self, element):
+        """``element`` as UTF-8, byte for byte as it appears in the serialized part.
+
+        lxml repeats every namespace declaration in scope on the root of a
+        serialized subtree; serializing the whole part declares them on
+        ``w:document`` only, so they are cut from the start tag again.
+        """
+        if self._inherited_ns is None:
+            probe = self.body.makeelement(self.TAG_P)
+            self.body.append(probe)
+            data = etree.tostring(probe)
+            self.body.remove(probe)
+            self._inherited_ns = data[RE_XML_START_TAG_NAME.match(data).end():-len(b'/>')]
+        data = etree.tostring(element, encoding='UTF-8')
+        name = RE_XML_START_TAG_NAME.match(data)
+        if name is not None and data.startswith(self._inherited_ns, name.end()):
+            data = data[:name.end()] + data[name.end() + len(self._inherited_ns):]
+        return data
+
+# The ZipFile internals copy_zip_member_raw writes through. zipfile has no
+# public API for a raw copy, so when any of them is missing (another Python
+# implementation or a future CPython) members are recompressed instead.
+ZIPFILE_RAW_COPY_ATTRS = (
+    '_lock', '_writecheck', '_didModify', '_seekable', 'start_dir', 'fp', 'filelist', 'NameToInfo',
+)
+
+
+def zip_raw_copy_supported(target):
+    """Whether ``copy_zip_member_raw`` can append to ZipFile ``target`` through its internals."""
+    return all(hasattr(target, attr) for attr in ZIPFILE_RAW_COPY_ATTRS)
+
+
+def copy_zip_member_raw(source, info, target):
+    """Append member ``info`` of ZipFile ``source`` to ZipFile ``target`` without decompressing it.
+
+    zipfile has no public API for this; the local header is rebuilt from
+    the central directory entry and the compressed bytes are copied as-is,
+    as ``ZipFile.open(..., 'w')`` would have written them. Encrypted
+    members, and targets without the internals this relies on (see
+    ``zip_raw_copy_supported``), are decompressed and written normally.
+    """
+    if info.flag_bits & 0x1 or not zip_raw_copy_supported(target):
+        target.writestr(info.filename, source.read(info))
+        return
+    source.fp.seek(info.header_offset)
+    header = source.fp.read(zipfile.sizeFileHeader)
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    source.fp.seek(info.header_offset + zipfile.sizeFileHeader + name_length + extra_length)
+    data = source.fp.read(info.compress_size)
+
+    zinfo = zipfile.ZipInfo(info.filename, info.date_time)
+    zinfo.compress_type = info.compress_type
+    zinfo.external_attr = info.external_attr
+    zinfo.CRC, zinfo.compress_size, zinfo.file_size = info.CRC, info.compress_size, info.file_size
+    with target._lock:
+        target._writecheck(zinfo)
+        target._didModify = True
+        if target._seekable:
+            target.fp.seek(target.start_dir)
+        zinfo.header_offset = target.fp.tell()
+        target.fp.write(zinfo.FileHeader())
+        target.fp.write(data)
+        target.start_dir = target.fp.tell()
+        target.filelist.append(zinfo)
+        target.NameToInfo[zinfo.filename] = zinfo
+
+
+class SourcePackage:
+    """The .docx a Document was opened from, for saving it without redoing unchanged parts.
+
+    python-docx ``save`` re-serializes every XML part and deflates every
+    part again, images and embedded objects included. ``save_document``
+    writes the same members in the same order, but copies a member whose
+    content is what it was when the document was opened still compressed
+    from the source zip.
+    """
+
+    def __init__(self, source, doc):
+        self.source = source
+        package = doc.part.package
+        # The main document part always changes; everything else is compared on save.
+        self._loaded = {PACKAGE_URI.rels_uri.membername: package.rels.xml}
+        for part in package.iter_parts():
+            if part is not doc.part:
+                self._loaded[part.partname.membername] = part.blob
+            if len(part.rels):
+                self._loaded[part.partname.rels_uri.membername] = part.rels.xml
+
+    def unchanged(self, name, blob):
+        loaded = self._loaded.get(name)
+        return loaded is not None and (loaded is blob or loaded == blob)
+
+
+def save_document(doc, output, compression=DEFAULT_OUTPUT_COMPRESSION, source=None, streamed=None):
+    """Save ``doc`` to ``output`` like ``Document.save``, zipped per ``compression`` (see OUTPUT_COMPRESSION_OPTIONS).
+
+    With a SourcePackage ``source``, members unchanged since it was opened
+    keep their original bytes: copied raw when already compressed with the
+    method in use, otherwise recompressed ('max' always recompresses).
+    ``streamed`` maps member names to ``write(file)`` callables that
+    produce them instead of the part blob.
+    """
+    compress_type, compresslevel = OUTPUT_COMPRESSION_ZIP_ARGS[compression]
+    package = doc.part.package
+    for part in package.parts:
+        part.before_marshal()
+    with zipfile.ZipFile(source.source) if source is not None else contextlib.nullcontext() as source_zip, \
+            zipfile.ZipFile(output, 'w', compress_type, compresslevel=compresslevel) as target:
+        writer = _PassThroughZipWriter(target, source, source_zip, streamed or {}, compression != OUTPUT_COMPRESSION_MAX)
+        PackageWriter._write_content_types_stream(writer, package.parts)
+        PackageWriter._write_pkg_rels(writer, package.rels)
+        PackageWriter._write_parts(writer, package.parts)
+
+
+class _PassThroughZipWriter:
+    """The python-docx physical package writer interface, as used by ``save_document``."""
+
+    def __init__(self, target, source, source_zip, streamed, raw_copy=True):
+        self._target = target
+        self._source = source
+        self._source_zip = source_zip
+        self._streamed = streamed
+        self._raw_copy = raw_copy
+
+    def write(self, pack_uri, blob):
+        name = pack_uri.membername
+        if name in self._streamed:
+            with self._target.open(name, 'w', force_zip64=True) as member:
+                self._streamed[name](member)
+            return
+        info = self._source_zip.NameToInfo.get(name) if self._source is not None else None
+        if info is None or not self._source.unchanged(name, blob):
+            self._target.writestr(name, blob)
+        elif self._raw_copy and info.compress_type == self._target.compression:
+            copy_zip_member_raw(self._source_zip, info, self._target)
+        else:
+            self._target.writestr(name, self._source_zip.read(info))
+
+
+def _get_or_insert_child(parent, tag, child_order, template=None):
+    """Return ``(child, created)`` for parent's first ``tag`` child, adding one if absent.
+
+    Mirrors python-docx ``get_or_add_*``: a new child (a copy of ``template``
+    or an empty element) goes before the existing successor that comes
+    earliest in ``child_order``, else at the end.
+    """
+    child = parent.find(tag)
+    if child is not None:
+        return child, False
+    order = child_order[tag]
+    successor, successor_order = None, None
+    for child in parent:
+        order_idx = child_order.get(child.tag)
+        if order_idx is not None and order_idx > order and (successor is None or order_idx < successor_order):
+            successor, successor_order = child, order_idx
+    element = deepcopy(template) if template is not None else parent.makeelement(tag)
+    if successor is not None:
+        successor.addprevious(element)
+    else:
+        parent.append(element)
+    return element, True
+
+
+RUN_FONT_THEME_ATTRS = tuple(qn(attr) for attr in ('w:eastAsiaTheme', 'w:asciiTheme', 'w:hAnsiTheme', 'w:cstheme', 'w:csTheme'))
+# Schema order of w:rPr children (same sequence python-docx uses), for inserting new children in place.
+RPR_CHILD_ORDER = {qn('w:' + tag): idx for idx, tag in enumerate((
+    'rStyle', 'rFonts', 'b', 'bCs', 'i', 'iCs', 'caps', 'smallCaps', 'strike', 'dstrike',
+    'outline', 'shadow', 'emboss', 'imprint', 'noProof', 'snapToGrid', 'vanish', 'webHidden',
+    'color', 'spacing', 'w', 'kern', 'position', 'sz', 'szCs', 'highlight', 'u', 'effect',
+    'bdr', 'shd', 'fitText', 'vertAlign', 'rtl', 'cs', 'em', 'lang', 'eastAsianLayout',
+    'specVanish', 'oMath',
+))}
+
+
+class RunFontTemplate:
+    """The run formatting of one role (font, size, optional black color).
+
+    The ``w:rPr`` a bare run ends up with is built once and deep-copied into
+    runs that have no properties yet. Runs with existing properties get the
+    same edits applied directly to their ``w:rPr`` element. This keeps their
+    bold/italic/underline, replaces the size, color and fonts, and drops the
+    theme font attributes. The result is what the python-docx ``Font``
+    proxies produced, without creating proxy objects for every run.
+    """
+
+    __slots__ = ('sz_val', 'east_asia', 'en_font', 'set_color', 'rPr', '_sz', '_color', '_rFonts')
+
+    def __init__(self, font_name, size_pt, en_font, set_color=False):
+        self.sz_val = ST_HpsMeasure.to_xml(Pt(size_pt))
+        self.east_asia = font_name
+        self.en_font = en_font
+        self.set_color = bool(set_color)
+
+        self._sz = OxmlElement('w:sz')
+        self._sz.set(qn('w:val'), self.sz_val)
+        self._color = OxmlElement('w:color')
+        self._color.set(qn('w:val'), '000000')
+        self._rFonts = OxmlElement('w:rFonts')
+        self._rFonts.set(qn('w:eastAsia'), font_name)
+        self._rFonts.set(qn('w:ascii'), en_font)
+        self._rFonts.set(qn('w:hAnsi'), en_font)
+        self.rPr = OxmlElement('w:rPr')
+        self._merge(self.rPr)
+
+    @staticmethod
+    def _find_or_insert(rPr, template):
+        return _get_or_insert_child(rPr, template.tag, RPR_CHILD_ORDER, template)
+
+    def _merge(self, rPr):
+        sz, created = self._find_or_insert(rPr, self._sz)
+        if not created:
+            sz.set(qn('w:val'), self.sz_val)
+        if self.set_color:
+            for color in rPr.findall(qn('w:color')):
+                rPr.remove(color)
+            self._find_or_insert(rPr, self._color)
+        rFonts, created = self._find_or_insert(rPr, self._rFonts)
+        if not created:
+            for theme_attr in RUN_FONT_THEME_ATTRS:
+                rFonts.attrib.pop(theme_attr, None)
+            rFonts.set(qn('w:eastAsia'), self.east_asia)
+            rFonts.set(qn('w:ascii'), self.en_font)
+            rFonts.set(qn('w:hAnsi'), self.en_font)
+
+    def apply(self, r):
+        rPr = r.rPr
+        if rPr is None:
+            r.insert(0, deepcopy(self.rPr))
+        else:
+            self._merge(rPr)
+
+
+# Schema order of w:pPr children, as above.
+PPR_CHILD_ORDER = {qn('w:' + tag): idx for idx, tag in enumerate((
+    'pStyle', 'keepNext', 'keepLines', 'pageBreakBefore', 'framePr', 'widowControl', 'numPr',
+    'suppressLineNumbers', 'pBdr', 'shd', 'tabs', 'suppressAutoHyphens', 'kinsoku', 'wordWrap',
+    'overflowPunct', 'topLinePunct', 'autoSpaceDE', 'autoSpaceDN', 'bidi', 'adjustRightInd',
+    'snapToGrid', 'spacing', 'ind', 'contextualSpacing', 'mirrorIndents', 'suppressOverlap', 'jc',
+    'textDirection', 'textAlignment', 'textboxTightWrap', 'outlineLvl', 'divId', 'cnfStyle', 'rPr',
+    'sectPr', 'pPrChange',
+))}
+# w:jc values as python-docx reads them, plus the start/end synonyms it rejects.
+ALIGNMENT_BY_JC = {member.xml_value: member for member in WD_ALIGN_PARAGRAPH if member.xml_value}
+ALIGNMENT_BY_JC.update({'start': WD_ALIGN_PARAGRAPH.LEFT, 'end': WD_ALIGN_PARAGRAPH.RIGHT})
+# Text-bearing run children in document order (the same nodes python-docx
+# joins for Run.text and Paragraph.text), compiled once.
+XPATH_RUN_TEXT = etree.XPath('w:br | w:cr | w:noBreakHyphen | w:ptab | w:t | w:tab', namespaces=nsmap)
+XPATH_PARAGRAPH_TEXT = etree.XPath(
+    ' | '.join(f'{prefix}w:r/w:{tag}' for prefix in ('', 'w:hyperlink/')
+               for tag in ('br', 'cr', 'noBreakHyphen', 'ptab', 't', 'tab')),
+    namespaces=nsmap,
+)
+
+
+class DocxParagraphFormat(ParagraphFormat):
+    """python-docx ``ParagraphFormat`` plus the raw ``w:spacing``/``w:ind`` access the role helpers need."""
+
+    def get_or_add_pPr(self):
+        return self._element.get_or_add_pPr()
+
+    def get_or_add_spacing(self):
+        return self._element.get_or_add_pPr().get_or_add_spacing()
+
+    def get_or_add_ind(self):
+        return self._element.get_or_add_pPr().get_or_add_ind()
+
+
+@functools.lru_cache(maxsize=None)
+def _xml_value(simple_type, value):
+    """``simple_type.to_xml(value)``, memoized: the formatter only ever writes a handful of values."""
+    return simple_type.to_xml(value)
+
+
+class ParagraphFormatXml:
+    """The ``ParagraphFormat`` setters used by the formatter, written against lxml directly.
+
+    Used by the ``lxml`` engine. Every setter performs the same element and
+    attribute edits, in the same order, as python-docx does, so both engines
+    write byte-identical XML. The ``w:pPr`` children are indexed by tag in a
+    single pass on first use; python-docx instead runs an ElementPath
+    ``find`` for every property it touches.
+    """
+
+    __slots__ = ('_p', '_pPr', '_children')
+
+    TAG_PPR = qn('w:pPr')
+    TAG_SPACING = qn('w:spacing')
+    TAG_IND = qn('w:ind')
+    TAG_JC = qn('w:jc')
+    TAG_WIDOW_CONTROL = qn('w:widowControl')
+    TAG_KEEP_NEXT = qn('w:keepNext')
+    TAG_KEEP_LINES = qn('w:keepLines')
+    TAG_PAGE_BREAK_BEFORE = qn('w:pageBreakBefore')
+    ATTR_VAL = qn('w:val')
+    ATTR_LEFT = qn('w:left')
+    ATTR_RIGHT = qn('w:right')
+    ATTR_FIRST_LINE = qn('w:firstLine')
+    ATTR_HANGING = qn('w:hanging')
+    ATTR_BEFORE = qn('w:before')
+    ATTR_AFTER = qn('w:after')
+    ATTR_LINE = qn('w:line')
+    ATTR_LINE_RULE = qn('w:lineRule')
+    LINE_RULE_AT_LEAST = WD_LINE_SPACING.AT_LEAST.xml_value
+    LINE_RULE_EXACTLY = WD_LINE_SPACING.EXACTLY.xml_value
+
+    def __init__(self, p):
+        self._p = p
+        self._pPr = None
+        self._children = None
+
+    def _find_pPr(self):
+        p = self._p
+        # w:pPr is the first child whenever it exists; fall back to a search otherwise.
+        first = p[0] if len(p) else None
+        if first is not None and first.tag == self.TAG_PPR:
+            return first
+        return p.find(self.TAG_PPR)
+
+    def get_or_add_pPr(self):
+        pPr = self._pPr
+        if pPr is None:
+            pPr = self._find_pPr()
+            if pPr is None:
+                pPr = self._p.makeelement(self.TAG_PPR)
+                self._p.insert(0, pPr)
+            self._pPr = pPr
+        return pPr
+
+    def _index(self):
+        """``{tag: first child with that tag}`` for w:pPr, built on first use and kept current."""
+        children = self._children
+        if children is None:
+            children = self._children = {}
+            for child in self.get_or_add_pPr():
+                children.setdefault(child.tag, child)
+        return children
+
+    def _find(self, tag):
+        return self._index().get(tag)
+
+    def _get_or_add(self, tag):
+        children = self._index()
+        child = children.get(tag)
+        if child is not None:
+            return child
+        # Same placement as python-docx: before the earliest-in-schema successor already present.
+        order = PPR_CHILD_ORDER[tag]
+        successor, successor_order = None, None
+        for child_tag, child in children.items():
+            order_idx = PPR_CHILD_ORDER.get(child_tag)
+            if order_idx is not None and order_idx > order and (successor is None or order_idx < successor_order):
+                successor, successor_order = child, order_idx
+        child = self._pPr.makeelement(tag)
+        if successor is not None:
+            # python-docx finds successors with find(), i.e. the first child of that tag,
+            # which is exactly what the index holds.
+            successor.addprevious(child)
+        else:
+            self._pPr.append(child)
+        children[tag] = child
+        return child
+
+    def _remove_all(self, tag):
+        children = self._index()
+        if tag in children:
+            pPr = self._pPr
+            for child in pPr.findall(tag):
+                pPr.remove(child)
+            del children[tag]
+
+    def get_or_add_spacing(self):
+        return self._get_or_add(self.TAG_SPACING)
+
+    def get_or_add_ind(self):
+        return self._get_or_add(self.TAG_IND)
+
+    def _set_child_attr(self, tag, attr, value, simple_type):
+        if value is None:
+            child = self._find(tag)
+            if child is not None:
+                child.attrib.pop(attr, None)
+            return
+        self._get_or_add(tag).set(attr, _xml_value(simple_type, value))
+
+    def _set_on_off(self, tag, value):
+        if value is None:
+            self._remove_all(tag)
+            return
+        element = self._get_or_add(tag)
+        # CT_OnOff defaults to true, so python-docx drops w:val for True.
+        if value:
+            element.attrib.pop(self.ATTR_VAL, None)
+        else:
+            element.set(self.ATTR_VAL, _xml_value(ST_OnOff, False))
+
+    # Reads never add a w:pPr.
+    def _find_existing(self, tag):
+        if self._pPr is None and self._find_pPr() is None:
+            return None
+        return self._find(tag)
+
+    @property
+    def alignment(self):
+        jc = self._find_existing(self.TAG_JC)
+        return ALIGNMENT_BY_JC.get(jc.get(self.ATTR_VAL)) if jc is not None else None
+
+    @alignment.setter
+    def alignment(self, value):
+        if value is None:
+            self._remove_all(self.TAG_JC)
+            return
+        self._get_or_add(self.TAG_JC).set(self.ATTR_VAL, value.xml_value)
+
+    @property
+    def first_line_indent(self):
+        ind = self._find_existing(self.TAG_IND)
+        if ind is None:
+            return None
+        hanging = ind.get(self.ATTR_HANGING)
+        if hanging is not None:
+            return Length(-ST_TwipsMeasure.from_xml(hanging))
+        first_line = ind.get(self.ATTR_FIRST_LINE)
+        return ST_TwipsMeasure.from_xml(first_line) if first_line is not None else None
+
+    @first_line_indent.setter
+    def first_line_indent(self, value):
+        if value is None and self._find(self.TAG_IND) is None:
+            return
+        ind = self.get_or_add_ind()
+        ind.attrib.pop(self.ATTR_FIRST_LINE, None)
+        ind.attrib.pop(self.ATTR_HANGING, None)
+        if value is None:
+            return
+        if value < 0:
+            ind.set(self.ATTR_HANGING, _xml_value(ST_TwipsMeasure, -value))
+        else:
+            ind.set(self.ATTR_FIRST_LINE, _xml_value(ST_TwipsMeasure, value))
+
+    # The remaining properties are write-only: the formatter never reads them back.
+    def _set_left_indent(self, value):
+        self._set_child_attr(self.TAG_IND, self.ATTR_LEFT, value, ST_SignedTwipsMeasure)
+
+    def _set_right_indent(self, value):
+        self._set_child_attr(self.TAG_IND, self.ATTR_RIGHT, value, ST_SignedTwipsMeasure)
+
+    def _set_space_before(self, value):
+        self._set_child_attr(self.TAG_SPACING, self.ATTR_BEFORE, value, ST_TwipsMeasure)
+
+    def _set_space_after(self, value):
+        self._set_child_attr(self.TAG_SPACING, self.ATTR_AFTER, value, ST_TwipsMeasure)
+
+    def _set_line_spacing(self, value):
+        # Only exact spacing (a Length) is ever set by the formatter.
+        spacing = self.get_or_add_spacing()
+        spacing.set(self.ATTR_LINE, _xml_value(ST_SignedTwipsMeasure, value))
+        if spacing.get(self.ATTR_LINE_RULE) != self.LINE_RULE_AT_LEAST:
+            spacing.set(self.ATTR_LINE_RULE, self.LINE_RULE_EXACTLY)
+
+    def _set_widow_control(self, value):
+        self._set_on_off(self.TAG_WIDOW_CONTROL, value)
+
+    def _set_keep_with_next(self, value):
+        self._set_on_off(self.TAG_KEEP_NEXT, value)
+
+    def _set_keep_together(self, value):
+        self._set_on_off(self.TAG_KEEP_LINES, value)
+
+    def _set_page_break_before(self, value):
+        self._set_on_off(self.TAG_PAGE_BREAK_BEFORE, value)
+
+    left_indent = property(None, _set_left_indent)
+    right_indent = property(None, _set_right_indent)
+    space_before = property(None, _set_space_before)
+    space_after = property(None, _set_space_after)
+    line_spacing = property(None, _set_line_spacing)
+    widow_control = property(None, _set_widow_control)
+    keep_with_next = property(None, _set_keep_with_next)
+    keep_together = property(None, _set_keep_together)
+    page_break_before = property(None, _set_page_break_before)
+
+
 class WordProcessor:
+    # .txt/.md sources are written straight to formatted OOXML; set to False
+    # to build an intermediate .docx and restyle it paragraph by paragraph.
+    DIRECT_TEXT_WRITER = True
+    DIRECT_TEXT_CHUNK_LINES = 2000
+    # Streaming mode (config 'streaming_mode') formats document.xml in segments
+    # of about this many blocks, cut where no title/caption/attachment scan can
+    # reach across; a segment is cut regardless once it reaches the maximum.
+    STREAM_SEGMENT_BLOCKS = 1000
+    STREAM_MAX_SEGMENT_BLOCKS = 20000
+    TAG_T = qn('w:t')
+    TAG_P = qn('w:p')
+    TAG_TC = qn('w:tc')
+
     def __init__(
         self,
         config,
@@ -328,24 +1772,70 @@ class WordProcessor:
         com_manager=None,
         soffice_path=None,
         soffice_timeout=120,
+        soffice_persistent=False,
+        conversion_cache=None,
+        log_level=logging.INFO,
     ):
         self.config = config
         self.temp_files = []
         self.sys_temp_dir = tempfile.gettempdir()
         self.log_callback = log_callback
+        # INFO: stage messages plus one summary per document; DEBUG adds a
+        # line per paragraph. Nothing is formatted when log_callback is None.
+        self.log_level = log_level
         self.com_manager = com_manager or WPSAppManager(log_callback)
         self._owns_com_manager = com_manager is None
         self.soffice_path = soffice_path
         self.soffice_timeout = soffice_timeout
+        self.soffice_persistent = soffice_persistent
+        self.conversion_cache = conversion_cache
         self.soffice_converter = None
+        self.preconverted = {}
+        self._run_font_templates = {}
+        self._preconvert_dirs = []
         self.blank_line_mode = self._normalize_blank_line_mode(
             blank_line_mode or self.config.get('blank_line_mode'),
             remove_blank_lines=remove_blank_lines
         )
         self.remove_blank_lines = self.blank_line_mode == BLANK_LINE_MODE_DELETE_SINGLE
-
-    def _log(self, message):
-        if self.log_callback: self.log_callback(message)
+        self.format_engine = self._normalize_format_engine(self.config.get('format_engine'))
+        self.output_compression = self._normalize_output_compression(self.config.get('output_compression'))
+        # Per-phase wall/CPU seconds of the last format_document call (PhaseTimer.timings()),
+        # and its phase spans when record_phase_spans is set (PhaseTimer.spans).
+        self.last_timings = None
+        self.record_phase_spans = False
+        self.last_phase_spans = None
+        # With memory_report set, format_document leaves MemoryTracker.report() in last_memory_report.
+        self.memory_report = False
+        self.last_memory_report = None
+        # Paragraphs of the last document the punctuation precheck rejected
+        # ('skipped') or passed on to the normalizer ('scanned').
+        self.last_symbol_stats = Counter()
+        self._timer = PhaseTimer()
+
+    def _log(self, message, level=logging.INFO):
+        if self.log_callback and level >= self.log_level: self.log_callback(message)
+
+    def _debug(self, message):
+        self._log(message, logging.DEBUG)
+
+    @property
+    def _detail_logging(self):
+        """True when per-paragraph (DEBUG) messages reach a listener.
+
+        Hot loops check this before building a message, so previews and
+        f-strings cost nothing when the CLI runs without ``-vv``.
+        """
+        return self.log_callback is not None and self.log_level <= logging.DEBUG
+
+    @staticmethod
+    def _preview(text):
+        return text[:30].replace("\n", " ")
+
+    @staticmethod
+    def _format_stats(stats):
+        parts = [f"{label} {stats[label]}" for label in FORMAT_STAT_LABELS if stats.get(label)]
+        return "排版统计：" + ("，".join(parts) if parts else "无可排版段落") + "。"
 
     @staticmethod
     def _com_available():
@@ -390,6 +1880,32 @@ class WordProcessor:
         if isinstance(mode, bool):
             return BLANK_LINE_MODE_DELETE_SINGLE if mode else BLANK_LINE_MODE_KEEP_SINGLE
         return BLANK_LINE_MODE_DELETE_SINGLE if remove_blank_lines else BLANK_LINE_MODE_KEEP_SINGLE
+
+    @staticmethod
+    def _normalize_format_engine(engine):
+        if engine in FORMAT_ENGINES:
+            return engine
+        if engine == 'docx':
+            return FORMAT_ENGINE_DOCX
+        return DEFAULT_FORMAT_ENGINE
+
+    @staticmethod
+    def _normalize_table_border_mode(mode):
+        if mode in TABLE_BORDER_MODES:
+            return mode
+        return DEFAULT_TABLE_BORDER_MODE
+
+    @staticmethod
+    def _normalize_output_compression(compression):
+        if compression in OUTPUT_COMPRESSION_OPTIONS:
+            return compression
+        return DEFAULT_OUTPUT_COMPRESSION
+
+    def _paragraph_format(self, para):
+        """Paragraph-property writer for ``para`` in the configured engine."""
+        if self.format_engine == FORMAT_ENGINE_LXML:
+            return ParagraphFormatXml(para._p)
+        return DocxParagraphFormat(para._p)
 
     def _cleanup_temp_files(self):
         if not self.temp_files:
@@ -417,9 +1933,46 @@ class WordProcessor:
 
     def _get_soffice_converter(self):
         if self.soffice_converter is None:
-            self.soffice_converter = SofficeConverter(self.soffice_path, self.soffice_timeout)
+            self.soffice_converter = SofficeConverter(
+                self.soffice_path,
+                self.soffice_timeout,
+                persistent=self.soffice_persistent,
+            )
         return self.soffice_converter
 
+    def close_soffice_converter(self):
+        close = getattr(self.soffice_converter, "close", None)
+        if close is not None:
+            close()
+        for work_dir in self._preconvert_dirs:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        self._preconvert_dirs.clear()
+        self.preconverted.clear()
+
+    def preconvert_legacy_files(self, input_paths, chunk_size=20):
+        """Batch-convert .doc/.wps inputs through LibreOffice before formatting.
+
+        Only used when COM is unavailable, since COM converts per document.
+        Results are picked up by ``convert_to_docx``; returns the number of
+        files converted successfully.
+        """
+        legacy_paths = [
+            path for path in input_paths
+            if os.path.splitext(str(path))[1].lower() in ('.doc', '.wps')
+            and self._cached_conversion_key(path) is None
+        ]
+        if not legacy_paths or self._com_available():
+            return 0
+        converter = self._get_soffice_converter()
+        if not converter.available:
+            return 0
+
+        self._log(f"正在批量预转换 {len(legacy_paths)} 个旧格式文件（每批 {chunk_size} 个）...")
+        results, work_dir = converter.convert_many(legacy_paths, chunk_size, self._log)
+        self._preconvert_dirs.append(work_dir)
+        self.preconverted.update(results)
+        return sum(1 for value in results.values() if isinstance(value, Path))
+
     def _convert_legacy_with_com(self, input_path, temp_docx_path):
         app = self._get_wps_app()
         doc_com = None
@@ -431,6 +1984,42 @@ class WordProcessor:
                 doc_com.Close()
         self._log("文件格式转换完成。")
 
+    def _conversion_cache_key(self, input_path, converter=None):
+        """Cache key for a legacy conversion by ``converter`` ('com' or 'soffice').
+
+        Defaults to the converter ``convert_to_docx`` would try first.
+        """
+        if self.conversion_cache is None:
+            return None
+        if converter is None:
+            converter = "com" if self._com_available() else "soffice"
+        converter_id = "com" if converter == "com" else self._get_soffice_converter().identity
+        if not converter_id:
+            return None
+        return self.conversion_cache.key(input_path, converter_id)
+
+    def _cached_conversion_key(self, input_path):
+        key = self._conversion_cache_key(input_path)
+        if key is not None and self.conversion_cache.contains(key):
+            return key
+        return None
+
+    def _restore_cached_conversion(self, input_path, temp_docx_path):
+        key = self._conversion_cache_key(input_path)
+        if key is None or not self.conversion_cache.get(key, temp_docx_path):
+            return False
+        self._log("  > 命中转换缓存，跳过旧格式转换。")
+        return True
+
+    def _store_cached_conversion(self, input_path, temp_docx_path, converter):
+        key = self._conversion_cache_key(input_path, converter)
+        if key is None:
+            return
+        try:
+            self.conversion_cache.put(key, temp_docx_path)
+        except OSError as exc:
+            self._log(f"  > 警告：写入转换缓存失败: {exc}")
+
     def _convert_legacy_with_soffice(self, input_path, temp_docx_path):
         converter = self._get_soffice_converter()
         if not converter.available:
@@ -439,7 +2028,16 @@ class WordProcessor:
                 "已跳过该旧格式文件，继续处理其他可支持文件。"
             )
 
-        converted_path, work_dir = converter.convert_to_docx(input_path, self._log)
+        preconverted = self.preconverted.pop(Path(input_path).expanduser().resolve(), None)
+        if isinstance(preconverted, Exception):
+            raise preconverted
+        if preconverted is not None:
+            shutil.move(str(preconverted), temp_docx_path)
+            self._log("已使用批量预转换结果。")
+            return
+
+        with self._timer.phase('soffice'):
+            converted_path, work_dir = converter.convert_to_docx(input_path, self._log)
         try:
             shutil.copy2(converted_path, temp_docx_path)
         finally:
@@ -471,161 +2069,93 @@ class WordProcessor:
             or (0xFF41 <= code <= 0xFF5A)
         )
 
-    @staticmethod
-    def _prev_non_space(text, index):
-        i = index - 1
-        while i >= 0 and text[i].isspace():
-            i -= 1
-        return text[i] if i >= 0 else ''
-
-    @staticmethod
-    def _next_non_space(text, index):
-        i = index + 1
-        while i < len(text) and text[i].isspace():
-            i += 1
-        return text[i] if i < len(text) else ''
-
-    @classmethod
-    def _is_after_digit_or_latin(cls, text, index):
-        return cls._is_digit_or_latin(cls._prev_non_space(text, index))
-
-    @classmethod
-    def _is_before_digit_or_latin(cls, text, index):
-        return cls._is_digit_or_latin(cls._next_non_space(text, index))
-
-    @classmethod
-    def _normalize_ellipsis(cls, text):
-        dot_chars = {'.', '．', '。'}
-        chars = []
-        i = 0
-        while i < len(text):
-            ch = text[i]
-            if ch not in dot_chars:
-                chars.append(ch)
-                i += 1
-                continue
-
-            j = i + 1
-            while j < len(text) and text[j] in dot_chars:
-                j += 1
-
-            if j - i >= 3 and not cls._is_after_digit_or_latin(text, i):
-                chars.append('……')
-            else:
-                chars.append(text[i:j])
-            i = j
-
-        return ''.join(chars)
-
-    @classmethod
-    def _normalize_simple_punctuation(cls, text):
-        replacements = {
-            ',': '，',
-            '.': '。',
-            '．': '。',
-            ';': '；',
-            ':': '：',
-            '?': '？',
-            '!': '！',
-        }
-        chars = list(text)
-        for i, ch in enumerate(chars):
-            if ch not in replacements:
-                continue
-            if ch in {'.', '．', '。'}:
-                prev_is_dot = i > 0 and text[i - 1] in {'.', '．', '。'}
-                next_is_dot = i + 1 < len(text) and text[i + 1] in {'.', '．', '。'}
-                if prev_is_dot or next_is_dot:
-                    continue
-            if cls._is_after_digit_or_latin(text, i):
-                continue
-            chars[i] = replacements[ch]
-        return ''.join(chars)
-
-    @classmethod
-    def _normalize_bracket_pairs(cls, text):
-        pair_sets = [
-            ({'(': '（', '（': '（'}, {')': '）', '）': '）'}),
-            ({'[': '［', '［': '［'}, {']': '］', '］': '］'}),
-        ]
-        result = text
-
-        for open_chars, close_chars in pair_sets:
-            chars = list(result)
-            stack = []
-            for i, ch in enumerate(chars):
-                if ch in open_chars:
-                    stack.append(i)
-                elif ch in close_chars and stack:
-                    open_index = stack.pop()
-                    content = ''.join(chars[open_index + 1:i])
-                    if not cls._has_chinese(content):
-                        continue
-                    if cls._is_after_digit_or_latin(result, open_index):
-                        continue
-                    if cls._is_before_digit_or_latin(result, i):
-                        continue
-                    chars[open_index] = open_chars[chars[open_index]]
-                    chars[i] = close_chars[ch]
-            result = ''.join(chars)
-
-        return result
-
-    @classmethod
-    def _normalize_quote_pairs(cls, text, quote_chars, left_quote, right_quote, skip_inner_latin=False):
-        chars = list(text)
-        open_index = None
-
-        for i, ch in enumerate(chars):
-            if ch not in quote_chars:
-                continue
-
-            prev_is_latin = cls._is_after_digit_or_latin(text, i)
-            next_is_latin = cls._is_before_digit_or_latin(text, i)
-            if skip_inner_latin and prev_is_latin and next_is_latin:
-                continue
-
-            if open_index is None:
-                if prev_is_latin:
-                    continue
-                open_index = i
-                continue
-
-            content = ''.join(chars[open_index + 1:i])
-            should_normalize = (
-                cls._has_chinese(content)
-                and not cls._is_after_digit_or_latin(text, open_index)
-                and not cls._is_before_digit_or_latin(text, i)
-            )
-            if should_normalize:
-                chars[open_index] = left_quote
-                chars[i] = right_quote
-            open_index = None
-
-        return ''.join(chars)
-
     @classmethod
     def _normalize_symbols_in_text(cls, text):
+        """Convert ASCII and mixed punctuation in Chinese text to full-width forms.
+
+        One left-to-right scan over the candidate characters found by
+        ``RE_SYMBOL_CANDIDATE`` applies, in a single pass, the rules that
+        used to run as separate passes: bracket pairs, ellipses, double
+        and single quote pairs and simple punctuation. Pair fixes are
+        deferred until the closing mark is seen. The character before a
+        candidate is tracked as the scan goes, so nothing is rescanned.
+        """
         if not text or not cls._has_chinese(text):
             return text
 
-        result = cls._normalize_bracket_pairs(text)
-        result = cls._normalize_ellipsis(result)
-        result = cls._normalize_quote_pairs(
-            result,
-            {'"', '“', '”', '„', '‟', '「', '」'},
-            '“',
-            '”',
-        )
-        result = cls._normalize_quote_pairs(
-            result,
-            {"'", '‘', '’', '‚', '‛'},
-            '‘',
-            '’',
-            skip_inner_latin=True,
-        )
-        result = cls._normalize_simple_punctuation(result)
-        return result
+        fixes = {}
+        bracket_stacks = {kind: [] for kind in SYMBOL_BRACKET_KINDS}
+        quote_opens = dict.fromkeys(SYMBOL_QUOTE_MARKS)
+        prev_char = ''
+        last_end = 0
+        for match in RE_SYMBOL_CANDIDATE.finditer(text):
+            i, end = match.span()
+            gap = text[last_end:i].rstrip()
+            if gap:
+                prev_char = gap[-1]
+            after_latin = cls._is_digit_or_latin(prev_char)
+            last_end = end
+            ch = match.group()
+            prev_char = ch[-1]
+
+            if ch[0] in SYMBOL_DOTS:
+                if after_latin:
+                    continue
+                if end - i >= 3:
+                    fixes[i] = (end, '……')
+                elif end - i == 1 and ch in SYMBOL_SIMPLE:
+                    fixes[i] = (end, SYMBOL_SIMPLE[ch])
+            elif ch in SYMBOL_SIMPLE:
+                if not after_latin:
+                    fixes[i] = (end, SYMBOL_SIMPLE[ch])
+            elif ch in SYMBOL_BRACKET_OPEN:
+                bracket_stacks[SYMBOL_BRACKET_OPEN[ch][0]].append((i, after_latin))
+            elif ch in SYMBOL_BRACKET_CLOSE:
+                kind, close = SYMBOL_BRACKET_CLOSE[ch]
+                stack = bracket_stacks[kind]
+                if not stack:
+                    continue
+                open_index, open_after_latin = stack.pop()
+                if (
+                    not open_after_latin
+                    and RE_HAS_CHINESE.search(text, open_index + 1, i)
+                    and not cls._is_before_digit_or_latin(text, end)
+                ):
+                    fixes[open_index] = (open_index + 1, SYMBOL_BRACKET_OPEN[text[open_index]][1])
+                    fixes[i] = (end, close)
+            else:
+                kind = SYMBOL_QUOTES[ch]
+                open_index = quote_opens[kind]
+                if kind == 'single' and after_latin and cls._is_before_digit_or_latin(text, end):
+                    # An apostrophe inside a Latin word, such as don't.
+                    continue
+                if open_index is None:
+                    if not after_latin:
+                        quote_opens[kind] = i
+                    continue
+                quote_opens[kind] = None
+                if RE_HAS_CHINESE.search(text, open_index + 1, i) and not cls._is_before_digit_or_latin(text, end):
+                    left, right = SYMBOL_QUOTE_MARKS[kind]
+                    fixes[open_index] = (open_index + 1, left)
+                    fixes[i] = (end, right)
+
+        if not fixes:
+            return text
+        pieces = []
+        last_end = 0
+        for start in sorted(fixes):
+            end, replacement = fixes[start]
+            pieces.append(text[last_end:start])
+            pieces.append(replacement)
+            last_end = end
+        pieces.append(text[last_end:])
+        return ''.join(pieces)
+
+    @classmethod
+    def _is_before_digit_or_latin(cls, text, index):
+        """Whether the first non-space character at or after ``index`` is a digit or Latin letter."""
+        match = RE_NON_SPACE.search(text, index)
+        return bool(match) and cls._is_digit_or_latin(match.group())
 
     @staticmethod
     def _redistribute_text_to_runs(runs, new_full_text):
@@ -644,7 +2174,27 @@ class WordProcessor:
         for run in runs[1:]:
             run.text = ''
 
+    @staticmethod
+    def _symbols_may_change(text):
+        """Cheap precheck: False when ``_normalize_symbols_in_text(text)`` cannot change ``text``."""
+        return RE_SYMBOL_PRECHECK.search(text) is not None and RE_HAS_CHINESE.search(text) is not None
+
+    @classmethod
+    def _element_symbols_may_change(cls, element):
+        """``_symbols_may_change`` on the ``w:t`` text under ``element``, without python-docx or XPath."""
+        return cls._symbols_may_change(''.join(element.itertext(cls.TAG_T)))
+
+    def _log_symbol_changes(self, changes):
+        self._log(
+            f"符号标准化完成，共修复 {changes} 个段落/表格单元格"
+            f"（预检跳过 {self.last_symbol_stats['skipped']} 个段落）。"
+        )
+
     def _normalize_paragraph_symbols(self, para):
+        if not self._element_symbols_may_change(para._p):
+            self.last_symbol_stats['skipped'] += 1
+            return False
+        self.last_symbol_stats['scanned'] += 1
         text = para.text
         if not text.strip() or not para.runs:
             return False
@@ -666,12 +2216,25 @@ class WordProcessor:
                 changes += 1
 
         for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for para in cell.paragraphs:
-                        if self._normalize_paragraph_symbols(para):
-                            changes += 1
+            changes += self._normalize_table_symbols(table)
 
+        return changes
+
+    def _normalize_table_symbols(self, table):
+        """Normalize every cell paragraph of ``table`` once, nested tables included.
+
+        Walks the ``w:tc`` elements rather than ``row.cells``, which
+        repeats a merged cell once per grid column and row it spans.
+        """
+        tbl = table._tbl
+        if not self._element_symbols_may_change(tbl):
+            self.last_symbol_stats['skipped'] += sum(1 for _ in tbl.iter(self.TAG_P))
+            return 0
+        changes = 0
+        for tc in tbl.iter(self.TAG_TC):
+            for p in tc.iterchildren(self.TAG_P):
+                if self._normalize_paragraph_symbols(Paragraph(p, table)):
+                    changes += 1
         return changes
 
     # ------------------------------------------------------------------
@@ -823,34 +2386,21 @@ class WordProcessor:
 
         temp_docx_path = self._make_temp_docx_path("converted", base_name)
 
-        if file_ext == '.txt':
-            self._log("检测到 .txt 文件，正在创建 .docx...")
-            text_content = self._read_text_file(input_path)
-            text_content = self._normalize_text_blank_lines(text_content)
-            self._log_blank_line_mode("TXT")
-            doc = Document()
-            for line in text_content.split('\n'):
-                doc.add_paragraph(line.strip())
-            doc.save(temp_docx_path)
-            self._log("TXT转换完成。")
-            return temp_docx_path, is_from_txt
-        elif file_ext == '.md':
-            self._log("检测到 .md 文件，正在清理 Markdown 标记并创建 .docx...")
-            raw_text = self._read_text_file(input_path)
-            cleaned_text = self._clean_markdown(raw_text)
-            cleaned_text = self._normalize_text_blank_lines(cleaned_text)
-            self._log_blank_line_mode("Markdown 文本")
+        if is_from_txt:
             doc = Document()
-            for line in cleaned_text.split('\n'):
-                doc.add_paragraph(line.strip())
+            for line in self._read_source_text_lines(input_path):
+                doc.add_paragraph(line)
             doc.save(temp_docx_path)
-            self._log("Markdown 转换完成。")
+            self._log("TXT转换完成。" if file_ext == '.txt' else "Markdown 转换完成。")
             return temp_docx_path, is_from_txt
         elif file_ext in ['.wps', '.doc']:
             self._log(f"正在转换 {file_ext} 文件为 .docx...")
+            if self._restore_cached_conversion(input_path, temp_docx_path):
+                return temp_docx_path, is_from_txt
             if self._com_available():
                 try:
                     self._convert_legacy_with_com(input_path, temp_docx_path)
+                    self._store_cached_conversion(input_path, temp_docx_path, "com")
                     return temp_docx_path, is_from_txt
                 except Exception as exc:
                     self._log(f"  > WPS/Word 转换失败，尝试使用 LibreOffice 兜底: {exc}")
@@ -858,10 +2408,53 @@ class WordProcessor:
                 self._log(f"  > {self._com_unavailable_message(file_ext)}")
 
             self._convert_legacy_with_soffice(input_path, temp_docx_path)
+            self._store_cached_conversion(input_path, temp_docx_path, "soffice")
             return temp_docx_path, is_from_txt
         
         raise ValueError(f"不支持的文件格式: {file_ext}")
 
+    def _read_source_text_lines(self, input_path):
+        """Read a .txt/.md source as the stripped lines that become paragraphs."""
+        if os.path.splitext(input_path)[1].lower() == '.txt':
+            self._log("检测到 .txt 文件，正在创建 .docx...")
+            text_content = self._read_text_file(input_path)
+            source_name = "TXT"
+        else:
+            self._log("检测到 .md 文件，正在清理 Markdown 标记并创建 .docx...")
+            text_content = self._clean_markdown(self._read_text_file(input_path))
+            source_name = "Markdown 文本"
+        text_content = self._normalize_text_blank_lines(text_content)
+        self._log_blank_line_mode(source_name)
+        return [line.strip() for line in text_content.split('\n')]
+
+    def _open_source_document(self, input_path):
+        """Open ``input_path`` as a python-docx Document ready for formatting.
+
+        Returns ``(doc, is_from_txt, source)``, where ``source`` is the
+        SourcePackage to pass to ``save_document``. A .docx that needs no COM
+        preprocessing is read once into memory and parsed from a ``BytesIO``;
+        the temp-file copy is only made when COM has to open and save the
+        document.
+        """
+        file_ext = os.path.splitext(input_path)[1].lower()
+        if file_ext == '.docx' and not self._com_available():
+            self._log("检测到 .docx 文件，正在读入内存处理（原文件不会被修改）...")
+            with self._timer.phase('parse'):
+                with open(input_path, 'rb') as f:
+                    source = io.BytesIO(f.read())
+                self._log(f"  > {self._com_unavailable_message()}")
+                doc = Document(source)
+            return doc, False, SourcePackage(source, doc)
+
+        with self._timer.phase('convert'):
+            processing_path, is_from_txt = self.convert_to_docx(input_path)
+        if not is_from_txt:
+            with self._timer.phase('preprocess'):
+                self._preprocess_com_tasks(processing_path)
+        with self._timer.phase('parse'):
+            doc = Document(processing_path)
+        return doc, is_from_txt, SourcePackage(processing_path, doc)
+
     def _preprocess_com_tasks(self, docx_path):
         if not self._com_available():
             self._log(f"  > {self._com_unavailable_message()}")
@@ -946,25 +2539,25 @@ class WordProcessor:
         if should_set_a4:
             self._log("  > 已将页面大小设置为 A4。")
 
-    def _set_run_font(self, run, font_name, size_pt, set_color=False):
-        run.font.size = Pt(size_pt)
-        if set_color: run.font.color.rgb = RGBColor(0, 0, 0)
-        rPr = run._r.get_or_add_rPr()
-        rFonts = rPr.get_or_add_rFonts()
-        for theme_attr in ('w:eastAsiaTheme', 'w:asciiTheme', 'w:hAnsiTheme', 'w:cstheme', 'w:csTheme'):
-            rFonts.attrib.pop(qn(theme_attr), None)
-        rFonts.set(qn('w:eastAsia'), font_name)
+    def _run_font_template(self, font_name, size_pt, set_color=False):
         # 根据配置决定西文字体（数字、字母）
         en_font = self.config.get('english_font') if self.config.get('use_custom_english_font', False) else font_name
         en_font = en_font or font_name
-        run.font.name = en_font
-        rFonts.set(qn('w:ascii'), en_font)
-        rFonts.set(qn('w:hAnsi'), en_font)
+        key = (font_name, size_pt, en_font, bool(set_color))
+        template = self._run_font_templates.get(key)
+        if template is None:
+            template = self._run_font_templates[key] = RunFontTemplate(font_name, size_pt, en_font, set_color)
+        return template
+
+    def _set_run_font(self, run, font_name, size_pt, set_color=False):
+        self._run_font_template(font_name, size_pt, set_color).apply(run._r)
 
     def _apply_font_to_runs(self, para, font_name, size_pt, set_color=False):
-        for run in para.runs: self._set_run_font(run, font_name, size_pt, set_color=set_color)
+        template = self._run_font_template(font_name, size_pt, set_color)
+        for r in para._p.r_lst: template.apply(r)
 
-    def _get_paragraph_font_info(self, para):
+    @staticmethod
+    def _get_paragraph_font_info(para):
         """获取段落主要字体和字号信息"""
         if not para.runs:
             return None, None
@@ -1000,96 +2593,101 @@ class WordProcessor:
             }.get(raw_value)
 
     def _strip_leading_whitespace(self, para):
-        if not para.runs:
+        p = para._p
+        text_only_tags = (qn('w:rPr'), qn('w:t'))
+        r_elem = p.find(qn('w:r'))
+        while r_elem is not None:
+            only_text = all(child.tag in text_only_tags for child in r_elem)
+            if not only_text or ''.join(map(str, XPATH_RUN_TEXT(r_elem))).strip():
+                break
+            p.remove(r_elem)
+            r_elem = p.find(qn('w:r'))
+
+        if r_elem is None:
             return
-        while para.runs:
-            first_run = para.runs[0]
-            r_elem = first_run._r
-            children = [child for child in r_elem if child.tag != qn('w:rPr')]
-            only_text = all(child.tag == qn('w:t') for child in children)
-            if not only_text or first_run.text.strip():
-                break
-            para._p.remove(r_elem)
-
-        if not para.runs:
-            return
-        first_run = para.runs[0]
-        original_text = first_run.text
+        original_text = ''.join(map(str, XPATH_RUN_TEXT(r_elem)))
         stripped_text = original_text.lstrip()
         if original_text != stripped_text:
-            first_run.text = stripped_text
-            self._log("  > 已移除段落前的多余空格。")
+            r_elem.text = stripped_text
+            self._debug("  > 已移除段落前的多余空格。")
     
     def _reset_pagination_properties(self, para):
-        para.paragraph_format.widow_control = False
-        para.paragraph_format.keep_with_next = False
-        para.paragraph_format.keep_lines_together = False
-        para.paragraph_format.page_break_before = False
-        para.paragraph_format.keep_together = False
-
+        self._reset_pagination_format(self._paragraph_format(para))
+
+    @staticmethod
+    def _reset_pagination_format(pf):
+        pf.widow_control = False
+        pf.keep_with_next = False
+        pf.page_break_before = False
+        pf.keep_together = False
+
+    def _justified_body_format(self, pf):
+        pf.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+        self._reset_pagination_format(pf)
+
     def _get_outline_level(self, para):
         """
         读取段落的当前大纲级别
         返回: 0-8 表示级别1-9，None 表示未设置
         """
-        pPr = para._p.get_or_add_pPr()
-        outlineLvl = pPr.find(qn('w:outlineLvl'))
+        pPr = para._p.pPr
+        outlineLvl = pPr.find(qn('w:outlineLvl')) if pPr is not None else None
         if outlineLvl is not None:
             val = outlineLvl.get(qn('w:val'))
             if val is not None:
                 return int(val)
         return None
 
-    def _set_outline_level(self, para, level):
+    @staticmethod
+    def _set_outline_level(pf, level):
         """
         直接设置段落的大纲级别，不通过样式，不影响字体字号等格式
         level: 1-9 的整数，表示大纲级别
-        返回: 原有的大纲级别 (0-8) 或 None
         """
-        if level < 1 or level > 9:
-            self._log(f"  > 警告：大纲级别 {level} 超出范围 (1-9)，已跳过设置")
-            return None
-        
-        # 读取原有大纲级别
-        original_level = self._get_outline_level(para)
-        
         # 设置新的大纲级别 (Word内部用0-8表示1-9级)
-        pPr = para._p.get_or_add_pPr()
+        pPr = pf.get_or_add_pPr()
         outlineLvl = pPr.find(qn('w:outlineLvl'))
         if outlineLvl is None:
-            outlineLvl = OxmlElement('w:outlineLvl')
+            outlineLvl = pPr.makeelement(qn('w:outlineLvl'))
             pPr.append(outlineLvl)
         outlineLvl.set(qn('w:val'), str(level - 1))
-        
-        return original_level
 
     def _format_heading(self, para, level):
         """
         为段落设置大纲级别（仅设置大纲级别，不影响其他格式）
         """
         if not self.config['set_outline']:
-            self._log(f"  > 大纲级别设置已禁用，跳过")
+            self._debug("  > 大纲级别设置已禁用，跳过")
+            return
+        if level < 1 or level > 9:
+            self._log(f"  > 警告：大纲级别 {level} 超出范围 (1-9)，已跳过设置", logging.WARNING)
+            return
+        
+        # 读取原有大纲级别（仅用于日志）
+        original_level = self._get_outline_level(para) if self._detail_logging else None
+        self._set_outline_level(self._paragraph_format(para), level)
+        if not self._detail_logging:
             return
         
         # 获取段落文本预览用于日志
-        text_preview = para.text.strip()[:30].replace("\n", " ")
-        
-        original_level = self._set_outline_level(para, level)
+        text_preview = self._preview(para.text.strip())
         
         if original_level is not None:
-            self._log(f"  > 大纲级别: Lv{original_level + 1} → Lv{level} (覆盖) - \"{text_preview}...\"")
+            self._debug(f"  > 大纲级别: Lv{original_level + 1} → Lv{level} (覆盖) - \"{text_preview}...\"")
         else:
-            self._log(f"  > 大纲级别: 无 → Lv{level} (新设) - \"{text_preview}...\"")
+            self._debug(f"  > 大纲级别: 无 → Lv{level} (新设) - \"{text_preview}...\"")
 
     def _apply_text_indent_and_align(self, para):
-        pf = para.paragraph_format
+        self._text_indent_and_align_format(self._paragraph_format(para))
+
+    def _text_indent_and_align_format(self, pf):
         # 清除 python-docx 层面的缩进
         pf.first_line_indent = None
         pf.left_indent = Cm(self.config['left_indent_cm'])
         pf.right_indent = Cm(self.config['right_indent_cm'])
         
         # 操作底层 XML，彻底清理残留的缩进属性，避免与首行缩进叠加
-        ind = para._p.get_or_add_pPr().get_or_add_ind()
+        ind = pf.get_or_add_ind()
         # 清除可能残留的字符单位左缩进（防止与首行缩进叠加显示为4字符）
         ind.attrib.pop(qn('w:leftChars'), None)
         # 清除可能残留的悬挂缩进
@@ -1100,13 +2698,21 @@ class WordProcessor:
         # 设置首行缩进 2 字符（200 = 2 × 100）
         ind.set(qn("w:firstLineChars"), "200")
         
-        para.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+        pf.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
 
     def _iter_block_items(self, parent):
         parent_elm = parent.element.body if isinstance(parent, _Document) else parent._tc
         for child in parent_elm.iterchildren():
             if isinstance(child, CT_P): yield Paragraph(child, parent)
             elif isinstance(child, CT_Tbl): yield Table(child, parent)
+
+    def _block_record(self, block):
+        if self.format_engine == FORMAT_ENGINE_LXML:
+            return XmlBlockRecord(block)
+        return BlockRecord(block)
+
+    def _collect_block_records(self, doc):
+        return BlockIndex(self._block_record(block) for block in self._iter_block_items(doc))
 
     def _get_or_add_table_pr(self, table):
         tbl = table._tbl
@@ -1135,9 +2741,8 @@ class WordProcessor:
             elem.set(qn('w:color'), color)
             borders.append(elem)
 
-    def _set_cell_borders(self, cell, size_pt=0.5, color="000000"):
+    def _set_cell_borders(self, tc, size_pt=0.5, color="000000"):
         size = max(1, int(float(size_pt) * 8))
-        tc = cell._tc
         tc_pr = tc.tcPr
         if tc_pr is None:
             tc_pr = OxmlElement('w:tcPr')
@@ -1159,6 +2764,40 @@ class WordProcessor:
             elem.set(qn('w:color'), color)
             borders.append(elem)
 
+    @staticmethod
+    def _clear_cell_borders(tc):
+        tc_pr = tc.tcPr
+        borders = tc_pr.find(qn('w:tcBorders')) if tc_pr is not None else None
+        if borders is not None:
+            tc_pr.remove(borders)
+
+    @staticmethod
+    def _table_style_sets_cell_borders(table):
+        """Whether the table's style chain sets cell borders or conditional table borders.
+
+        Those apply per cell and take precedence over the table's own
+        ``w:tblBorders``, so such tables keep explicit ``w:tcBorders``.
+        """
+        style = table.style
+        seen = set()
+        while style is not None and style.style_id not in seen:
+            seen.add(style.style_id)
+            if style.element.xpath('.//w:tcBorders | w:tblStylePr//w:tblBorders'):
+                return True
+            style = style.base_style
+        return False
+
+    @staticmethod
+    def _rows_overriding_table_borders(matrix):
+        """Records of the cells in rows whose ``w:tblPrEx`` sets their own table borders."""
+        tag = f"{qn('w:tblPrEx')}/{qn('w:tblBorders')}"
+        return {
+            id(record)
+            for tr, entries in zip(matrix.rows, matrix.grid)
+            if tr.find(tag) is not None
+            for record in entries
+        }
+
     def _set_table_cell_margins(self, table, top_cm=0.0, bottom_cm=0.0, left_cm=0.05, right_cm=0.05):
         tbl_pr = self._get_or_add_table_pr(table)
         cell_mar = tbl_pr.find(qn('w:tblCellMar'))
@@ -1217,21 +2856,20 @@ class WordProcessor:
         total = sum(pcts) or 1.0
         return [value / total * 100 for value in pcts]
 
-    def _set_table_col_widths_by_content(self, table, min_pct=8, max_pct=45):
-        if not table.rows:
-            return
-        col_count = max(len(row.cells) for row in table.rows)
+    def _set_table_col_widths_by_content(self, table, min_pct=8, max_pct=45, matrix=None):
+        if matrix is None:
+            matrix = TableCellMatrix(table)
+        col_count = matrix.col_count
         if col_count == 0:
             return
 
         min_pct = max(1.0, float(min_pct))
         max_pct = max(min_pct, float(max_pct))
         max_weights = [1.0] * col_count
-        for row in table.rows:
-            for col_idx, cell in enumerate(row.cells):
-                text = ''.join(p.text for p in cell.paragraphs).strip()
-                if text:
-                    max_weights[col_idx] = max(max_weights[col_idx], self._table_text_weight(text))
+        for entries in matrix.grid:
+            for col_idx, record in enumerate(entries):
+                if record.text:
+                    max_weights[col_idx] = max(max_weights[col_idx], record.weight)
 
         pcts = self._normalize_table_pcts(max_weights, min_pct, max_pct)
         tbl = table._tbl
@@ -1248,19 +2886,19 @@ class WordProcessor:
             grid_col.set(qn('w:w'), str(int(pct * 50)))
             tbl_grid.append(grid_col)
 
-        for row in table.rows:
-            for col_idx, cell in enumerate(row.cells):
-                tc = cell._tc
-                tc_pr = tc.tcPr
-                if tc_pr is None:
-                    tc_pr = OxmlElement('w:tcPr')
-                    tc.insert(0, tc_pr)
-                tc_w = tc_pr.find(qn('w:tcW'))
-                if tc_w is None:
-                    tc_w = OxmlElement('w:tcW')
-                    tc_pr.append(tc_w)
-                tc_w.set(qn('w:type'), 'pct')
-                tc_w.set(qn('w:w'), str(int(pcts[col_idx] * 50)))
+        # A merged cell takes the width of the last grid column it covers.
+        for record in matrix.cells:
+            tc = record.tc
+            tc_pr = tc.tcPr
+            if tc_pr is None:
+                tc_pr = OxmlElement('w:tcPr')
+                tc.insert(0, tc_pr)
+            tc_w = tc_pr.find(qn('w:tcW'))
+            if tc_w is None:
+                tc_w = OxmlElement('w:tcW')
+                tc_pr.append(tc_w)
+            tc_w.set(qn('w:type'), 'pct')
+            tc_w.set(qn('w:w'), str(int(pcts[record.col_idx] * 50)))
 
     @staticmethod
     def _is_numeric_table_text(text):
@@ -1297,6 +2935,14 @@ class WordProcessor:
             self._log("未发现表格，跳过表格内容格式化。")
             return
 
+        self._log(f"开始格式化表格内容（共 {len(tables)} 个）...")
+        format_table = self._table_formatter(apply_color)
+        for table_idx, table in enumerate(tables, start=1):
+            self._debug(f"  > 表格 {table_idx}: 调整宽度、行高、字体和单元格格式")
+            format_table(table)
+
+    def _table_formatter(self, apply_color=True):
+        """Return ``format_table(table)``, which applies the configured table layout and cell formats."""
         table_font = self.config.get('table_font', self.config.get('body_font', '仿宋_GB2312'))
         table_header_font = self.config.get('table_header_font', table_font)
         table_size = self._config_float(self.config, 'table_size', self.config.get('body_size', 12))
@@ -1311,260 +2957,785 @@ class WordProcessor:
         header_bold = self.config.get('table_header_bold', True)
         smart_align = self.config.get('table_smart_align', False)
         unified_borders = self.config.get('table_unified_borders', True)
+        border_mode = self._normalize_table_border_mode(self.config.get('table_border_mode'))
 
-        self._log(f"开始格式化表格内容（共 {len(tables)} 个）...")
-        for table_idx, table in enumerate(tables, start=1):
-            self._log(f"  > 表格 {table_idx}: 调整宽度、行高、字体和单元格格式")
+        def format_table(table):
+            matrix = TableCellMatrix(table, short_text_len if smart_align else None)
             table.autofit = not auto_col_width
             self._set_table_width_percent(table, width_percent)
             self._set_table_indent(table, 0)
             self._set_table_cell_margins(table)
+            cell_borders = border_overrides = ()
             if unified_borders:
                 self._set_table_borders(table, size_pt=border_size_pt)
+                # In 'table' mode the table borders alone draw the same grid,
+                # so per-cell copies are only kept where something overrides them.
+                cell_borders = border_mode == TABLE_BORDER_MODE_CELL or self._table_style_sets_cell_borders(table)
+                if not cell_borders:
+                    border_overrides = self._rows_overriding_table_borders(matrix)
             if auto_col_width:
-                self._set_table_col_widths_by_content(table, min_pct=col_min_pct, max_pct=col_max_pct)
-
-            serial_col_idx = None
-            if table.rows:
-                for col_idx, cell in enumerate(table.rows[0].cells):
-                    head_text = ''.join(p.text for p in cell.paragraphs).strip()
-                    if '序号' in head_text or head_text == '序':
-                        serial_col_idx = col_idx
-                        break
-
-            for row_idx, row in enumerate(table.rows):
-                if row_height_cm > 0:
-                    row.height = Cm(row_height_cm)
-                    row.height_rule = WD_ROW_HEIGHT_RULE.AT_LEAST
-
-                for col_idx, cell in enumerate(row.cells):
-                    if unified_borders:
-                        self._set_cell_borders(cell, size_pt=border_size_pt)
-
-                    cell_text = ''.join(p.text for p in cell.paragraphs).strip()
-                    for para in cell.paragraphs:
-                        if para.text.strip():
-                            for run in para.runs:
-                                font_name = table_header_font if row_idx == 0 else table_font
-                                self._set_run_font(run, font_name, table_size, set_color=apply_color)
-                                if row_idx == 0 and header_bold:
-                                    run.font.bold = True
-
-                        para.paragraph_format.first_line_indent = Pt(0)
-                        para.paragraph_format.space_before = Pt(0)
-                        para.paragraph_format.space_after = Pt(0)
-                        if table_line_spacing > 0:
-                            para.paragraph_format.line_spacing_rule = WD_LINE_SPACING.EXACTLY
-                            para.paragraph_format.line_spacing = Pt(table_line_spacing)
+                self._set_table_col_widths_by_content(table, min_pct=col_min_pct, max_pct=col_max_pct, matrix=matrix)
+
+            if row_height_cm > 0:
+                for tr in matrix.rows:
+                    tr.trHeight_val = Cm(row_height_cm)
+                    tr.trHeight_hRule = WD_ROW_HEIGHT_RULE.AT_LEAST
+
+            serial_col_idx = matrix.serial_column()
+            # Each cell is styled once, as of the last grid position it
+            # covers; a cell reaching into the first row keeps the header bold.
+            for record in matrix.cells:
+                if cell_borders or id(record) in border_overrides:
+                    self._set_cell_borders(record.tc, size_pt=border_size_pt)
+                elif unified_borders:
+                    self._clear_cell_borders(record.tc)
+
+                header = record.row_idx == 0
+                template = self._run_font_template(
+                    table_header_font if header else table_font, table_size, apply_color
+                )
+                bold = header_bold and record.in_header
+                cell_text = record.text
+                for p, text in zip(record.paragraphs, record.texts):
+                    if text.strip():
+                        for r in p.r_lst:
+                            template.apply(r)
+                            if bold:
+                                Font(r).bold = True
+
+                    para = Paragraph(p, table)
+                    fmt = para.paragraph_format
+                    fmt.first_line_indent = Pt(0)
+                    fmt.space_before = Pt(0)
+                    fmt.space_after = Pt(0)
+                    if table_line_spacing > 0:
+                        fmt.line_spacing_rule = WD_LINE_SPACING.EXACTLY
+                        fmt.line_spacing = Pt(table_line_spacing)
+                    else:
+                        fmt.line_spacing_rule = WD_LINE_SPACING.SINGLE
+
+                    if smart_align:
+                        if header:
+                            para.alignment = WD_ALIGN_PARAGRAPH.CENTER
+                        elif '合计' in cell_text or '总计' in cell_text:
+                            para.alignment = WD_ALIGN_PARAGRAPH.CENTER
+                        elif serial_col_idx is not None and record.col_idx == serial_col_idx:
+                            para.alignment = WD_ALIGN_PARAGRAPH.CENTER
+                        elif record.numeric:
+                            para.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+                        elif record.short:
+                            para.alignment = WD_ALIGN_PARAGRAPH.CENTER
                         else:
-                            para.paragraph_format.line_spacing_rule = WD_LINE_SPACING.SINGLE
-
-                        if smart_align:
-                            if row_idx == 0:
-                                para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                            elif '合计' in cell_text or '总计' in cell_text:
-                                para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                            elif serial_col_idx is not None and col_idx == serial_col_idx:
-                                para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                            elif self._is_numeric_table_text(cell_text):
-                                para.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-                            elif self._is_short_table_text(cell_text, short_text_len):
-                                para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                            else:
-                                para.alignment = WD_ALIGN_PARAGRAPH.LEFT
+                            para.alignment = WD_ALIGN_PARAGRAPH.LEFT
+
+        return format_table
     
-    def _find_title_and_subtitle_paragraphs(self, doc, is_from_txt, start_index=0):
+    def _find_title_and_subtitle_paragraphs(self, records, is_from_txt, start_index=0):
         """
         查找题目和副标题段落的索引范围
         返回: (title_indices, subtitle_indices)
         title_indices: 题目行的索引列表
         subtitle_indices: 副标题行的索引列表
+        records: _collect_block_records 生成的 BlockIndex，所有扫描共用，
+                 每次查找的开销只与扫描到的区域大小成正比
         """
-        all_blocks = list(self._iter_block_items(doc))
         
         # 查找首个标题行
         first_title_idx = -1
         
         if is_from_txt:
-            self._log("文档源自 TXT，采用智能规则查找题目...")
-            for idx in range(start_index, len(all_blocks)):
-                block = all_blocks[idx]
-                if isinstance(block, Paragraph) and block.text.strip():
-                    text_to_check = block.text.strip()
-                    if RE_TITLE_H1.match(text_to_check) or RE_TITLE_H2.match(text_to_check):
-                        self._log(f"  > 首个非空行 (块 {idx + 1}) 符合标题格式，认定本文档无独立题目。")
-                        return [], []
-                    else:
-                        self._log(f"  > 在块 {idx + 1} 发现首个非空段落，认定为题目首行。")
-                        first_title_idx = idx
-                        break
+            self._debug("文档源自 TXT，采用智能规则查找题目...")
+            idx = records.next_title_candidate(start_index, is_from_txt)
+            if idx != -1:
+                text_to_check = records[idx].stripped
+                if RE_TITLE_H1.match(text_to_check) or RE_TITLE_H2.match(text_to_check):
+                    self._debug(f"  > 首个非空行 (块 {idx + 1}) 符合标题格式，认定本文档无独立题目。")
+                    return [], []
+                else:
+                    self._debug(f"  > 在块 {idx + 1} 发现首个非空段落，认定为题目首行。")
+                    first_title_idx = idx
         else:
-            self._log("正在预扫描以确定居中题目位置...")
-            for idx in range(start_index, len(all_blocks)):
-                block = all_blocks[idx]
-                if not isinstance(block, Paragraph) or not block.text.strip(): 
-                    continue
-                para = block
-                text_to_check = para.text.lstrip()
+            self._debug("正在预扫描以确定居中题目位置...")
+            idx = records.next_title_candidate(start_index, is_from_txt)
+            if idx != -1:
+                text_to_check = records[idx].text.lstrip()
                 if RE_TITLE_H1.match(text_to_check) or RE_TITLE_H2.match(text_to_check):
-                    self._log("  > 发现一级/二级标题，在此之前未找到居中题目。")
+                    self._debug("  > 发现一级/二级标题，在此之前未找到居中题目。")
                     return [], []
-                if self._get_paragraph_alignment(para) == WD_ALIGN_PARAGRAPH.CENTER:
-                    self._log(f"  > 在块 {idx + 1} 发现潜在题目首行。")
-                    first_title_idx = idx
-                    break
+                self._debug(f"  > 在块 {idx + 1} 发现潜在题目首行。")
+                first_title_idx = idx
         
         if first_title_idx == -1:
-            self._log("  > 扫描结束，未能找到题目。")
+            self._debug("  > 扫描结束，未能找到题目。")
             return [], []
         
         # 获取首个标题行的字体字号信息
-        first_title_para = all_blocks[first_title_idx]
-        title_font, title_size = self._get_paragraph_font_info(first_title_para)
+        title_font, title_size = records[first_title_idx].font_info
         
         # 向下查找连续的标题行
         title_indices = [first_title_idx]
         idx = first_title_idx + 1
         
-        while idx < len(all_blocks):
-            block = all_blocks[idx]
-            if not isinstance(block, Paragraph):
+        while idx < len(records):
+            record = records[idx]
+            if record.is_table:
                 break
             
-            para = block
-            text = para.text.strip()
+            text = record.stripped
             
             # 遇到空行，停止标题识别
             if not text:
-                self._log(f"  > 在块 {idx + 1} 遇到空行，标题识别结束。")
+                self._debug(f"  > 在块 {idx + 1} 遇到空行，标题识别结束。")
                 break
             
             # 检查是否居中
-            if self._get_paragraph_alignment(para) != WD_ALIGN_PARAGRAPH.CENTER:
+            if record.alignment != WD_ALIGN_PARAGRAPH.CENTER:
                 break
             
             # 检查字体字号是否与首行相同
-            para_font, para_size = self._get_paragraph_font_info(para)
+            para_font, para_size = record.font_info
             if para_font == title_font and para_size == title_size:
-                self._log(f"  > 块 {idx + 1} 也是标题行（居中且字体字号相同）。")
+                self._debug(f"  > 块 {idx + 1} 也是标题行（居中且字体字号相同）。")
                 title_indices.append(idx)
                 idx += 1
             else:
                 # 字体字号不同，可能是副标题的开始
                 break
         
-        self._log(f"  > 共识别到 {len(title_indices)} 行标题。")
+        self._debug(f"  > 共识别到 {len(title_indices)} 行标题。")
         
         # 查找副标题
         subtitle_indices = []
         subtitle_start_idx = idx
         
         # 跳过空行
-        while subtitle_start_idx < len(all_blocks):
-            block = all_blocks[subtitle_start_idx]
-            if isinstance(block, Paragraph) and block.text.strip():
+        while subtitle_start_idx < len(records):
+            record = records[subtitle_start_idx]
+            if not record.is_table and record.stripped:
                 break
-            if isinstance(block, Paragraph):
+            if not record.is_table:
                 subtitle_start_idx += 1
             else:
                 # 遇到非段落（如表格），停止
                 break
         
         # 检查是否有副标题
-        if subtitle_start_idx < len(all_blocks):
-            block = all_blocks[subtitle_start_idx]
-            if isinstance(block, Paragraph):
-                para = block
-                text = para.text.strip()
+        if subtitle_start_idx < len(records):
+            record = records[subtitle_start_idx]
+            if not record.is_table:
+                text = record.stripped
                 
                 # 副标题必须居中
-                if text and self._get_paragraph_alignment(para) == WD_ALIGN_PARAGRAPH.CENTER:
+                if text and record.alignment == WD_ALIGN_PARAGRAPH.CENTER:
                     # 检查字体字号是否与标题不同
-                    para_font, para_size = self._get_paragraph_font_info(para)
+                    para_font, para_size = record.font_info
                     if para_font != title_font or para_size != title_size:
-                        self._log(f"  > 在块 {subtitle_start_idx + 1} 发现副标题首行（居中且字体字号与标题不同）。")
+                        self._debug(f"  > 在块 {subtitle_start_idx + 1} 发现副标题首行（居中且字体字号与标题不同）。")
                         subtitle_indices.append(subtitle_start_idx)
                         
                         # 查找连续的副标题行
                         subtitle_font, subtitle_size = para_font, para_size
                         idx = subtitle_start_idx + 1
                         
-                        while idx < len(all_blocks):
-                            block = all_blocks[idx]
-                            if not isinstance(block, Paragraph):
+                        while idx < len(records):
+                            record = records[idx]
+                            if record.is_table:
                                 break
                             
-                            para = block
-                            text = para.text.strip()
+                            text = record.stripped
                             
                             # 遇到空行，停止副标题识别
                             if not text:
-                                self._log(f"  > 在块 {idx + 1} 遇到空行，副标题识别结束。")
+                                self._debug(f"  > 在块 {idx + 1} 遇到空行，副标题识别结束。")
                                 break
                             
                             # 检查是否居中
-                            if self._get_paragraph_alignment(para) != WD_ALIGN_PARAGRAPH.CENTER:
+                            if record.alignment != WD_ALIGN_PARAGRAPH.CENTER:
                                 break
                             
                             # 检查字体字号是否与副标题首行相同
-                            para_font, para_size = self._get_paragraph_font_info(para)
+                            para_font, para_size = record.font_info
                             if para_font == subtitle_font and para_size == subtitle_size:
-                                self._log(f"  > 块 {idx + 1} 也是副标题行（居中且字体字号相同）。")
+                                self._debug(f"  > 块 {idx + 1} 也是副标题行（居中且字体字号相同）。")
                                 subtitle_indices.append(idx)
                                 idx += 1
                             else:
                                 break
                         
-                        self._log(f"  > 共识别到 {len(subtitle_indices)} 行副标题。")
+                        self._debug(f"  > 共识别到 {len(subtitle_indices)} 行副标题。")
         
         return title_indices, subtitle_indices
 
+    # ------------------------------------------------------------------
+    # Per-role paragraph formatting shared by all formatting paths
+    # ------------------------------------------------------------------
+    def _apply_title_format(self, para, role, apply_color):
+        """Format a title ('title') or subtitle ('subtitle') line."""
+        self._strip_leading_whitespace(para)
+        self._apply_font_to_runs(para, self.config[f'{role}_font'], self.config[f'{role}_size'], set_color=apply_color)
+        self._title_paragraph_format(self._paragraph_format(para), role)
+
+    def _title_paragraph_format(self, pf, role):
+        pf.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        pf.first_line_indent = None
+
+        # 设置标题行间距
+        spacing = pf.get_or_add_spacing()
+        spacing.set(qn('w:beforeAutospacing'), '0')
+        spacing.set(qn('w:afterAutospacing'), '0')
+        pf.space_before = Pt(0)
+        pf.space_after = Pt(0)
+        pf.line_spacing = Pt(self.config[f'{role}_line_spacing'])
+
+        self._reset_pagination_format(pf)
+
+    def _apply_body_spacing(self, para):
+        self._body_spacing_format(self._paragraph_format(para))
+
+    def _body_spacing_format(self, pf):
+        spacing = pf.get_or_add_spacing()
+        spacing.set(qn('w:beforeAutospacing'), '0'); spacing.set(qn('w:afterAutospacing'), '0')
+        pf.space_before, pf.space_after = Pt(0), Pt(0)
+        pf.line_spacing = Pt(self.config['line_spacing'])
+
+    def _apply_attachment_marker_format(self, para, apply_color):
+        self._strip_leading_whitespace(para)
+        self._apply_font_to_runs(para, self.config['attachment_font'], self.config['attachment_size'], set_color=apply_color)
+        self._attachment_marker_paragraph_format(self._paragraph_format(para))
+        self._format_heading(para, 1)
+
+    def _attachment_marker_paragraph_format(self, pf):
+        self._reset_pagination_format(pf)
+        pf.page_break_before = True
+        pf.left_indent = Pt(0)
+        pf.first_line_indent = None
+
+        ind = pf.get_or_add_ind()
+        ind.set(qn("w:firstLineChars"), "0")
+
+        pf.alignment = WD_ALIGN_PARAGRAPH.LEFT
+
+    def _apply_heading_format(self, para, level, font_role, apply_color):
+        """Format a numbered heading (``level`` 1-4) or, with ``level=None``, an indented body paragraph."""
+        self._strip_leading_whitespace(para)
+        if level is not None:
+            self._format_heading(para, level)
+        self._apply_font_to_runs(para, self.config[f'{font_role}_font'], self.config[f'{font_role}_size'], set_color=apply_color)
+        self._apply_text_indent_and_align(para)
+        self._reset_pagination_properties(para)
+
+    @staticmethod
+    def _needs_h2_bracket_fix(text):
+        return bool(RE_H2_INLINE_TITLE.match(text)) and not (text.startswith('（') and text.strip().endswith('）'))
+
+    @staticmethod
+    def _fix_h2_brackets(text):
+        return text.replace('(', '（', 1).replace(')', '）', 1)
+
+    def _split_h2_inline_body(self, para, title_len, apply_color):
+        """Re-run an H2 paragraph so its first ``title_len`` characters use the H2 font and the rest the body font."""
+        original_runs = []
+        for r in para.runs:
+            original_runs.append({
+                'text': r.text, 'bold': r.bold, 'italic': r.italic,
+                'underline': r.underline, 'font_color': r.font.color.rgb
+            })
+
+        para.clear()
+
+        char_count = 0
+        for run_info in original_runs:
+            run_text = run_info['text']
+            run_end_pos = char_count + len(run_text)
+
+            title_run, body_run, new_run = None, None, None
+
+            if run_end_pos <= title_len:
+                new_run = para.add_run(run_text)
+                self._set_run_font(new_run, self.config['h2_font'], self.config['h2_size'], set_color=apply_color)
+
+            elif char_count >= title_len:
+                new_run = para.add_run(run_text)
+                self._set_run_font(new_run, self.config['body_font'], self.config['body_size'], set_color=apply_color)
+
+            else:
+                split_index = title_len - char_count
+                title_part = run_text[:split_index]
+                body_part = run_text[split_index:]
+
+                if title_part:
+                    title_run = para.add_run(title_part)
+                    self._set_run_font(title_run, self.config['h2_font'], self.config['h2_size'], set_color=apply_color)
+                if body_part:
+                    body_run = para.add_run(body_part)
+                    self._set_run_font(body_run, self.config['body_font'], self.config['body_size'], set_color=apply_color)
+
+            runs_to_format = [r for r in [title_run, body_run] if r] or ([new_run] if new_run else [])
+            for r in runs_to_format:
+                if r:
+                    r.bold = run_info['bold']; r.italic = run_info['italic']
+                    r.underline = run_info['underline']
+                    if run_info['font_color']: r.font.color.rgb = run_info['font_color']
+
+            char_count = run_end_pos
+
+    # ------------------------------------------------------------------
+    # Direct TXT/Markdown writer
+    # ------------------------------------------------------------------
+    def _classify_text_lines(self, lines):
+        """Yield ``(role, text)`` for each source line, mirroring the TXT rules of ``format_document``."""
+        title_idx = next((idx for idx, text in enumerate(lines) if text), -1)
+        if title_idx != -1 and (RE_TITLE_H1.match(lines[title_idx]) or RE_TITLE_H2.match(lines[title_idx])):
+            title_idx = -1
+        is_attachment_enabled = self.config.get('enable_attachment_formatting', False)
+        attachment_title_idx = -1
+
+        for idx, text in enumerate(lines):
+            if not text:
+                yield 'blank', text
+            elif idx == title_idx:
+                yield 'title', text
+            elif idx == attachment_title_idx:
+                yield 'attachment_title', text
+            elif is_attachment_enabled and RE_ATTACHMENT.match(text):
+                yield 'attachment', text
+                next_idx = next((i for i in range(idx + 1, len(lines)) if lines[i]), -1)
+                if next_idx != -1 and not (RE_TITLE_H1.match(lines[next_idx]) or RE_TITLE_H2.match(lines[next_idx])):
+                    attachment_title_idx = next_idx
+            elif RE_HEADING_H1.match(text):
+                yield 'h1', text
+            elif RE_HEADING_H2.match(text):
+                parts = text.split('。', 1)
+                if len(parts) == 2 and parts[1].strip():
+                    yield 'h2_split', text
+                else:
+                    yield 'h2', self._fix_h2_brackets(text) if self._needs_h2_bracket_fix(text) else text
+            elif RE_HEADING_H3.match(text):
+                yield 'h3', text
+            elif RE_HEADING_H4.match(text):
+                yield 'h4', text
+            else:
+                yield 'body', text
+
+    def _build_text_templates(self):
+        """Render the pPr/rPr of every TXT role once, using the same helpers as the paragraph loop."""
+        log_callback, self.log_callback = self.log_callback, None
+        try:
+            scratch = Document()
+            formatters = {
+                'title': lambda p: self._apply_title_format(p, 'title', False),
+                'attachment_title': lambda p: (self._apply_title_format(p, 'title', False), self._format_heading(p, 1)),
+                'attachment': lambda p: (self._apply_body_spacing(p), self._apply_attachment_marker_format(p, False)),
+                'h1': lambda p: (self._apply_body_spacing(p), self._apply_heading_format(p, 1, 'h1', False)),
+                'h2': lambda p: (self._apply_body_spacing(p), self._apply_heading_format(p, 2, 'h2', False)),
+                'h3': lambda p: (self._apply_body_spacing(p), self._apply_heading_format(p, 3, 'body', False)),
+                'h4': lambda p: (self._apply_body_spacing(p), self._apply_heading_format(p, 4, 'body', False)),
+                'body': lambda p: (self._apply_body_spacing(p), self._apply_heading_format(p, None, 'body', False)),
+            }
+            p_props = {}
+            for role, apply_format in formatters.items():
+                para = scratch.add_paragraph('X')
+                apply_format(para)
+                p_props[role] = RE_XMLNS_DECL.sub('', etree.tostring(para._p.pPr, encoding='unicode'))
+            p_props['h2_split'] = p_props['h2']
+
+            r_props = {}
+            for font_role in ('title', 'attachment', 'h1', 'h2', 'body'):
+                run = scratch.add_paragraph().add_run('X')
+                self._set_run_font(run, self.config[f'{font_role}_font'], self.config[f'{font_role}_size'])
+                r_props[font_role] = RE_XMLNS_DECL.sub('', etree.tostring(run._r.rPr, encoding='unicode'))
+        finally:
+            self.log_callback = log_callback
+
+        run_props = {
+            'title': r_props['title'], 'attachment_title': r_props['title'],
+            'attachment': r_props['attachment'], 'h1': r_props['h1'], 'h2': r_props['h2'],
+            'h3': r_props['body'], 'h4': r_props['body'], 'body': r_props['body'],
+        }
+        return p_props, run_props, r_props
+
+    @staticmethod
+    def _text_run_xml(r_pr, text):
+        # Same content model as python-docx's ``Run.text`` setter: tabs become
+        # <w:tab/>, and a <w:t> with outer whitespace keeps xml:space.
+        pieces = ['<w:r>', r_pr]
+        for i, segment in enumerate(text.split('\t')):
+            if i:
+                pieces.append('<w:tab/>')
+            if segment:
+                space = ' xml:space="preserve"' if len(segment.strip()) < len(segment) else ''
+                pieces.append(f'<w:t{space}>{xml_escape(segment)}</w:t>')
+        pieces.append('</w:r>')
+        return ''.join(pieces)
+
+    def _iter_text_paragraph_xml(self, classified):
+        p_props, run_props, r_props = self._build_text_templates()
+        for role, text in classified:
+            if role == 'blank':
+                yield '<w:p/>'
+            elif role == 'h2_split':
+                title_len = len(text.split('。', 1)[0]) + 1
+                yield (f'<w:p>{p_props[role]}'
+                       f'{self._text_run_xml(r_props["h2"], text[:title_len])}'
+                       f'{self._text_run_xml(r_props["body"], text[title_len:])}</w:p>')
+            else:
+                yield f'<w:p>{p_props[role]}{self._text_run_xml(run_props[role], text)}</w:p>'
+
+    def _write_text_document(self, input_path):
+        """Build the formatted Document for a .txt/.md source in one pass.
+
+        Lines are classified and rendered straight to ``w:p`` XML from
+        per-role templates, then parsed into a fresh Document in chunks; the
+        intermediate .docx save/reload and per-paragraph restyling are
+        skipped. Returns None when the text needs the paragraph-by-paragraph
+        path (control characters python-docx would turn into breaks).
+        """
+        lines = self._read_source_text_lines(input_path)
+        if any(RE_DIRECT_TEXT_UNSAFE.search(text) for text in lines):
+            self._log("  > 文本包含控制字符，改用逐段格式化。")
+            return None
+        if self.config.get('normalize_punctuation', False):
+            symbol_changes = 0
+            with self._timer.phase('normalize_symbols'):
+                for idx, text in enumerate(lines):
+                    if not text:
+                        continue
+                    if not self._symbols_may_change(text):
+                        self.last_symbol_stats['skipped'] += 1
+                        continue
+                    self.last_symbol_stats['scanned'] += 1
+                    normalized = self._normalize_symbols_in_text(text)
+                    if normalized != text:
+                        lines[idx] = normalized
+                        symbol_changes += 1
+            self._log_symbol_changes(symbol_changes)
+
+        self._log("正在直接生成格式化文档...")
+        doc = Document()
+        body = doc.element.body
+        anchor = body.sectPr
+        stats = Counter()
+        chunk = []
+
+        def flush():
+            for p in parse_xml(f'<w:body {nsdecls("w")}>{"".join(chunk)}</w:body>'):
+                if anchor is not None:
+                    anchor.addprevious(p)
+                else:
+                    body.append(p)
+            chunk.clear()
+
+        def counted(classified):
+            for role, text in classified:
+                stats[TEXT_ROLE_STAT_LABELS[role]] += 1
+                yield role, text
+
+        for p_xml in self._iter_text_paragraph_xml(counted(self._classify_text_lines(lines))):
+            chunk.append(p_xml)
+            if len(chunk) >= self.DIRECT_TEXT_CHUNK_LINES:
+                flush()
+        if chunk:
+            flush()
+
+        self._log(self._format_stats(stats))
+        return doc
+
+    # ------------------------------------------------------------------
+    # Streaming mode
+    # ------------------------------------------------------------------
+    def _open_streaming_source(self, input_path):
+        """Path of the .docx to stream for ``input_path``, converting and preprocessing it first if needed."""
+        if os.path.splitext(input_path)[1].lower() == '.docx' and not self._com_available():
+            self._log(f"  > {self._com_unavailable_message()}")
+            return input_path
+        with self._timer.phase('convert'):
+            processing_path, _ = self.convert_to_docx(input_path)
+        with self._timer.phase('preprocess'):
+            self._preprocess_com_tasks(processing_path)
+        return processing_path
+
+    @staticmethod
+    def _main_document_member(package):
+        """Zip member name of the main document part of the .docx ``package``."""
+        for rel in etree.fromstring(package.read('_rels/.rels')):
+            if rel.get('Type') == RT.OFFICE_DOCUMENT:
+                return rel.get('Target').lstrip('/')
+        raise ValueError("文档中未找到主文档部件 (document.xml)")
+
+    @staticmethod
+    def _stream_section_skeleton(source):
+        """The document part ``source`` with every block dropped except its section properties.
+
+        A paragraph that ends a section keeps only its ``w:sectPr``, so
+        python-docx sees the same sections, in order, as in the full part.
+        """
+        stream = DocumentBodyStream(source)
+        tag_ppr, tag_sectpr = qn('w:pPr'), qn('w:sectPr')
+        for block in stream:
+            if block.tag == tag_sectpr:
+                continue
+            pPr = block.find(tag_ppr) if block.tag == DocumentBodyStream.TAG_P else None
+            sectPr = pPr.find(tag_sectpr) if pPr is not None else None
+            if sectPr is None:
+                stream.release(block)
+                continue
+            for parent, keep in ((block, pPr), (pPr, sectPr)):
+                for child in list(parent):
+                    if child is not keep:
+                        parent.remove(child)
+        return serialize_part_xml(stream.root)
+
+    @staticmethod
+    def _is_plain_body_record(record):
+        """True for a non-empty, left-aligned ordinary paragraph: no title, caption, attachment or drawing scan goes past one."""
+        return bool(
+            not record.is_table and record.stripped
+            and not (record.has_drawing or record.has_object)
+            and not BlockIndex._is_title_candidate(record, False)
+            and not RE_ATTACHMENT.match(record.stripped)
+        )
+
+    def _format_document_streaming(self, input_path, output_path):
+        """Format a Word document without loading its document.xml as one tree.
+
+        The part is read twice with iterparse: once for the section
+        properties, which go through ``_apply_page_setup`` on a skeleton
+        document together with the footers and settings, and once to format
+        the body in bounded segments that are written straight into the
+        output package. Output matches ``format_document`` unless a segment
+        has to be cut at ``STREAM_MAX_SEGMENT_BLOCKS``.
+        """
+        self._log("流式模式：分段读取并格式化 document.xml...")
+        source_path = self._open_streaming_source(input_path)
+        with self._timer.phase('parse'), zipfile.ZipFile(source_path) as package:
+            member = self._main_document_member(package)
+            skeleton_xml = self._stream_section_skeleton(package.open(member))
+            skeleton = io.BytesIO()
+            with zipfile.ZipFile(skeleton, 'w', zipfile.ZIP_DEFLATED) as skeleton_package:
+                for info in package.infolist():
+                    if info.filename == member:
+                        skeleton_package.writestr(member, skeleton_xml)
+                    else:
+                        copy_zip_member_raw(package, info, skeleton_package)
+            doc = Document(skeleton)
+        del skeleton
+        source = SourcePackage(source_path, doc)
+
+        with self._timer.phase('page_setup'):
+            self._apply_page_setup(doc)
+        body = doc.element.body
+        section_props = body.xpath('./w:p/w:pPr/w:sectPr | ./w:sectPr')
+        for child in list(body):
+            body.remove(child)
+        body.append(etree.Comment(STREAM_BODY_PLACEHOLDER))
+        head, tail = serialize_part_xml(doc.element).split(f'<!--{STREAM_BODY_PLACEHOLDER}-->'.encode())
+
+        def write_document_part(part):
+            with zipfile.ZipFile(source_path) as package:
+                part.write(head)
+                with self._timer.phase('parse'):
+                    self._stream_format_body(package.open(member), part, section_props, doc)
+                part.write(tail)
+
+        self._log("正在保存最终文档...")
+        with self._timer.phase('save'):
+            save_document(doc, output_path, self.output_compression, source, streamed={member: write_document_part})
+
+    def _stream_format_body(self, source, output, section_props, doc):
+        """Format the body of document part ``source`` segment by segment, writing each block to ``output``.
+
+        ``section_props`` are the formatted ``w:sectPr`` elements, in
+        document order, that replace the source ones as they are written.
+        Time not spent formatting or writing is charged to the caller's
+        phase (reading the part).
+        """
+        stream = DocumentBodyStream(source)
+        section_props = iter(section_props)
+        tag_sectpr = qn('w:sectPr')
+        paragraph_sectpr = f"{qn('w:pPr')}/{tag_sectpr}"
+        normalize = self.config.get('normalize_punctuation', False)
+        attachments_enabled = self.config.get('enable_attachment_formatting', False)
+        format_table = None
+        if self.config.get('enable_table_formatting', False):
+            format_table = self._table_formatter()
+        else:
+            self._log("表格自动调整未启用，跳过表格内容格式化。")
+        stats = Counter()
+        pending = deque()
+        records = []
+        at_start = True
+        timer = self._timer
+        symbol_changes = table_count = 0
+
+        def flush(count):
+            """Format the first ``count`` records, then write every block before the next record."""
+            nonlocal at_start, table_count
+            segment = BlockIndex(records[:count])
+            del records[:count]
+            with timer.phase('paragraphs'):
+                self._format_blocks(segment, False, stats, at_document_start=at_start)
+            at_start = False
+            if format_table is not None:
+                with timer.phase('tables'):
+                    for record in segment:
+                        if record.is_table:
+                            format_table(record.block)
+                            table_count += 1
+            stop = records[0].block._element if records else None
+            with timer.phase('save'):
+                while pending and pending[0] is not stop:
+                    element = pending.popleft()
+                    if element.tag == tag_sectpr:
+                        replacement = deepcopy(next(section_props))
+                        stream.body.replace(element, replacement)
+                        element = replacement
+                    elif element.tag == DocumentBodyStream.TAG_P:
+                        sectPr = element.find(paragraph_sectpr)
+                        if sectPr is not None:
+                            sectPr.getparent().replace(sectPr, deepcopy(next(section_props)))
+                    output.write(stream.serialize(element))
+                    stream.release(element)
+
+        awaiting_title = True
+        previous_plain = False
+        for element in stream:
+            pending.append(element)
+            if element.tag == DocumentBodyStream.TAG_P:
+                block = Paragraph(element, doc._body)
+                if normalize:
+                    with timer.phase('normalize_symbols'):
+                        if self._normalize_paragraph_symbols(block):
+                            symbol_changes += 1
+            elif element.tag == DocumentBodyStream.TAG_TBL:
+                block = Table(element, doc._body)
+                if normalize:
+                    with timer.phase('normalize_symbols'):
+                        symbol_changes += self._normalize_table_symbols(block)
+            else:
+                continue
+            record = self._block_record(block)
+            records.append(record)
+            plain = self._is_plain_body_record(record)
+            if len(records) > self.STREAM_MAX_SEGMENT_BLOCKS or (
+                plain and previous_plain and not awaiting_title and len(records) > self.STREAM_SEGMENT_BLOCKS
+            ):
+                flush(len(records) - 1)
+            previous_plain = plain
+            # A title scan (document start, or after an attachment marker)
+            # runs until the next title candidate, so keep that in one segment.
+            if BlockIndex._is_title_candidate(record, False):
+                awaiting_title = False
+            if attachments_enabled and record.alignment in [WD_ALIGN_PARAGRAPH.LEFT, WD_ALIGN_PARAGRAPH.JUSTIFY, None] \
+                    and RE_ATTACHMENT.match(record.stripped):
+                awaiting_title = True
+        flush(len(records))
+
+        if normalize:
+            self._log_symbol_changes(symbol_changes)
+        self._log(self._format_stats(stats))
+        if format_table is not None:
+            self._log(f"表格内容格式化完成（共 {table_count} 个）。")
+
     def format_document(self, input_path, output_path):
-        processing_path, is_from_txt = self.convert_to_docx(input_path)
-        if not is_from_txt: self._preprocess_com_tasks(processing_path)
-        
-        doc = Document(processing_path)
+        """Format ``input_path`` into ``output_path``.
+
+        Per-phase timings are left in ``last_timings``; with
+        ``record_phase_spans`` the phase spans in ``last_phase_spans``, and
+        with ``memory_report`` the per-phase memory peaks in
+        ``last_memory_report``.
+        """
+        memory = MemoryTracker() if self.memory_report else None
+        self.last_symbol_stats = Counter()
+        self._timer = PhaseTimer(record_spans=self.record_phase_spans, memory=memory)
+        try:
+            self._format_document(input_path, output_path)
+        finally:
+            self.last_timings = self._timer.timings()
+            self.last_phase_spans = self._timer.spans
+            self.last_memory_report = memory.report() if memory is not None else None
+
+    def _format_document(self, input_path, output_path):
+        timer = self._timer
+        if self.DIRECT_TEXT_WRITER and os.path.splitext(input_path)[1].lower() in ('.txt', '.md'):
+            with timer.phase('paragraphs'):
+                doc = self._write_text_document(input_path)
+            if doc is not None:
+                with timer.phase('page_setup'):
+                    self._apply_page_setup(doc, is_from_txt=True)
+                self._log("正在保存最终文档...")
+                with timer.phase('save'):
+                    save_document(doc, output_path, self.output_compression)
+                return
+
+        if self.config.get('streaming_mode', False) and os.path.splitext(input_path)[1].lower() not in ('.txt', '.md'):
+            self._format_document_streaming(input_path, output_path)
+            return
+
+        doc, is_from_txt, source = self._open_source_document(input_path)
 
         if self.config.get('normalize_punctuation', False):
-            symbol_changes = self._normalize_document_symbols(doc)
-            self._log(f"符号标准化完成，共修复 {symbol_changes} 个段落/表格单元格。")
+            with timer.phase('normalize_symbols'):
+                symbol_changes = self._normalize_document_symbols(doc)
+            self._log_symbol_changes(symbol_changes)
         
-        all_blocks = list(self._iter_block_items(doc))
+        stats = Counter()
+        with timer.phase('paragraphs'):
+            self._format_blocks(self._collect_block_records(doc), is_from_txt, stats)
+        self._log(self._format_stats(stats))
+        with timer.phase('tables'):
+            self._format_tables(doc, apply_color=not is_from_txt)
+        with timer.phase('page_setup'):
+            self._apply_page_setup(doc, is_from_txt=is_from_txt)
+        self._log("正在保存最终文档...")
+        with timer.phase('save'):
+            save_document(doc, output_path, self.output_compression, source)
+
+    def _format_blocks(self, records, is_from_txt, stats, at_document_start=True):
+        """Classify and restyle the blocks of ``records`` (a BlockIndex), counting roles in ``stats``.
+
+        ``at_document_start`` is False for the later segments of a streamed
+        document, which only look for attachment titles, not a document title.
+        """
         processed_indices = set()
-        
+        detail = self._detail_logging
         apply_color = not is_from_txt
 
         if not is_from_txt:
-            self._log("正在扫描图表标题...")
-            for idx, block in enumerate(all_blocks):
-                is_pic_para = isinstance(block, Paragraph) and self._has_drawing_or_pict(block)
-                is_table = isinstance(block, Table)
-                
-                if not (is_pic_para or is_table): continue
+            if at_document_start: self._log("正在扫描图表标题...")
+            with self._timer.phase('caption_scan'):
+                for idx, record in enumerate(records):
+                    if not (record.has_drawing or record.is_table): continue
                 
-                for direction in [-1, 1]:
-                    caption_found = False
-                    for i in range(idx + direction, -1 if direction == -1 else len(all_blocks), direction):
-                        if i in processed_indices: continue
-                        potential_caption = all_blocks[i]
-                        if not isinstance(potential_caption, Paragraph): break 
-                        text = potential_caption.text.strip()
-                        if text: 
-                            if self._get_paragraph_alignment(potential_caption) == WD_ALIGN_PARAGRAPH.CENTER and (text.startswith("图") or text.startswith("表")):
-                                detected_type = "图" if text.startswith("图") else "表"
-                                self._log(f"  > 发现 {detected_type} 的标题: \"{text[:30]}...\" (在段落 {i+1})")
-                                config_font_key = f'{("figure" if detected_type == "图" else "table")}_caption_font'
-                                config_size_key = f'{("figure" if detected_type == "图" else "table")}_caption_size'
-                                config_font = self.config[config_font_key]
-                                config_size = self.config[config_size_key]
-                                self._apply_font_to_runs(potential_caption, config_font, config_size, set_color=apply_color)
-                                processed_indices.add(i)
-                                caption_found = True
-                            break 
-                    if caption_found: break 
+                    for direction in [-1, 1]:
+                        caption_found = False
+                        for i in range(idx + direction, -1 if direction == -1 else len(records), direction):
+                            if i in processed_indices: continue
+                            caption_record = records[i]
+                            if caption_record.is_table: break 
+                            potential_caption = caption_record.block
+                            text = caption_record.stripped
+                            if text: 
+                                if caption_record.alignment == WD_ALIGN_PARAGRAPH.CENTER and (text.startswith("图") or text.startswith("表")):
+                                    detected_type = "图" if text.startswith("图") else "表"
+                                    if detail: self._debug(f"  > 发现 {detected_type} 的标题: \"{text[:30]}...\" (在段落 {i+1})")
+                                    config_font_key = f'{("figure" if detected_type == "图" else "table")}_caption_font'
+                                    config_size_key = f'{("figure" if detected_type == "图" else "table")}_caption_size'
+                                    config_font = self.config[config_font_key]
+                                    config_size = self.config[config_size_key]
+                                    self._apply_font_to_runs(potential_caption, config_font, config_size, set_color=apply_color)
+                                    caption_record.refresh()
+                                    stats['图表标题'] += 1
+                                    processed_indices.add(i)
+                                    caption_found = True
+                                break 
+                        if caption_found: break 
 
         # 查找主标题和副标题
-        title_indices, subtitle_indices = self._find_title_and_subtitle_paragraphs(doc, is_from_txt)
+        if at_document_start:
+            with self._timer.phase('title_detection'):
+                title_indices, subtitle_indices = self._find_title_and_subtitle_paragraphs(records, is_from_txt)
+        else:
+            title_indices, subtitle_indices = [], []
         
         # 将标题和副标题索引加入已处理集合
         for idx in title_indices:
@@ -1572,137 +3743,107 @@ class WordProcessor:
         for idx in subtitle_indices:
             processed_indices.add(idx)
 
-        self._log("预扫描完成，开始逐段格式化...")
-        if self.config['set_outline']:
-            self._log("【大纲级别设置已启用】")
-        else:
-            self._log("【大纲级别设置已禁用】")
+        if at_document_start:
+            self._log("预扫描完成，开始逐段格式化...")
+            if self.config['set_outline']:
+                self._log("【大纲级别设置已启用】")
+            else:
+                self._log("【大纲级别设置已禁用】")
             
         # 格式化主标题
         if title_indices:
-            self._log(f"\n开始格式化主标题（共 {len(title_indices)} 行）...")
+            if detail: self._debug(f"\n开始格式化主标题（共 {len(title_indices)} 行）...")
             for idx in title_indices:
-                para = all_blocks[idx]
-                self._log(f"段落 {idx + 1}: 主标题行 - \"{para.text[:30]}...\"")
-                self._strip_leading_whitespace(para)
-                self._apply_font_to_runs(para, self.config['title_font'], self.config['title_size'], set_color=apply_color)
-                para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                para.paragraph_format.first_line_indent = None
-                
-                # 设置标题行间距
-                spacing = para._p.get_or_add_pPr().get_or_add_spacing()
-                spacing.set(qn('w:beforeAutospacing'), '0')
-                spacing.set(qn('w:afterAutospacing'), '0')
-                para.paragraph_format.space_before = Pt(0)
-                para.paragraph_format.space_after = Pt(0)
-                para.paragraph_format.line_spacing = Pt(self.config['title_line_spacing'])
-                
-                self._reset_pagination_properties(para)
+                para = records[idx].block
+                if detail: self._debug(f"段落 {idx + 1}: 主标题行 - \"{para.text[:30]}...\"")
+                self._apply_title_format(para, 'title', apply_color)
+                records[idx].refresh()
+                stats['主标题'] += 1
         
         # 格式化副标题
         if subtitle_indices:
-            self._log(f"\n开始格式化副标题（共 {len(subtitle_indices)} 行）...")
+            if detail: self._debug(f"\n开始格式化副标题（共 {len(subtitle_indices)} 行）...")
             for idx in subtitle_indices:
-                para = all_blocks[idx]
-                self._log(f"段落 {idx + 1}: 副标题行 - \"{para.text[:30]}...\"")
-                self._strip_leading_whitespace(para)
-                self._apply_font_to_runs(para, self.config['subtitle_font'], self.config['subtitle_size'], set_color=apply_color)
-                para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                para.paragraph_format.first_line_indent = None
-                
-                # 设置副标题行间距
-                spacing = para._p.get_or_add_pPr().get_or_add_spacing()
-                spacing.set(qn('w:beforeAutospacing'), '0')
-                spacing.set(qn('w:afterAutospacing'), '0')
-                para.paragraph_format.space_before = Pt(0)
-                para.paragraph_format.space_after = Pt(0)
-                para.paragraph_format.line_spacing = Pt(self.config['subtitle_line_spacing'])
-                
-                self._reset_pagination_properties(para)
+                para = records[idx].block
+                if detail: self._debug(f"段落 {idx + 1}: 副标题行 - \"{para.text[:30]}...\"")
+                self._apply_title_format(para, 'subtitle', apply_color)
+                records[idx].refresh()
+                stats['副标题'] += 1
 
         block_idx = 0
-        while block_idx < len(all_blocks):
-            block = all_blocks[block_idx]
+        while block_idx < len(records):
+            record = records[block_idx]
+            block = record.block
             
             if block_idx in processed_indices:
                 if block_idx not in title_indices and block_idx not in subtitle_indices:
-                    self._log(f"块 {block_idx + 1}: 已作为图表/附件标题处理 - 跳过")
+                    if detail: self._debug(f"块 {block_idx + 1}: 已作为图表/附件标题处理 - 跳过")
                 block_idx += 1
                 continue
 
             current_block_num = block_idx + 1
-            if isinstance(block, Table): 
-                self._log(f"块 {current_block_num}: 表格 - 跳过"); block_idx += 1; continue
+            if record.is_table: 
+                stats['表格'] += 1
+                if detail: self._debug(f"块 {current_block_num}: 表格 - 跳过")
+                block_idx += 1; continue
             
             para = block
-            if not para.text.strip(): 
-                self._log(f"段落 {current_block_num}: 空白 - 跳过"); block_idx += 1; continue
+            if not record.stripped: 
+                stats['空白'] += 1
+                if detail: self._debug(f"段落 {current_block_num}: 空白 - 跳过")
+                block_idx += 1; continue
             
-            is_pic = self._has_drawing_or_pict(para)
-            is_embedded_obj = self._has_embedded_object(para)
-            if is_pic or is_embedded_obj:
-                log_msg = "图片" if is_pic else "嵌入对象"
-                self._log(f"段落 {current_block_num}: {log_msg} - 仅格式化文字")
+            if record.has_drawing or record.has_object:
+                stats['图片/嵌入对象'] += 1
+                if detail:
+                    log_msg = "图片" if record.has_drawing else "嵌入对象"
+                    self._debug(f"段落 {current_block_num}: {log_msg} - 仅格式化文字")
                 
-                text_to_check = para.text.lstrip()
-                para_text_preview = text_to_check[:30].replace("\n", " ")
+                text_to_check = record.text.lstrip()
 
                 if RE_HEADING_H1.match(text_to_check):
-                    self._log(f"  > 文字识别为一级标题: \"{para_text_preview}...\"")
+                    if detail: self._debug(f"  > 文字识别为一级标题: \"{self._preview(text_to_check)}...\"")
                     self._apply_font_to_runs(para, self.config['h1_font'], self.config['h1_size'], set_color=apply_color)
                 elif RE_HEADING_H2.match(text_to_check):
-                    self._log(f"  > 文字识别为二级标题: \"{para_text_preview}...\"")
+                    if detail: self._debug(f"  > 文字识别为二级标题: \"{self._preview(text_to_check)}...\"")
                     self._apply_font_to_runs(para, self.config['h2_font'], self.config['h2_size'], set_color=apply_color)
                 elif RE_HEADING_H3.match(text_to_check):
-                    self._log(f"  > 文字识别为三级标题: \"{para_text_preview}...\"")
+                    if detail: self._debug(f"  > 文字识别为三级标题: \"{self._preview(text_to_check)}...\"")
                     self._apply_font_to_runs(para, self.config['body_font'], self.config['body_size'], set_color=apply_color)
                 elif RE_HEADING_H4.match(text_to_check):
-                    self._log(f"  > 文字识别为四级标题: \"{para_text_preview}...\"")
+                    if detail: self._debug(f"  > 文字识别为四级标题: \"{self._preview(text_to_check)}...\"")
                     self._apply_font_to_runs(para, self.config['body_font'], self.config['body_size'], set_color=apply_color)
                 elif text_to_check:
-                    self._log(f"  > 文字识别为正文: \"{para_text_preview}...\"")
+                    if detail: self._debug(f"  > 文字识别为正文: \"{self._preview(text_to_check)}...\"")
                     self._apply_font_to_runs(para, self.config['body_font'], self.config['body_size'], set_color=apply_color)
 
                 block_idx += 1
                 continue
 
-            original_text, text_to_check = para.text, para.text.lstrip()
-            text_to_check_stripped = para.text.strip()
+            original_text, text_to_check = record.text, record.text.lstrip()
+            text_to_check_stripped = record.stripped
             leading_space_count = len(original_text) - len(text_to_check)
-            para_text_preview = text_to_check[:30].replace("\n", " ")
             
-            spacing = para._p.get_or_add_pPr().get_or_add_spacing()
-            spacing.set(qn('w:beforeAutospacing'), '0'); spacing.set(qn('w:afterAutospacing'), '0')
-            para.paragraph_format.space_before, para.paragraph_format.space_after = Pt(0), Pt(0)
-            para.paragraph_format.line_spacing = Pt(self.config['line_spacing'])
+            self._apply_body_spacing(para)
 
             is_attachment_enabled = self.config.get('enable_attachment_formatting', False)
             is_attachment_candidate = False
             if is_from_txt:
                 if RE_ATTACHMENT.match(text_to_check_stripped): is_attachment_candidate = True
-            elif self._get_paragraph_alignment(para) in [WD_ALIGN_PARAGRAPH.LEFT, WD_ALIGN_PARAGRAPH.JUSTIFY, None] and RE_ATTACHMENT.match(text_to_check_stripped):
+            elif record.alignment in [WD_ALIGN_PARAGRAPH.LEFT, WD_ALIGN_PARAGRAPH.JUSTIFY, None] and RE_ATTACHMENT.match(text_to_check_stripped):
                 is_attachment_candidate = True
 
             if is_attachment_enabled and is_attachment_candidate:
-                self._log(f"段落 {current_block_num}: 附件标识 - \"{para_text_preview}...\"")
-                self._strip_leading_whitespace(para)
-                self._apply_font_to_runs(para, self.config['attachment_font'], self.config['attachment_size'], set_color=apply_color)
-                self._reset_pagination_properties(para)
-                para.paragraph_format.page_break_before = True
-                para.paragraph_format.left_indent = Pt(0)
-                para.paragraph_format.first_line_indent = None
-                
-                ind = para._p.get_or_add_pPr().get_or_add_ind()
-                ind.set(qn("w:firstLineChars"), "0")
-                
-                para.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                self._format_heading(para, 1)
+                if detail: self._debug(f"段落 {current_block_num}: 附件标识 - \"{self._preview(text_to_check)}...\"")
+                self._apply_attachment_marker_format(para, apply_color)
+                stats['附件标识'] += 1
 
                 # 查找并格式化附件的标题和副标题
                 search_idx = block_idx + 1
                 
                 # 查找附件的标题和副标题
-                att_title_indices, att_subtitle_indices = self._find_title_and_subtitle_paragraphs(doc, is_from_txt, search_idx)
+                with self._timer.phase('title_detection'):
+                    att_title_indices, att_subtitle_indices = self._find_title_and_subtitle_paragraphs(records, is_from_txt, search_idx)
                 
                 # 将附件的标题和副标题加入已处理集合
                 for idx in att_title_indices:
@@ -1712,46 +3853,24 @@ class WordProcessor:
                 
                 # 格式化附件的标题
                 if att_title_indices:
-                    self._log(f"  > 识别到附件标题（共 {len(att_title_indices)} 行）")
+                    if detail: self._debug(f"  > 识别到附件标题（共 {len(att_title_indices)} 行）")
                     for idx in att_title_indices:
-                        para_title = all_blocks[idx]
-                        self._log(f"    段落 {idx + 1}: 附件标题行 - \"{para_title.text.strip()[:30]}...\"")
-                        self._strip_leading_whitespace(para_title)
-                        self._apply_font_to_runs(para_title, self.config['title_font'], self.config['title_size'], set_color=apply_color)
-                        para_title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                        para_title.paragraph_format.first_line_indent = None
-                        
-                        # 设置标题行间距
-                        spacing = para_title._p.get_or_add_pPr().get_or_add_spacing()
-                        spacing.set(qn('w:beforeAutospacing'), '0')
-                        spacing.set(qn('w:afterAutospacing'), '0')
-                        para_title.paragraph_format.space_before = Pt(0)
-                        para_title.paragraph_format.space_after = Pt(0)
-                        para_title.paragraph_format.line_spacing = Pt(self.config['title_line_spacing'])
-                        
-                        self._reset_pagination_properties(para_title)
+                        para_title = records[idx].block
+                        if detail: self._debug(f"    段落 {idx + 1}: 附件标题行 - \"{para_title.text.strip()[:30]}...\"")
+                        self._apply_title_format(para_title, 'title', apply_color)
                         self._format_heading(para_title, 1)
+                        records[idx].refresh()
+                        stats['附件标题'] += 1
                 
                 # 格式化附件的副标题
                 if att_subtitle_indices:
-                    self._log(f"  > 识别到附件副标题（共 {len(att_subtitle_indices)} 行）")
+                    if detail: self._debug(f"  > 识别到附件副标题（共 {len(att_subtitle_indices)} 行）")
                     for idx in att_subtitle_indices:
-                        para_subtitle = all_blocks[idx]
-                        self._log(f"    段落 {idx + 1}: 附件副标题行 - \"{para_subtitle.text.strip()[:30]}...\"")
-                        self._strip_leading_whitespace(para_subtitle)
-                        self._apply_font_to_runs(para_subtitle, self.config['subtitle_font'], self.config['subtitle_size'], set_color=apply_color)
-                        para_subtitle.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                        para_subtitle.paragraph_format.first_line_indent = None
-                        
-                        # 设置副标题行间距
-                        spacing = para_subtitle._p.get_or_add_pPr().get_or_add_spacing()
-                        spacing.set(qn('w:beforeAutospacing'), '0')
-                        spacing.set(qn('w:afterAutospacing'), '0')
-                        para_subtitle.paragraph_format.space_before = Pt(0)
-                        para_subtitle.paragraph_format.space_after = Pt(0)
-                        para_subtitle.paragraph_format.line_spacing = Pt(self.config['subtitle_line_spacing'])
-                        
-                        self._reset_pagination_properties(para_subtitle)
+                        para_subtitle = records[idx].block
+                        if detail: self._debug(f"    段落 {idx + 1}: 附件副标题行 - \"{para_subtitle.text.strip()[:30]}...\"")
+                        self._apply_title_format(para_subtitle, 'subtitle', apply_color)
+                        records[idx].refresh()
+                        stats['附件副标题'] += 1
                 
                 # 计算下一个要处理的块索引。没有附件标题/副标题时，
                 # 只跳过附件标识本段，避免漏处理紧随其后的正文段落。
@@ -1765,131 +3884,66 @@ class WordProcessor:
                 continue
             
             elif RE_HEADING_H1.match(text_to_check):
-                self._log(f"段落 {current_block_num}: 一级标题 - \"{para_text_preview}...\"")
-                self._strip_leading_whitespace(para)
-                self._format_heading(para, 1)
-                self._apply_font_to_runs(para, self.config['h1_font'], self.config['h1_size'], set_color=apply_color)
-                self._apply_text_indent_and_align(para)
-                self._reset_pagination_properties(para)
+                if detail: self._debug(f"段落 {current_block_num}: 一级标题 - \"{self._preview(text_to_check)}...\"")
+                self._apply_heading_format(para, 1, 'h1', apply_color)
+                stats['一级标题'] += 1
 
             elif RE_HEADING_H2.match(text_to_check):
-                self._log(f"段落 {current_block_num}: 二级标题 - \"{para_text_preview}...\"")
+                if detail: self._debug(f"段落 {current_block_num}: 二级标题 - \"{self._preview(text_to_check)}...\"")
+                stats['二级标题'] += 1
                 self._strip_leading_whitespace(para)
                 
                 parts = para.text.split('。', 1)
                 
                 if len(parts) == 2 and parts[1].strip():
-                    self._log("  > 检测到二级标题与正文在同一段落，执行段内格式拆分。")
-                    title_len = len(parts[0]) + 1
-                    
-                    original_runs = []
-                    for r in para.runs:
-                        original_runs.append({
-                            'text': r.text, 'bold': r.bold, 'italic': r.italic,
-                            'underline': r.underline, 'font_color': r.font.color.rgb
-                        })
-                    
-                    para.clear()
-
-                    char_count = 0
-                    for run_info in original_runs:
-                        run_text = run_info['text']
-                        run_end_pos = char_count + len(run_text)
-                        
-                        title_run, body_run, new_run = None, None, None
-
-                        if run_end_pos <= title_len:
-                            new_run = para.add_run(run_text)
-                            self._set_run_font(new_run, self.config['h2_font'], self.config['h2_size'], set_color=apply_color)
-                        
-                        elif char_count >= title_len:
-                            new_run = para.add_run(run_text)
-                            self._set_run_font(new_run, self.config['body_font'], self.config['body_size'], set_color=apply_color)
-                        
-                        else:
-                            split_index = title_len - char_count
-                            title_part = run_text[:split_index]
-                            body_part = run_text[split_index:]
-                            
-                            if title_part:
-                                title_run = para.add_run(title_part)
-                                self._set_run_font(title_run, self.config['h2_font'], self.config['h2_size'], set_color=apply_color)
-                            if body_part:
-                                body_run = para.add_run(body_part)
-                                self._set_run_font(body_run, self.config['body_font'], self.config['body_size'], set_color=apply_color)
-                        
-                        runs_to_format = [r for r in [title_run, body_run] if r] or ([new_run] if new_run else [])
-                        for r in runs_to_format:
-                            if r:
-                                r.bold = run_info['bold']; r.italic = run_info['italic']
-                                r.underline = run_info['underline']
-                                if run_info['font_color']: r.font.color.rgb = run_info['font_color']
-                        
-                        char_count = run_end_pos
-                    
+                    if detail: self._debug("  > 检测到二级标题与正文在同一段落，执行段内格式拆分。")
+                    self._split_h2_inline_body(para, len(parts[0]) + 1, apply_color)
                     self._format_heading(para, 2)
                     self._apply_text_indent_and_align(para)
                     self._reset_pagination_properties(para)
 
                 else:
-                    match = RE_H2_INLINE_TITLE.match(text_to_check)
-                    if match and not (text_to_check.startswith('（') and text_to_check.strip().endswith('）')):
-                        self._log("  > 已将二级标题的括号统一为中文括号。")
-                        for r in para.runs: r.text = r.text.replace('(', '（', 1).replace(')', '）', 1)
+                    if self._needs_h2_bracket_fix(text_to_check):
+                        if detail: self._debug("  > 已将二级标题的括号统一为中文括号。")
+                        for r in para.runs: r.text = self._fix_h2_brackets(r.text)
                     self._format_heading(para, 2)
                     self._apply_font_to_runs(para, self.config['h2_font'], self.config['h2_size'], set_color=apply_color)
                     self._apply_text_indent_and_align(para)
                     self._reset_pagination_properties(para)
                     
-            elif RE_HEADING_H3.match(text_to_check):
-                self._log(f"段落 {current_block_num}: 三级标题 - \"{para_text_preview}...\"")
-                self._strip_leading_whitespace(para)
-                self._format_heading(para, 3)
-                self._apply_font_to_runs(para, self.config['body_font'], self.config['body_size'], set_color=apply_color)
-                self._apply_text_indent_and_align(para)
-                self._reset_pagination_properties(para)
+            elif RE_HEADING_H3.match(text_to_check):
+                if detail: self._debug(f"段落 {current_block_num}: 三级标题 - \"{self._preview(text_to_check)}...\"")
+                self._apply_heading_format(para, 3, 'body', apply_color)
+                stats['三级标题'] += 1
                 
-            elif RE_HEADING_H4.match(text_to_check):
-                self._log(f"段落 {current_block_num}: 四级标题 - \"{para_text_preview}...\"")
-                self._strip_leading_whitespace(para)
-                self._format_heading(para, 4)
-                self._apply_font_to_runs(para, self.config['body_font'], self.config['body_size'], set_color=apply_color)
-                self._apply_text_indent_and_align(para)
-                self._reset_pagination_properties(para)
+            elif RE_HEADING_H4.match(text_to_check):
+                if detail: self._debug(f"段落 {current_block_num}: 四级标题 - \"{self._preview(text_to_check)}...\"")
+                self._apply_heading_format(para, 4, 'body', apply_color)
+                stats['四级标题'] += 1
                 
             elif not is_from_txt:
-                para_alignment = self._get_paragraph_alignment(para)
+                stats['正文'] += 1
+                para_alignment = record.alignment
                 if para_alignment in [WD_ALIGN_PARAGRAPH.CENTER, WD_ALIGN_PARAGRAPH.RIGHT]:
-                    align_text = "居中" if para_alignment == WD_ALIGN_PARAGRAPH.CENTER else "右对齐"
-                    self._log(f"段落 {current_block_num}: {align_text}正文 - 保留原对齐")
+                    if detail:
+                        align_text = "居中" if para_alignment == WD_ALIGN_PARAGRAPH.CENTER else "右对齐"
+                        self._debug(f"段落 {current_block_num}: {align_text}正文 - 保留原对齐")
                     self._apply_font_to_runs(para, self.config['body_font'], self.config['body_size'], set_color=apply_color)
                     self._reset_pagination_properties(para)
                 elif leading_space_count > 5:
-                    self._log(f"段落 {current_block_num}: 正文 (保留前导空格) - \"{para_text_preview}...\"")
+                    if detail: self._debug(f"段落 {current_block_num}: 正文 (保留前导空格) - \"{self._preview(text_to_check)}...\"")
                     self._apply_font_to_runs(para, self.config['body_font'], self.config['body_size'], set_color=apply_color)
-                    para.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-                    self._reset_pagination_properties(para)
-                elif (para.paragraph_format.first_line_indent is None or para.paragraph_format.first_line_indent.pt == 0) and leading_space_count == 0:
-                    self._log(f"段落 {current_block_num}: 正文 (保留0缩进) - \"{para_text_preview}...\"")
+                    self._justified_body_format(self._paragraph_format(para))
+                elif self._paragraph_format(para).first_line_indent in (None, 0) and leading_space_count == 0:
+                    if detail: self._debug(f"段落 {current_block_num}: 正文 (保留0缩进) - \"{self._preview(text_to_check)}...\"")
                     self._apply_font_to_runs(para, self.config['body_font'], self.config['body_size'], set_color=apply_color)
-                    para.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-                    self._reset_pagination_properties(para)
+                    self._justified_body_format(self._paragraph_format(para))
                 else:
-                    self._log(f"段落 {current_block_num}: 正文 (应用标准缩进) - \"{para_text_preview}...\"")
-                    self._strip_leading_whitespace(para)
-                    self._apply_font_to_runs(para, self.config['body_font'], self.config['body_size'], set_color=apply_color)
-                    self._apply_text_indent_and_align(para)
-                    self._reset_pagination_properties(para)
+                    if detail: self._debug(f"段落 {current_block_num}: 正文 (应用标准缩进) - \"{self._preview(text_to_check)}...\"")
+                    self._apply_heading_format(para, None, 'body', apply_color)
             else:
-                self._log(f"段落 {current_block_num}: 正文 (源自TXT，强制缩进) - \"{para_text_preview}...\"")
-                self._strip_leading_whitespace(para)
-                self._apply_font_to_runs(para, self.config['body_font'], self.config['body_size'], set_color=apply_color)
-                self._apply_text_indent_and_align(para)
-                self._reset_pagination_properties(para)
+                stats['正文'] += 1
+                if detail: self._debug(f"段落 {current_block_num}: 正文 (源自TXT，强制缩进) - \"{self._preview(text_to_check)}...\"")
+                self._apply_heading_format(para, None, 'body', apply_color)
             
             block_idx += 1
-        
-        self._format_tables(doc, apply_color=apply_color)
-        self._apply_page_setup(doc, is_from_txt=is_from_txt)
-        self._log("正在保存最终文档...")
-        doc.save(output_path)
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""Reproducible formatting benchmark for Word Formatter Pro.
+
+``generate_corpus`` writes a deterministic synthetic 公文 corpus (.docx, .txt
+and .md) from a seed and a ``CorpusSpec``; ``run_benchmark`` times
+``WordProcessor.format_document`` on it, end to end and per phase; and
+``compare_results`` flags documents or phases that got slower than a saved
+baseline. ``wfp_cli.py bench`` wraps all three.
+"""
+
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass, fields
+import io
+import json
+import os
+from pathlib import Path
+import platform
+import random
+import statistics
+import struct
+import tempfile
+import zlib
+
+from wfp_version import __version__
+
+
+BENCH_FORMATS = ('docx', 'txt', 'md')
+BENCH_RESULT_VERSION = 1
+# A phase or document counts as a regression when it is slower than the
+# baseline by more than the threshold ratio and by more than this many seconds.
+REGRESSION_MIN_SECONDS = 0.005
+
+CHINESE_DIGITS = '零一二三四五六七八九'
+TOPICS = ('安全生产', '数据治理', '档案管理', '节能降耗', '财务审计', '信息化建设', '应急演练', '人才培养')
+SENTENCES = (
+    '各部门要高度重视，明确责任分工，确保各项工作按期完成',
+    '要加强统筹协调，及时研究解决工作推进中遇到的问题',
+    '请于每月5日前报送上月工作进展情况，逾期未报的予以通报',
+    '对照年度目标任务，逐项梳理完成情况，形成书面报告',
+    '本年度预算执行率达到95.5%，较上年提高3.2个百分点',
+    '坚持问题导向，聚焦重点领域和关键环节，推动工作落实',
+)
+# Chinese punctuation and the ASCII look-alikes normalize_punctuation repairs.
+ASCII_PUNCTUATION = {'，': ',', '：': ':', '；': ';', '（': '(', '）': ')', '！': '!', '？': '?'}
+
+
+@dataclass
+class CorpusSpec:
+    """Size and mix of each generated document."""
+
+    paragraphs: int = 200
+    h1: int = 5
+    h2: int = 15
+    h3: int = 30
+    h4: int = 30
+    attachments: int = 2
+    tables: int = 5
+    images: int = 3
+    # Fraction of body sentences whose punctuation is written as ASCII.
+    punctuation_density: float = 0.3
+    documents: int = 1
+    formats: tuple = BENCH_FORMATS
+
+
+def chinese_number(n):
+    """``n`` (1-9999) in Chinese numerals, as used by 一、 and （一） headings."""
+    if n < 10:
+        return CHINESE_DIGITS[n]
+    if n < 20:
+        return '十' + (CHINESE_DIGITS[n % 10] if n % 10 else '')
+    text = ''
+    pending_zero = False
+    for value, unit in ((1000, '千'), (100, '百'), (10, '十'), (1, '')):
+        digit = n // value % 10
+        if digit:
+            if pending_zero:
+                text += '零'
+            text += CHINESE_DIGITS[digit] + unit
+            pending_zero = False
+        elif text:
+            pending_zero = True
+    return text
+
+
+def _png_bytes(width, height, rng):
+    """A small RGB PNG with random pixels, built without an imaging library."""
+    raw = b''.join(b'\x00' + bytes(rng.randrange(256) for _ in range(width * 3)) for _ in range(height))
+
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack('>I', len(data)) + body + struct.pack('>I', zlib.crc32(body))
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(raw)) + chunk(b'IEND', b'')
+
+
+def _sentence(rng, density):
+    text = rng.choice(SENTENCES) + '。'
+    if rng.random() < density:
+        text = ''.join(ASCII_PUNCTUATION.get(ch, ch) for ch in text[:-1]) + '.'
+    return text
+
+
+def build_outline(spec, rng):
+    """The blocks of one document as ``(kind, text)`` pairs, in order.
+
+    Kinds are title, salutation, h1-h4, body, table, image, attachment and
+    attachment_title. Headings are numbered per parent, and every other
+    block is spread at random over the H1 sections.
+    """
+    topic = rng.choice(TOPICS)
+    blocks = [('title', f'关于做好{topic}工作的通知'), ('salutation', '各有关单位：')]
+    filler = (['h2'] * spec.h2 + ['h3'] * spec.h3 + ['h4'] * spec.h4 + ['body'] * spec.paragraphs
+              + ['table'] * spec.tables + ['image'] * spec.images)
+    rng.shuffle(filler)
+    sections = max(spec.h1, 1)
+    counters = [0, 0, 0, 0]
+    table_no = image_no = 0
+    for section in range(sections):
+        if spec.h1:
+            counters[:] = [counters[0] + 1, 0, 0, 0]
+            blocks.append(('h1', f'{chinese_number(counters[0])}、{topic}重点任务{counters[0]}'))
+        for kind in filler[section * len(filler) // sections:(section + 1) * len(filler) // sections]:
+            if kind == 'h2':
+                counters[1:] = [counters[1] + 1, 0, 0]
+                blocks.append(('h2', f'（{chinese_number(counters[1])}）工作要求。{_sentence(rng, spec.punctuation_density)}'))
+            elif kind == 'h3':
+                counters[2:] = [counters[2] + 1, 0]
+                blocks.append(('h3', f'{counters[2]}. 具体措施'))
+            elif kind == 'h4':
+                counters[3] += 1
+                blocks.append(('h4', f'（{counters[3]}）{_sentence(rng, spec.punctuation_density)}'))
+            elif kind == 'body':
+                text = ''.join(_sentence(rng, spec.punctuation_density) for _ in range(rng.randint(2, 5)))
+                blocks.append(('body', text))
+            elif kind == 'table':
+                table_no += 1
+                blocks.append(('table', f'表{table_no} {topic}任务分解表'))
+            else:
+                image_no += 1
+                blocks.append(('image', f'图{image_no} {topic}工作流程图'))
+    for number in range(1, spec.attachments + 1):
+        blocks.append(('attachment', f'附件{number}'))
+        blocks.append(('attachment_title', f'{topic}工作实施细则（{chinese_number(number)}）'))
+        blocks.extend(('body', _sentence(rng, spec.punctuation_density)) for _ in range(3))
+    return blocks
+
+
+def _table_rows(rng):
+    rows = [['序号', '任务', '责任单位', '完成时限']]
+    for row in range(1, rng.randint(3, 8)):
+        rows.append([str(row), rng.choice(SENTENCES)[:8], f'第{chinese_number(row)}处', f'{rng.randint(1, 12)}月底'])
+    return rows
+
+
+def write_docx(path, blocks, rng):
+    from docx import Document
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Cm
+
+    doc = Document()
+    for kind, text in blocks:
+        if kind == 'table':
+            rows = _table_rows(rng)
+            table = doc.add_table(rows=len(rows), cols=len(rows[0]))
+            for cells, values in zip(table.rows, rows):
+                for cell, value in zip(cells.cells, values):
+                    cell.text = value
+            doc.add_paragraph(text).alignment = WD_ALIGN_PARAGRAPH.CENTER
+        elif kind == 'image':
+            doc.add_picture(io.BytesIO(_png_bytes(16, 12, rng)), width=Cm(8))
+            doc.add_paragraph(text).alignment = WD_ALIGN_PARAGRAPH.CENTER
+        else:
+            paragraph = doc.add_paragraph(text)
+            if kind in ('title', 'attachment_title'):
+                paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    doc.save(path)
+
+
+def write_text(path, blocks, rng, markdown=False):
+    lines = []
+    for kind, text in blocks:
+        if kind == 'table':
+            rows = _table_rows(rng)
+            if markdown:
+                lines.append('| ' + ' | '.join(rows[0]) + ' |')
+                lines.append('|' + ' --- |' * len(rows[0]))
+                lines.extend('| ' + ' | '.join(row) + ' |' for row in rows[1:])
+            else:
+                lines.extend('\t'.join(row) for row in rows)
+            lines.append(text)
+        elif kind == 'image':
+            if markdown:
+                lines.append(f'![{text}](images/figure.png)')
+            lines.append(text)
+        elif markdown and kind in ('title', 'h1'):
+            lines.append(('# ' if kind == 'title' else '## ') + text)
+        else:
+            lines.append(text)
+        lines.append('')
+    Path(path).write_text('\n'.join(lines), encoding='utf-8')
+
+
+def generate_corpus(out_dir, spec=None, seed=0):
+    """Write ``spec.documents`` documents per format into ``out_dir`` and return their paths.
+
+    The same seed and spec always produce the same document text, tables
+    and images, so timings are comparable across runs and versions.
+    """
+    spec = spec or CorpusSpec()
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for number in range(1, spec.documents + 1):
+        for fmt in spec.formats:
+            if fmt not in BENCH_FORMATS:
+                raise ValueError(f"不支持的基准测试文档格式: {fmt}")
+            # Each document gets its own stream, so adding formats or
+            # documents does not change the ones already generated.
+            rng = random.Random(f'{seed}-{number}-{fmt}')
+            blocks = build_outline(spec, rng)
+            path = out_dir / f'bench_{number:03d}.{fmt}'
+            if fmt == 'docx':
+                write_docx(path, blocks, rng)
+            else:
+                write_text(path, blocks, rng, markdown=fmt == 'md')
+            paths.append(path)
+    (out_dir / 'corpus.json').write_text(
+        json.dumps({'seed': seed, 'spec': asdict(spec)}, ensure_ascii=False, indent=2), encoding='utf-8'
+    )
+    return paths
+
+
+def run_benchmark(paths, config, repeat=5, warmup=1):
+    """Time ``format_document`` on each of ``paths``; returns a JSON-ready result dict.
+
+    Every document is formatted ``warmup`` times untimed and then
+    ``repeat`` times; the median of the timed runs is reported for the
+    whole call and for each phase (``WordProcessor.last_timings``).
+    """
+    from wfp_core import WordProcessor
+
+    processor = WordProcessor(config)
+    documents = {}
+    with tempfile.TemporaryDirectory(prefix='wfp_bench_') as tmpdir:
+        for path in paths:
+            path = Path(path)
+            output = os.path.join(tmpdir, path.stem + '_' + path.suffix[1:] + '.docx')
+            runs = []
+            for run in range(warmup + repeat):
+                try:
+                    processor.format_document(str(path), output)
+                finally:
+                    processor._cleanup_temp_files()
+                if run >= warmup:
+                    runs.append(processor.last_timings)
+            phases = dict.fromkeys(name for timings in runs for name in timings)
+            documents[path.name] = {
+                name: {
+                    clock: round(statistics.median(t.get(name, {}).get(clock, 0.0) for t in runs), 6)
+                    for clock in ('wall', 'cpu')
+                }
+                for name in phases
+            }
+    return {
+        'version': BENCH_RESULT_VERSION,
+        'wfp_version': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'documents': documents,
+    }
+
+
+def compare_results(current, baseline, threshold=0.15, clock='wall'):
+    """Regressions of ``current`` against ``baseline`` (both ``run_benchmark`` results).
+
+    Returns ``(document, phase, baseline_seconds, current_seconds)`` for
+    each document phase (or ``'total'``) present in both results that is
+    more than ``threshold`` slower and at least ``REGRESSION_MIN_SECONDS``
+    slower, so sub-millisecond jitter is not reported.
+    """
+    regressions = []
+    for name, phases in current.get('documents', {}).items():
+        base_phases = baseline.get('documents', {}).get(name)
+        if not base_phases:
+            continue
+        for phase, spent in phases.items():
+            if phase not in base_phases:
+                continue
+            before, after = base_phases[phase][clock], spent[clock]
+            if after > before * (1 + threshold) and after - before >= REGRESSION_MIN_SECONDS:
+                regressions.append((name, phase, before, after))
+    return regressions
+
+
+def spec_from_args(args):
+    """CorpusSpec from the ``bench`` subcommand's generator options."""
+    values = {}
+    for field in fields(CorpusSpec):
+        value = getattr(args, field.name, None)
+        if value is not None:
+            values[field.name] = tuple(value) if field.name == 'formats' else value
+    return CorpusSpec(**values)
@@ -4,26 +4,33 @@
 from __future__ import annotations
 
 import argparse
+import contextlib
+import hashlib
 import json
+import logging
 import os
 import sys
+import time
 from dataclasses import dataclass
 from pathlib import Path
 
-from wfp_config import DEFAULT_CONFIG, FONT_SIZE_MAP
-from wfp_core import (
+# wfp_core (python-docx, lxml) is imported inside the functions that format
+# documents, so --version, show-config and install-help start quickly.
+from wfp_config import (
+    BLANK_LINE_MODE_DELETE_SINGLE,
+    BLANK_LINE_MODE_KEEP_SINGLE,
     BLANK_LINE_MODE_OPTIONS,
-    LegacyConversionUnavailable,
+    DEFAULT_CONFIG,
+    FONT_SIZE_MAP,
+    FORMAT_ENGINES,
+    OUTPUT_COMPRESSION_OPTIONS,
     SUPPORTED_FILE_EXTENSIONS,
-    WordProcessor,
-    WPSAppManager,
-    _initialize_com_for_thread,
-    _uninitialize_com_for_thread,
 )
 from wfp_version import __version__
 
 
 CONFIG_FILE_NAME = "wfp_config.json"
+MANIFEST_FORMAT_VERSION = 1
 SUPPORTED_EXTENSIONS = set(SUPPORTED_FILE_EXTENSIONS)
 FONT_SIZE_NAMES = {value: label.split(" ", 1)[0] for label, value in FONT_SIZE_MAP.items()}
 INSTALL_HELP_TEXT = """LibreOffice 安装命令参考：
@@ -101,6 +108,10 @@ CONFIG_DESCRIPTIONS = {
     "table_smart_align": ("表格智能对齐", "true/false"),
     "table_unified_borders": ("统一表格边框", "true/false"),
     "table_border_size_pt": ("表格边框粗细", "pt"),
+    "table_border_mode": ("表格边框写法", "cell / table；table 只写表格级边框，输出更小、保存更快"),
+    "format_engine": ("排版引擎", "python-docx / lxml；两者输出一致，lxml 在大文档上更快"),
+    "streaming_mode": ("流式处理", "true/false，分段读写 document.xml，超大文档内存占用不随文档增长"),
+    "output_compression": ("输出压缩", "store / fast / default / max；未改动的部件尽量原样复制"),
 }
 
 
@@ -116,6 +127,60 @@ class Job:
     output: Path
 
 
+@dataclass
+class JobResult:
+    index: int
+    source: Path
+    status: str
+    output: Path | None = None
+    message: str = ""
+    timings: dict | None = None
+    trace: dict | None = None
+    memory: dict | None = None
+
+
+class ChromeTrace:
+    """Trace-event JSON of a batch for ``format --profile-trace``.
+
+    Opens in chrome://tracing or Perfetto: one row per process, each job a
+    span with its formatting phases nested inside. Times are
+    ``time.perf_counter()`` seconds, which share a clock across processes.
+    """
+
+    def __init__(self):
+        self.events = []
+
+    def add(self, name, pid, start, end, **args):
+        self.events.append({
+            "name": name, "ph": "X", "pid": pid, "tid": pid,
+            "ts": start * 1e6, "dur": (end - start) * 1e6, "args": args,
+        })
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, os.getpid(), start, time.perf_counter(), **args)
+
+    def add_job(self, result):
+        trace = result.trace
+        self.add(result.source.name, trace["pid"], trace["start"], trace["end"],
+                 source=str(result.source), status=result.status)
+        for name, start, end in trace["spans"] or ():
+            self.add(name, trace["pid"], start, end)
+
+    def write(self, path):
+        origin = min((event["ts"] for event in self.events), default=0)
+        events = [dict(event, ts=event["ts"] - origin) for event in self.events]
+        for pid in sorted({event["pid"] for event in events}):
+            label = "wfp_cli" if pid == os.getpid() else f"worker {pid}"
+            events.append({"name": "process_name", "ph": "M", "pid": pid, "tid": pid, "args": {"name": label}})
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+
 def _stderr_log(enabled):
     if not enabled:
         return None
@@ -126,6 +191,11 @@ def _stderr_log(enabled):
     return log
 
 
+def log_level_for(verbose):
+    """``-v`` logs stages and a per-document summary; ``-vv`` adds a line per paragraph."""
+    return logging.DEBUG if (verbose or 0) >= 2 else logging.INFO
+
+
 def parse_value(raw):
     text = raw.strip()
     lowered = text.lower()
@@ -152,9 +222,8 @@ def load_json_file(path):
 def normalize_config(config):
     config = dict(config)
     if "blank_line_mode" not in config and "remove_blank_lines" in config:
-        config["blank_line_mode"] = WordProcessor._normalize_blank_line_mode(
-            None,
-            remove_blank_lines=config.get("remove_blank_lines", True),
+        config["blank_line_mode"] = (
+            BLANK_LINE_MODE_DELETE_SINGLE if config.get("remove_blank_lines", True) else BLANK_LINE_MODE_KEEP_SINGLE
         )
     if "use_custom_english_font" not in config and config.get("use_times_new_roman"):
         config["use_custom_english_font"] = True
@@ -224,6 +293,12 @@ def apply_convenience_overrides(config, args):
         config["normalize_punctuation"] = False
     if getattr(args, "blank_line_mode", None):
         config["blank_line_mode"] = args.blank_line_mode
+    if getattr(args, "engine", None):
+        config["format_engine"] = args.engine
+    if getattr(args, "streaming", False):
+        config["streaming_mode"] = True
+    if getattr(args, "compression", None):
+        config["output_compression"] = args.compression
 
 
 def load_config_with_overrides(args):
@@ -318,6 +393,396 @@ def build_jobs(input_paths, output_arg, recursive=True):
     return jobs
 
 
+def file_sha256(path):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def config_fingerprint(config):
+    payload = json.dumps(normalize_config(config), ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class IncrementalManifest:
+    """Record of previous outputs so unchanged inputs can be skipped.
+
+    Entries are keyed by source path and store the source content hash, the
+    normalized-config hash and the tool version. The content hash is only
+    recomputed when the source size or mtime changed.
+    """
+
+    def __init__(self, path, config, force=False):
+        self.path = Path(path).expanduser().resolve()
+        self.config_hash = config_fingerprint(config)
+        self.force = force
+        self.hits = 0
+        self.misses = 0
+        self.entries = {}
+        self._pending = {}
+        if self.path.exists():
+            try:
+                data = load_json_file(self.path)
+            except (OSError, ValueError):
+                data = {}
+            if data.get("format") == MANIFEST_FORMAT_VERSION:
+                self.entries = data.get("entries", {})
+
+    def _source_state(self, source):
+        stat = source.stat()
+        key = str(source)
+        previous = self.entries.get(key, {})
+        if previous.get("size") == stat.st_size and previous.get("mtime_ns") == stat.st_mtime_ns:
+            digest = previous.get("sha256")
+        else:
+            digest = file_sha256(source)
+        return {"sha256": digest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def is_up_to_date(self, job):
+        key = str(job.source)
+        state = self._source_state(job.source)
+        self._pending[key] = state
+        entry = self.entries.get(key)
+        fresh = (
+            not self.force
+            and entry is not None
+            and entry.get("sha256") == state["sha256"]
+            and entry.get("config") == self.config_hash
+            and entry.get("tool_version") == __version__
+            and entry.get("output") == str(job.output)
+            and job.output.is_file()
+        )
+        if fresh:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return fresh
+
+    def record(self, job):
+        key = str(job.source)
+        state = self._pending.pop(key, None) or self._source_state(job.source)
+        self.entries[key] = dict(
+            state,
+            config=self.config_hash,
+            tool_version=__version__,
+            output=str(job.output),
+        )
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"format": MANIFEST_FORMAT_VERSION, "entries": self.entries},
+                f,
+                ensure_ascii=False,
+                indent=1,
+                sort_keys=True,
+            )
+            f.write("\n")
+        os.replace(tmp_path, self.path)
+
+
+@contextlib.contextmanager
+def profiled(path):
+    """Run the block under cProfile and dump the stats to ``path``; a no-op when ``path`` is None."""
+    if path is None:
+        yield
+        return
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+
+def profile_path(profile_dir, index, job):
+    return None if profile_dir is None else Path(profile_dir) / f"{index:04d}-{job.source.stem}.prof"
+
+
+def run_job(processor, index, job, profile_dir=None):
+    from wfp_core import LegacyConversionUnavailable
+
+    processor.last_timings = None
+    started = time.perf_counter()
+    try:
+        job.output.parent.mkdir(parents=True, exist_ok=True)
+        with profiled(profile_path(profile_dir, index, job)):
+            processor.format_document(str(job.source), str(job.output))
+        result = JobResult(index, job.source, "ok", job.output.resolve())
+    except LegacyConversionUnavailable as exc:
+        result = JobResult(index, job.source, "skipped", message=str(exc))
+    except Exception as exc:  # CLI should continue directory batches.
+        result = JobResult(index, job.source, "failed", message=str(exc))
+    finally:
+        processor._cleanup_temp_files()
+    result.timings = processor.last_timings
+    result.memory = processor.last_memory_report if processor.memory_report else None
+    if processor.record_phase_spans:
+        result.trace = {
+            "pid": os.getpid(),
+            "start": started,
+            "end": time.perf_counter(),
+            "spans": processor.last_phase_spans,
+        }
+    return result
+
+
+def report_result(result, skipped, failures):
+    if result.status == "ok":
+        print(str(result.output), flush=True)
+    elif result.status == "skipped":
+        skipped.append(result.source)
+        print(f"已跳过: {result.source}: {result.message}", file=sys.stderr)
+    else:
+        failures.append((result.source, result.message))
+        print(f"处理失败: {result.source}: {result.message}", file=sys.stderr)
+
+
+def report_timings(result):
+    """Print the per-phase timings of one job as a JSON line on stderr."""
+    payload = {"source": str(result.source), "status": result.status, "timings": result.timings}
+    print(json.dumps(payload, ensure_ascii=False), file=sys.stderr, flush=True)
+
+
+def report_timing_summary(timings):
+    from wfp_core import summarize_timings
+
+    summary = summarize_timings(timings)
+    if not summary:
+        return
+    print(f"阶段耗时汇总（{len(timings)} 个文件，单位秒，墙钟/CPU）：", file=sys.stderr)
+    width = max(len(name) for name in summary)
+    for name, clocks in summary.items():
+        columns = "  ".join(
+            f"{stat} {clocks['wall'][stat]:.3f}/{clocks['cpu'][stat]:.3f}" for stat in ("p50", "p95", "max")
+        )
+        print(f"  {name:<{width}}  {columns}", file=sys.stderr)
+
+
+def _megabytes(size):
+    return "未知" if size is None else f"{size / (1024 * 1024):.1f} MB"
+
+
+def report_memory(result):
+    """Print the memory report of one job as a JSON line on stderr."""
+    payload = {"source": str(result.source), "status": result.status, "memory": result.memory}
+    print(json.dumps(payload, ensure_ascii=False), file=sys.stderr, flush=True)
+
+
+def report_memory_summary(reports):
+    """Summarize per-document peaks; the largest RSS peak is what each worker process must fit."""
+    print(f"内存峰值汇总（{len(reports)} 个文件）：", file=sys.stderr)
+    for key, label in (("rss_peak", "进程 RSS 峰值"), ("traced_peak", "Python 堆峰值")):
+        measured = sorted((memory[key], str(source)) for source, memory in reports if memory[key] is not None)
+        if not measured:
+            print(f"  {label}: 未知", file=sys.stderr)
+            continue
+        values = [size for size, _source in measured]
+        p95 = values[max(0, -(-len(values) * 95 // 100) - 1)]
+        print(
+            f"  {label}: p50 {_megabytes(values[(len(values) - 1) // 2])}，p95 {_megabytes(p95)}，"
+            f"最大 {_megabytes(values[-1])}（{measured[-1][1]}）",
+            file=sys.stderr,
+        )
+    if not any(memory["rss_per_phase"] for _source, memory in reports):
+        print("  注：此平台无法按文档重置 RSS 峰值，数值为工作进程启动以来的峰值。", file=sys.stderr)
+
+
+def resolve_job_count(requested, job_count):
+    if requested is None or requested == 1:
+        return 1
+    if requested <= 0:
+        requested = os.cpu_count() or 1
+    return max(1, min(requested, job_count))
+
+
+def make_conversion_cache(cache_dir, size_mb):
+    if not cache_dir:
+        return None
+    from wfp_core import ConversionCache
+
+    return ConversionCache(cache_dir, max_bytes=int(float(size_mb) * 1024 * 1024))
+
+
+def _conversion_cache_args(args):
+    return getattr(args, "conversion_cache", None), getattr(args, "conversion_cache_size", 2048)
+
+
+def _profile_args(args):
+    return getattr(args, "profile", None), getattr(args, "profile_trace", False), getattr(args, "memory_report", False)
+
+
+def _run_jobs_serial(jobs, config, log, args, trace=None):
+    from wfp_core import WordProcessor, WPSAppManager, _initialize_com_for_thread, _uninitialize_com_for_thread
+
+    com_initialized = _initialize_com_for_thread(log)
+    try:
+        with WPSAppManager(log) as com_mgr:
+            processor = WordProcessor(
+                config,
+                log,
+                com_manager=com_mgr,
+                soffice_path=args.soffice,
+                soffice_timeout=args.soffice_timeout,
+                soffice_persistent=getattr(args, "soffice_server", False),
+                conversion_cache=make_conversion_cache(*_conversion_cache_args(args)),
+                log_level=log_level_for(args.verbose),
+            )
+            profile_dir, processor.record_phase_spans, processor.memory_report = _profile_args(args)
+            try:
+                if getattr(args, "soffice_batch", 0):
+                    with trace.span("soffice_batch") if trace else contextlib.nullcontext():
+                        processor.preconvert_legacy_files([job.source for job in jobs], args.soffice_batch)
+                for index, job in enumerate(jobs, start=1):
+                    if log:
+                        log(f"开始处理 {index}/{len(jobs)}: {job.source}")
+                    yield run_job(processor, index, job, profile_dir)
+            finally:
+                processor.close_soffice_converter()
+                cache = processor.conversion_cache
+                if log and cache is not None:
+                    log(f"转换缓存：命中 {cache.hits} 个，未命中 {cache.misses} 个。")
+    finally:
+        _uninitialize_com_for_thread(com_initialized, log)
+
+
+# Per-process state for --jobs workers: one WordProcessor (and COM manager)
+# per worker process, reused for every job that worker receives.
+_WORKER_PROCESSOR = None
+_WORKER_PROFILE_DIR = None
+
+
+def _shutdown_format_worker(processor, com_mgr, com_initialized, log):
+    from wfp_core import _uninitialize_com_for_thread
+
+    processor.close_soffice_converter()
+    com_mgr.quit()
+    _uninitialize_com_for_thread(com_initialized, log)
+
+
+def _init_format_worker(
+    config,
+    verbose,
+    soffice_path,
+    soffice_timeout,
+    soffice_persistent=False,
+    preconverted=None,
+    conversion_cache=(None, 2048),
+    profile=(None, False, False),
+):
+    global _WORKER_PROCESSOR, _WORKER_PROFILE_DIR
+    import multiprocessing.util
+
+    from wfp_core import WordProcessor, WPSAppManager, _initialize_com_for_thread
+
+    log = _stderr_log(verbose)
+    com_initialized = _initialize_com_for_thread(log)
+    com_mgr = WPSAppManager(log)
+    _WORKER_PROCESSOR = WordProcessor(
+        config,
+        log,
+        com_manager=com_mgr,
+        soffice_path=soffice_path,
+        soffice_timeout=soffice_timeout,
+        soffice_persistent=soffice_persistent,
+        conversion_cache=make_conversion_cache(*conversion_cache),
+        log_level=log_level_for(verbose),
+    )
+    _WORKER_PROCESSOR.preconverted.update(preconverted or {})
+    _WORKER_PROFILE_DIR, _WORKER_PROCESSOR.record_phase_spans, _WORKER_PROCESSOR.memory_report = profile
+    multiprocessing.util.Finalize(
+        None,
+        _shutdown_format_worker,
+        args=(_WORKER_PROCESSOR, com_mgr, com_initialized, log),
+        exitpriority=10,
+    )
+
+
+def _format_job_in_worker(index, job):
+    if _WORKER_PROCESSOR and _WORKER_PROCESSOR.log_callback:
+        _WORKER_PROCESSOR.log_callback(f"[pid {os.getpid()}] 开始处理 {index}: {job.source}")
+    return run_job(_WORKER_PROCESSOR, index, job, _WORKER_PROFILE_DIR)
+
+
+def _run_jobs_parallel(jobs, config, log, args, workers, trace=None):
+    """Yield results from a process pool in completion order."""
+    from wfp_core import WordProcessor
+
+    preconverter = None
+    preconverted = {}
+    if getattr(args, "soffice_batch", 0):
+        # Batch legacy conversion happens once in the parent; workers only pick up the results.
+        preconverter = WordProcessor(
+            config,
+            log,
+            soffice_path=args.soffice,
+            soffice_timeout=args.soffice_timeout,
+            soffice_persistent=getattr(args, "soffice_server", False),
+            conversion_cache=make_conversion_cache(*_conversion_cache_args(args)),
+            log_level=log_level_for(args.verbose),
+        )
+        with trace.span("soffice_batch") if trace else contextlib.nullcontext():
+            preconverter.preconvert_legacy_files([job.source for job in jobs], args.soffice_batch)
+        preconverted = dict(preconverter.preconverted)
+    try:
+        yield from _iter_pool_results(jobs, config, log, args, workers, preconverted)
+    finally:
+        if preconverter is not None:
+            preconverter.close_soffice_converter()
+            preconverter.quit_com_app()
+
+
+def _iter_pool_results(jobs, config, log, args, workers, preconverted):
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    if log:
+        log(f"使用 {workers} 个工作进程并行处理 {len(jobs)} 个文件。")
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_format_worker,
+        initargs=(
+            config,
+            args.verbose,
+            args.soffice,
+            args.soffice_timeout,
+            getattr(args, "soffice_server", False),
+            preconverted,
+            _conversion_cache_args(args),
+            _profile_args(args),
+        ),
+    ) as pool:
+        futures = {
+            pool.submit(_format_job_in_worker, index, job): (index, job)
+            for index, job in enumerate(jobs, start=1)
+        }
+        for future in as_completed(futures):
+            index, job = futures[future]
+            try:
+                yield future.result()
+            except Exception as exc:  # Worker crashed or could not unpickle the job.
+                yield JobResult(index, job.source, "failed", message=f"工作进程异常: {exc}")
+
+
+def in_input_order(results):
+    """Re-sequence completion-order results, releasing each as soon as its turn comes."""
+    pending = {}
+    next_index = 1
+    for result in results:
+        pending[result.index] = result
+        while next_index in pending:
+            yield pending.pop(next_index)
+            next_index += 1
+    for index in sorted(pending):
+        yield pending[index]
+
+
 def format_paths(args):
     input_paths = []
     if args.inputs:
@@ -335,36 +800,70 @@ def format_paths(args):
         print(str(exc), file=sys.stderr)
         return 1
 
-    com_initialized = _initialize_com_for_thread(log)
+    manifest = None
+    if getattr(args, "incremental", None):
+        manifest = IncrementalManifest(args.incremental, config, force=getattr(args, "force", False))
+        pending = []
+        for job in jobs:
+            if manifest.is_up_to_date(job):
+                print(str(job.output.resolve()), flush=True)
+            else:
+                pending.append(job)
+        print(
+            f"增量模式：{manifest.hits} 个文件未变化已跳过，{manifest.misses} 个文件需要处理。",
+            file=sys.stderr,
+        )
+        jobs_by_source = {job.source: job for job in pending}
+        jobs = pending
+
+    profile_dir, profile_trace, memory_report = _profile_args(args)
+    if profile_trace and not profile_dir:
+        print("--profile-trace 需要同时指定 --profile DIR", file=sys.stderr)
+        return 1
+    if profile_dir:
+        Path(profile_dir).mkdir(parents=True, exist_ok=True)
+    trace = ChromeTrace() if profile_trace else None
+
     failures = []
     skipped = []
+    timings = [] if getattr(args, "timings", False) else None
+    memory_reports = [] if memory_report else None
+    workers = resolve_job_count(getattr(args, "jobs", 1), len(jobs))
+    if not jobs:
+        results = iter(())
+    elif workers > 1:
+        results = _run_jobs_parallel(jobs, config, log, args, workers, trace)
+        if getattr(args, "ordered", False):
+            results = in_input_order(results)
+    else:
+        results = _run_jobs_serial(jobs, config, log, args, trace)
+
     try:
-        with WPSAppManager(log) as com_mgr:
-            processor = WordProcessor(
-                config,
-                log,
-                com_manager=com_mgr,
-                soffice_path=args.soffice,
-                soffice_timeout=args.soffice_timeout,
-            )
-            for index, job in enumerate(jobs, start=1):
-                try:
-                    if log:
-                        log(f"开始处理 {index}/{len(jobs)}: {job.source}")
-                    job.output.parent.mkdir(parents=True, exist_ok=True)
-                    processor.format_document(str(job.source), str(job.output))
-                    print(str(job.output.resolve()))
-                except LegacyConversionUnavailable as exc:
-                    skipped.append(job.source)
-                    print(f"已跳过: {job.source}: {exc}", file=sys.stderr)
-                except Exception as exc:  # CLI should continue directory batches.
-                    failures.append((job.source, exc))
-                    print(f"处理失败: {job.source}: {exc}", file=sys.stderr)
-                finally:
-                    processor._cleanup_temp_files()
+        with trace.span("batch", files=len(jobs)) if trace else contextlib.nullcontext():
+            for result in results:
+                report_result(result, skipped, failures)
+                if timings is not None and result.timings:
+                    report_timings(result)
+                    timings.append(result.timings)
+                if memory_reports is not None and result.memory:
+                    report_memory(result)
+                    memory_reports.append((result.source, result.memory))
+                if trace is not None and result.trace:
+                    trace.add_job(result)
+                if manifest is not None and result.status == "ok":
+                    manifest.record(jobs_by_source[result.source])
     finally:
-        _uninitialize_com_for_thread(com_initialized, log)
-
+        if manifest is not None:
+            manifest.save()
+        if trace is not None:
+            trace.write(Path(profile_dir) / "trace.json")
+        if profile_dir:
+            print(f"性能剖析结果已写入: {Path(profile_dir).resolve()}", file=sys.stderr)
+
+    if timings:
+        report_timing_summary(timings)
+    if memory_reports:
+        report_memory_summary(memory_reports)
     if skipped:
         print(f"已跳过 {len(skipped)} 个旧格式文件。", file=sys.stderr)
     if failures:
@@ -381,7 +880,10 @@ def show_config(args):
         "config_file_auto_load": str((Path.cwd() / CONFIG_FILE_NAME).resolve()),
         "supported_inputs": sorted(SUPPORTED_EXTENSIONS),
         "output": "单文件输出 .docx；多文件或目录输出到目录，目录输入会递归保留原目录结构。",
-        "legacy_conversion": ".doc/.wps 在 Windows 优先使用 WPS/Word COM；macOS/Kylin/Linux 或 COM 失败时尝试 LibreOffice soffice；macOS/Kylin/Linux 未安装 LibreOffice 时会跳过旧格式文件。",
+        "legacy_conversion": (
+            ".doc/.wps 在 Windows 优先使用 WPS/Word COM；macOS/Kylin/Linux 或 COM 失败时尝试 LibreOffice soffice；"
+            "macOS/Kylin/Linux 未安装 LibreOffice 时会跳过旧格式文件。"
+        ),
         "font_size_names": {str(key): value for key, value in FONT_SIZE_NAMES.items()},
         "blank_line_modes": BLANK_LINE_MODE_OPTIONS,
         "optional_features": [
@@ -421,6 +923,49 @@ def install_help(_args):
     return 0
 
 
+def run_bench(args):
+    import tempfile
+
+    import wfp_bench
+
+    config, config_source = load_config_with_overrides(args)
+    print(f"使用配置: {config_source}", file=sys.stderr)
+    with contextlib.ExitStack() as stack:
+        corpus = args.corpus or stack.enter_context(tempfile.TemporaryDirectory(prefix="wfp_bench_corpus_"))
+        corpus = Path(corpus)
+        paths = sorted(p for p in corpus.glob("*") if p.is_file() and is_supported_file(p)) if corpus.is_dir() else []
+        if args.generate or not paths:
+            spec = wfp_bench.spec_from_args(args)
+            paths = sorted(wfp_bench.generate_corpus(corpus, spec, seed=args.seed))
+            print(f"已生成基准语料 {len(paths)} 个文件（seed={args.seed}）: {corpus}", file=sys.stderr)
+        results = wfp_bench.run_benchmark(paths, config, repeat=args.repeat, warmup=args.warmup)
+
+    for name, phases in results["documents"].items():
+        total = phases["total"]
+        print(f"  {name}: 墙钟 {total['wall']:.3f}s，CPU {total['cpu']:.3f}s", file=sys.stderr)
+    payload = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(payload + "\n", encoding="utf-8")
+        print(str(Path(args.output).resolve()))
+    else:
+        print(payload)
+
+    if not args.baseline:
+        return 0
+    regressions = wfp_bench.compare_results(results, load_json_file(args.baseline), threshold=args.threshold)
+    for name, phase, before, after in regressions:
+        growth = (after / before - 1) * 100 if before else float('inf')
+        print(
+            f"性能回退: {name} {phase} {before:.3f}s -> {after:.3f}s（+{growth:.0f}%）",
+            file=sys.stderr,
+        )
+    if regressions:
+        print(f"与基线相比有 {len(regressions)} 项性能回退（阈值 {args.threshold:.0%}）。", file=sys.stderr)
+        return 1
+    print("与基线相比未发现性能回退。", file=sys.stderr)
+    return 0
+
+
 def run_tests(_args):
     from wfp_tests import main as test_main
 
@@ -457,10 +1002,96 @@ def build_parser():
         choices=BLANK_LINE_MODE_OPTIONS,
         help="覆盖 TXT/MD 空行处理模式",
     )
+    fmt.add_argument(
+        "--engine",
+        choices=FORMAT_ENGINES,
+        help="排版引擎：python-docx（默认）或 lxml；两者输出一致，lxml 直接读写 XML，大文档更快",
+    )
+    fmt.add_argument(
+        "--streaming",
+        action="store_true",
+        help="流式处理 .docx/.doc/.wps：分段读取和写出 document.xml，超大文档的内存占用不随文档大小增长",
+    )
+    fmt.add_argument(
+        "--compression",
+        choices=OUTPUT_COMPRESSION_OPTIONS,
+        help="输出 .docx 压缩级别：store 不压缩最快，fast 快速压缩，default 默认，max 最小体积",
+    )
     fmt.add_argument("--no-recursive", action="store_true", help="目录输入时不递归扫描")
     fmt.add_argument("--soffice", help="LibreOffice soffice 可执行文件路径；未指定时自动查找")
     fmt.add_argument("--soffice-timeout", type=int, default=120, help="LibreOffice 单文件转换超时秒数")
-    fmt.add_argument("-v", "--verbose", action="store_true", help="输出详细处理日志到 stderr")
+    fmt.add_argument(
+        "--soffice-server",
+        action="store_true",
+        help="批量处理时启动一个常驻 LibreOffice 并复用于所有 .doc/.wps，避免每个文件冷启动",
+    )
+    fmt.add_argument(
+        "--soffice-batch",
+        type=int,
+        default=0,
+        metavar="N",
+        help="先用 LibreOffice 按每批 N 个文件一次性转换全部 .doc/.wps，默认 0（逐个转换）",
+    )
+    fmt.add_argument(
+        "--conversion-cache",
+        metavar="DIR",
+        help="旧格式 .doc/.wps 转换缓存目录；按文件内容复用已转换的 .docx，配置变化时只需重新排版",
+    )
+    fmt.add_argument(
+        "--conversion-cache-size",
+        type=float,
+        default=2048,
+        metavar="MB",
+        help="转换缓存容量上限（MB），超出时按最近最少使用淘汰，默认 2048",
+    )
+    fmt.add_argument(
+        "--incremental",
+        metavar="MANIFEST",
+        help="增量模式清单文件（JSON）；源文件内容、配置和版本均未变化且输出仍存在时跳过该文件",
+    )
+    fmt.add_argument("--force", action="store_true", help="增量模式下忽略清单，重新处理全部文件")
+    fmt.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="并行工作进程数，默认 1（串行）；0 表示使用全部 CPU 核心",
+    )
+    fmt.add_argument(
+        "--ordered",
+        action="store_true",
+        help="并行处理时按输入顺序输出结果；默认按完成顺序输出",
+    )
+    fmt.add_argument(
+        "--profile",
+        metavar="DIR",
+        help="用 cProfile 剖析每个文件的排版，在 DIR 中写入 <序号>-<文件名>.prof"
+        "（可用 snakeviz 或 pstats 查看）",
+    )
+    fmt.add_argument(
+        "--profile-trace",
+        action="store_true",
+        help="配合 --profile：在 DIR 中另写 trace.json，按进程展示整个批次各文件及其排版阶段"
+        "（含 LibreOffice 转换），可在 chrome://tracing 或 Perfetto 中打开",
+    )
+    fmt.add_argument(
+        "--memory-report",
+        action="store_true",
+        help="记录每个文件加载、排版、保存各阶段的 RSS 峰值和 tracemalloc Python 堆峰值及主要分配位置，"
+        "在 stderr 逐行输出 JSON 并汇总单文件峰值（开启后处理明显变慢）",
+    )
+    fmt.add_argument(
+        "--timings",
+        action="store_true",
+        help="在 stderr 为每个文件输出一行 JSON 分阶段耗时（墙钟/CPU 秒），结束时输出 p50/p95/max 汇总",
+    )
+    fmt.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="输出处理日志到 stderr：-v 输出阶段信息和每个文档的排版统计，-vv 额外输出逐段明细",
+    )
     fmt.set_defaults(func=format_paths)
 
     show = subparsers.add_parser("show-config", help="显示当前配置、默认配置说明和可选增强项")
@@ -476,6 +1107,33 @@ def build_parser():
     subparsers.add_parser("install-help", help="显示 LibreOffice 安装提示").set_defaults(func=install_help)
     subparsers.add_parser("test", help="运行内置单元测试").set_defaults(func=run_tests)
 
+    bench = subparsers.add_parser("bench", help="生成合成公文语料并测量排版耗时，可与基线结果比较")
+    add_config_override_args(bench)
+    bench.add_argument(
+        "--corpus",
+        metavar="DIR",
+        help="语料目录；目录为空或指定 --generate 时在此生成，未指定时使用临时目录",
+    )
+    bench.add_argument("--generate", action="store_true", help="即使语料目录已有文件也重新生成")
+    bench.add_argument("--seed", type=int, default=0, help="语料随机种子，相同种子和参数生成相同语料，默认 0")
+    bench.add_argument("--documents", type=int, help="每种格式生成的文档数，默认 1")
+    bench.add_argument("--formats", nargs="+", choices=("docx", "txt", "md"), help="生成的格式，默认 docx txt md")
+    bench.add_argument("--paragraphs", type=int, help="每个文档的正文段落数，默认 200")
+    bench.add_argument("--h1", type=int, help="一级标题数，默认 5")
+    bench.add_argument("--h2", type=int, help="二级标题数，默认 15")
+    bench.add_argument("--h3", type=int, help="三级标题数，默认 30")
+    bench.add_argument("--h4", type=int, help="四级标题数，默认 30")
+    bench.add_argument("--attachments", type=int, help="附件数，默认 2")
+    bench.add_argument("--tables", type=int, help="表格数，默认 5")
+    bench.add_argument("--images", type=int, help="图片数（仅 .docx），默认 3")
+    bench.add_argument("--punctuation-density", type=float, help="使用半角标点的句子比例 0-1，默认 0.3")
+    bench.add_argument("--repeat", type=int, default=5, help="每个文档计时次数，取中位数，默认 5")
+    bench.add_argument("--warmup", type=int, default=1, help="每个文档计时前的预热次数，默认 1")
+    bench.add_argument("-o", "--output", help="结果 JSON 输出路径；未指定时输出到 stdout")
+    bench.add_argument("--baseline", help="基线结果 JSON；任一文档或阶段变慢超过阈值时返回 1")
+    bench.add_argument("--threshold", type=float, default=0.15, help="回退判定阈值（相对基线的比例），默认 0.15")
+    bench.set_defaults(func=run_bench)
+
     return parser
 
 
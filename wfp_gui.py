@@ -924,7 +924,8 @@ class WordFormatterGUI:
                     processor = WordProcessor(
                         collected_config,
                         self.log_to_debug_window,
-                        com_manager=com_mgr
+                        com_manager=com_mgr,
+                        log_level=logging.DEBUG,
                     )
                     if active_tab_index == 0:
                         self._process_files(processor, file_list, output_dir)
@@ -3,26 +3,134 @@
 
 from __future__ import annotations
 
+import contextlib
+import io
+import json
+import logging
 import os
+import pstats
+import random
+import shutil
 import subprocess
+import sys
 import tempfile
+import tracemalloc
 import unittest
+from unittest import mock
+import zipfile
 from pathlib import Path
 
 from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.shared import Pt
 
+import wfp_bench
+import wfp_cli
+import wfp_core
 from wfp_config import DEFAULT_CONFIG
 from wfp_core import (
     BLANK_LINE_MODE_DELETE_SINGLE,
     BLANK_LINE_MODE_KEEP_SINGLE,
     BLANK_LINE_MODE_PRESERVE,
+    BlockIndex,
+    ConversionCache,
     LegacyConversionUnavailable,
     SofficeConverter,
+    SofficeServer,
+    SofficeTimeoutError,
+    TableCellMatrix,
     WordProcessor,
+    copy_zip_member_raw,
+    summarize_timings,
 )
 
 
+def legacy_normalize_symbols(text):
+    """The original five-pass punctuation normalizer, kept as the fuzz test oracle."""
+    is_latin = WordProcessor._is_digit_or_latin
+    dots = {'.', '．', '。'}
+
+    def after_latin(s, i):
+        i -= 1
+        while i >= 0 and s[i].isspace():
+            i -= 1
+        return i >= 0 and is_latin(s[i])
+
+    def before_latin(s, i):
+        i += 1
+        while i < len(s) and s[i].isspace():
+            i += 1
+        return i < len(s) and is_latin(s[i])
+
+    def brackets(s):
+        for opens, closes in (({'(': '（', '（': '（'}, {')': '）', '）': '）'}),
+                              ({'[': '［', '［': '［'}, {']': '］', '］': '］'})):
+            chars, stack = list(s), []
+            for i, ch in enumerate(chars):
+                if ch in opens:
+                    stack.append(i)
+                elif ch in closes and stack:
+                    o = stack.pop()
+                    if (WordProcessor._has_chinese(''.join(chars[o + 1:i]))
+                            and not after_latin(s, o) and not before_latin(s, i)):
+                        chars[o], chars[i] = opens[chars[o]], closes[ch]
+            s = ''.join(chars)
+        return s
+
+    def ellipsis(s):
+        out, i = [], 0
+        while i < len(s):
+            if s[i] not in dots:
+                out.append(s[i])
+                i += 1
+                continue
+            j = i + 1
+            while j < len(s) and s[j] in dots:
+                j += 1
+            out.append('……' if j - i >= 3 and not after_latin(s, i) else s[i:j])
+            i = j
+        return ''.join(out)
+
+    def quotes(s, marks, left, right, skip_inner_latin=False):
+        chars, o = list(s), None
+        for i, ch in enumerate(chars):
+            if ch not in marks:
+                continue
+            prev, nxt = after_latin(s, i), before_latin(s, i)
+            if skip_inner_latin and prev and nxt:
+                continue
+            if o is None:
+                if not prev:
+                    o = i
+                continue
+            if (WordProcessor._has_chinese(''.join(chars[o + 1:i]))
+                    and not after_latin(s, o) and not before_latin(s, i)):
+                chars[o], chars[i] = left, right
+            o = None
+        return ''.join(chars)
+
+    def simple(s):
+        table = {',': '，', '.': '。', '．': '。', ';': '；', ':': '：', '?': '？', '!': '！'}
+        chars = list(s)
+        for i, ch in enumerate(chars):
+            if ch not in table:
+                continue
+            if ch in dots and ((i > 0 and s[i - 1] in dots) or (i + 1 < len(s) and s[i + 1] in dots)):
+                continue
+            if not after_latin(s, i):
+                chars[i] = table[ch]
+        return ''.join(chars)
+
+    if not text or not WordProcessor._has_chinese(text):
+        return text
+    text = ellipsis(brackets(text))
+    text = quotes(text, {'"', '“', '”', '„', '‟', '「', '」'}, '“', '”')
+    text = quotes(text, {"'", '‘', '’', '‚', '‛'}, '‘', '’', skip_inner_latin=True)
+    return simple(text)
+
+
 class TextNormalizationTests(unittest.TestCase):
     def test_symbol_normalization_keeps_decimal_numbers(self):
         self.assertEqual(
@@ -44,6 +152,36 @@ class TextNormalizationTests(unittest.TestCase):
             "version 1.2",
         )
 
+    def test_symbol_normalization_matches_legacy_passes_on_fuzz_corpus(self):
+        alphabet = list('.．。,;:?!()（）[]［］"“”„‟「」\'‘’‚‛…') + list('中文字') + list('aZ9０Ａｚ') + [' ', '\u3000', '\t']
+        rng = random.Random(20240521)
+        for _ in range(20000):
+            text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 40)))
+            normalized = WordProcessor._normalize_symbols_in_text(text)
+            self.assertEqual(normalized, legacy_normalize_symbols(text), text)
+            if not WordProcessor._symbols_may_change(text):
+                self.assertEqual(normalized, text)
+        for _ in range(2000):
+            text = ''.join(rng.choice('。（）［］…中文aZ9０ ') for _ in range(rng.randint(1, 40)))
+            if not WordProcessor._symbols_may_change(text):
+                self.assertEqual(legacy_normalize_symbols(text), text, text)
+        text = "说(附件)：don't 说'好' [注]" + ' ' * 5000 + '.' + ' ' * 5000 + 'a'
+        self.assertEqual(WordProcessor._normalize_symbols_in_text(text), legacy_normalize_symbols(text))
+
+    def test_table_symbols_normalize_each_cell_once_including_nested_tables(self):
+        doc = Document()
+        table = doc.add_table(rows=3, cols=3)
+        merged = table.cell(0, 0).merge(table.cell(1, 2))
+        merged.text = "合并单元格,内容"
+        nested = table.cell(2, 1).add_table(rows=1, cols=1)
+        nested.cell(0, 0).text = "嵌套表格:内容"
+
+        processor = WordProcessor(DEFAULT_CONFIG.copy())
+        self.assertEqual(processor._normalize_document_symbols(doc), 2)
+        self.assertEqual(table.cell(1, 1).text, "合并单元格，内容")
+        self.assertEqual(nested.cell(0, 0).text, "嵌套表格：内容")
+        self.assertEqual(processor.last_symbol_stats['scanned'], 2)
+
     def test_markdown_cleaning(self):
         raw = "# 标题\n**粗体** 和 [链接](https://example.com)\n![图片](a.png)\n> 引用"
         cleaned = WordProcessor._clean_markdown(raw)
@@ -114,6 +252,49 @@ class TableHelperTests(unittest.TestCase):
         self.assertAlmostEqual(sum(pcts), 100.0)
         self.assertEqual(pcts, [20.0, 80.0])
 
+    def test_cell_matrix_matches_row_cells_and_lists_each_cell_once(self):
+        doc = Document()
+        table = doc.add_table(rows=3, cols=3)
+        table.cell(0, 0).text = "序号"
+        table.cell(0, 2).merge(table.cell(1, 2)).text = "备注"
+        table.cell(2, 0).merge(table.cell(2, 1)).text = "合计"
+
+        matrix = TableCellMatrix(table, short_text_len=4)
+        self.assertEqual(
+            [[record.tc for record in entries] for entries in matrix.grid],
+            [[cell._tc for cell in row.cells] for row in table.rows],
+        )
+        self.assertEqual(len(matrix.cells), 7)
+        self.assertEqual(len({id(record.tc) for record in matrix.cells}), 7)
+        self.assertEqual(matrix.serial_column(), 0)
+        remark = matrix.grid[0][2]
+        self.assertEqual((remark.text, remark.row_idx, remark.col_idx, remark.in_header), ("备注", 1, 2, True))
+        total = matrix.grid[2][0]
+        self.assertEqual((total.col_idx, total.short, total.numeric), (1, True, False))
+
+    def test_table_border_mode_keeps_cell_borders_only_where_overridden(self):
+        def tc_borders(table):
+            return [tc.find(f"{qn('w:tcPr')}/{qn('w:tcBorders')}") is not None for tc in table._tbl.iter(qn('w:tc'))]
+
+        doc = Document()
+        plain = doc.add_table(rows=2, cols=2)
+        WordProcessor(DEFAULT_CONFIG.copy())._set_cell_borders(plain.cell(0, 0)._tc, size_pt=3)
+        row_override = doc.add_table(rows=2, cols=2)
+        tbl_pr_ex = OxmlElement('w:tblPrEx')
+        tbl_pr_ex.append(OxmlElement('w:tblBorders'))
+        row_override._tbl.tr_lst[1].insert(0, tbl_pr_ex)
+        styled = doc.add_table(rows=1, cols=2)
+        styled.style = doc.styles['Light Grid Accent 1']
+
+        config = dict(DEFAULT_CONFIG, enable_table_formatting=True, table_border_mode='table')
+        format_table = WordProcessor(config)._table_formatter()
+        for table in (plain, row_override, styled):
+            format_table(table)
+            self.assertIsNotNone(table._tbl.tblPr.find(qn('w:tblBorders')))
+        self.assertEqual(tc_borders(plain), [False] * 4)
+        self.assertEqual(tc_borders(row_override), [False, False, True, True])
+        self.assertEqual(tc_borders(styled), [True, True])
+
 
 class OoxmlProtectionTests(unittest.TestCase):
     def test_ooxml_element_detection(self):
@@ -150,6 +331,88 @@ class OoxmlProtectionTests(unittest.TestCase):
         self.assertEqual(len(para.runs), 2)
         self.assertEqual(para.text, "正文")
 
+    def test_block_records_capture_classification_features(self):
+        doc = Document()
+        title = doc.add_paragraph("  题目 ")
+        title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        doc.add_table(rows=1, cols=1)
+        picture = doc.add_paragraph("图片")
+        picture.runs[0]._r.append(OxmlElement("w:drawing"))
+
+        processor = WordProcessor(DEFAULT_CONFIG.copy())
+        records = processor._collect_block_records(doc)
+
+        self.assertEqual([record.is_table for record in records], [False, True, False])
+        self.assertEqual((records[0].text, records[0].stripped), ("  题目 ", "题目"))
+        self.assertEqual(records[0].alignment, WD_ALIGN_PARAGRAPH.CENTER)
+        self.assertTrue(records[2].has_drawing)
+        self.assertFalse(records[2].has_object)
+
+        processor._apply_title_format(title, "title", True)
+        self.assertEqual(records[0].text, "  题目 ")
+        records[0].refresh()
+        self.assertEqual(records[0].text, "题目 ")
+        self.assertEqual(records[0].font_info, (DEFAULT_CONFIG["title_font"], DEFAULT_CONFIG["title_size"]))
+
+    def test_run_font_template_keeps_other_properties_in_schema_order(self):
+        doc = Document()
+        para = doc.add_paragraph()
+        styled = para.add_run("甲")
+        styled.bold = True
+        styled.font.color.theme_color = 5
+        styled._r.rPr.get_or_add_rFonts().set(qn("w:asciiTheme"), "minorHAnsi")
+        plain = para.add_run("乙")
+
+        processor = WordProcessor(DEFAULT_CONFIG.copy())
+        processor._apply_font_to_runs(para, "仿宋", 16, True)
+
+        rPr = styled._r.rPr
+        self.assertEqual([child.tag for child in rPr], [qn("w:rFonts"), qn("w:b"), qn("w:color"), qn("w:sz")])
+        self.assertIsNone(rPr.rFonts.get(qn("w:asciiTheme")))
+        self.assertEqual(rPr.color.attrib, {qn("w:val"): "000000"})
+        self.assertEqual(styled.font.size, Pt(16))
+        self.assertEqual(plain._r.rPr.rFonts.get(qn("w:eastAsia")), "仿宋")
+        self.assertIsNot(plain._r.rPr, processor._run_font_template("仿宋", 16, True).rPr)
+
+
+class TitleScanTests(unittest.TestCase):
+    class CountingIndex(BlockIndex):
+        reads = 0
+
+        def __getitem__(self, idx):
+            type(self).reads += 1
+            return super().__getitem__(idx)
+
+    def _attachment_scan_reads(self, attachment_count):
+        doc = Document()
+        for number in range(1, attachment_count + 1):
+            doc.add_paragraph(f"附件{number}")
+            for _ in range(5):
+                doc.add_paragraph("正文")
+        processor = WordProcessor(DEFAULT_CONFIG.copy())
+        records = self.CountingIndex(processor._collect_block_records(doc))
+        self.CountingIndex.reads = 0
+        for idx in range(0, len(records), 6):
+            self.assertEqual(processor._find_title_and_subtitle_paragraphs(records, False, idx + 1), ([], []))
+        return self.CountingIndex.reads
+
+    def test_attachment_title_scans_scale_linearly(self):
+        small = self._attachment_scan_reads(50)
+        large = self._attachment_scan_reads(400)
+        self.assertLessEqual(large, small * 8)
+
+    def test_next_title_candidate_matches_scan_rules(self):
+        doc = Document()
+        doc.add_paragraph("")
+        doc.add_paragraph("正文")
+        doc.add_table(rows=1, cols=1)
+        doc.add_paragraph("一、标题")
+        doc.add_paragraph("居中").alignment = WD_ALIGN_PARAGRAPH.CENTER
+        records = WordProcessor(DEFAULT_CONFIG.copy())._collect_block_records(doc)
+
+        self.assertEqual([records.next_title_candidate(i, True) for i in range(6)], [1, 1, 3, 3, 4, -1])
+        self.assertEqual([records.next_title_candidate(i, False) for i in range(6)], [3, 3, 3, 3, 4, -1])
+
 
 class TempAndConversionTests(unittest.TestCase):
     def test_temp_docx_path_uses_system_temp_and_safe_name(self):
@@ -190,6 +453,23 @@ class TempAndConversionTests(unittest.TestCase):
                 processor._cleanup_temp_files()
             self.assertFalse(os.path.exists(temp_docx))
 
+    @unittest.skipIf(WordProcessor._com_available(), "COM preprocessing needs a temp copy")
+    def test_docx_is_formatted_in_memory_without_temp_copy(self):
+        with tempfile.TemporaryDirectory(prefix="wfp_in_memory_test_") as tmpdir:
+            source = Path(tmpdir) / "source.docx"
+            source_doc = Document()
+            source_doc.add_paragraph("一、标题")
+            source_doc.save(source)
+            original = source.read_bytes()
+
+            processor = WordProcessor(DEFAULT_CONFIG.copy())
+            output = Path(tmpdir) / "out.docx"
+            processor.format_document(str(source), str(output))
+
+            self.assertEqual(processor.temp_files, [])
+            self.assertEqual(source.read_bytes(), original)
+            self.assertEqual(Document(output).paragraphs[0].text, "一、标题")
+
     def test_missing_soffice_marks_legacy_conversion_skipped(self):
         class MissingConverter:
             available = False
@@ -213,6 +493,210 @@ class TempAndConversionTests(unittest.TestCase):
                 processor.format_document(str(source), str(Path(tmpdir) / "legacy_formatted.docx"))
 
 
+class PersistentSofficeTests(unittest.TestCase):
+    def test_persistent_converter_reuses_server_and_closes_it(self):
+        class FakeServer:
+            def __init__(self):
+                self.converted = []
+                self.stopped = False
+
+            def convert(self, input_path, output_path, log=None):
+                self.converted.append(Path(input_path).name)
+                Path(output_path).write_bytes(b"docx")
+
+            def stop(self):
+                self.stopped = True
+
+        server = FakeServer()
+        converter = SofficeConverter("soffice", persistent=True)
+        converter.server = server
+        with tempfile.TemporaryDirectory(prefix="wfp_soffice_server_test_") as tmpdir:
+            for name in ("a.doc", "b.wps"):
+                source = Path(tmpdir) / name
+                source.write_bytes(b"legacy")
+                converted, work_dir = converter.convert_to_docx(source)
+                try:
+                    self.assertEqual(converted.read_bytes(), b"docx")
+                    self.assertEqual(converted.suffix, ".docx")
+                finally:
+                    shutil.rmtree(work_dir, ignore_errors=True)
+        converter.close()
+        self.assertEqual(server.converted, ["a.doc", "b.wps"])
+        self.assertTrue(server.stopped)
+        self.assertIsNone(converter.server)
+
+    def test_server_restarts_once_after_crash(self):
+        class CrashingServer(SofficeServer):
+            def __init__(self):
+                super().__init__("soffice")
+                self.alive = False
+                self.starts = 0
+                self.attempts = 0
+
+            def start(self, log=None):
+                self.starts += 1
+                self.alive = True
+                self.process = object()
+
+            def is_healthy(self):
+                return self.alive
+
+            def _convert_once(self, input_path, output_path):
+                self.attempts += 1
+                if self.attempts == 1:
+                    self.alive = False
+                    raise RuntimeError("bridge disposed")
+
+            def stop(self):
+                self.alive = False
+
+        server = CrashingServer()
+        server.convert("in.doc", "out.docx")
+        self.assertEqual(server.attempts, 2)
+        self.assertEqual(server.starts, 2)
+        self.assertEqual(server.restarts, 1)
+
+    def test_conversion_timeout_is_not_retried_and_reaches_caller(self):
+        class HangingServer(SofficeServer):
+            def __init__(self):
+                super().__init__("soffice")
+                self.attempts = 0
+                self.alive = True
+
+            def ensure_running(self, log=None):
+                self.alive = True
+
+            def is_healthy(self):
+                return self.alive
+
+            def _convert_once(self, input_path, output_path):
+                self.attempts += 1
+                self.alive = False
+                raise SofficeTimeoutError("conversion timed out")
+
+        server = HangingServer()
+        with self.assertRaises(SofficeTimeoutError):
+            server.convert("in.doc", "out.docx")
+        self.assertEqual(server.attempts, 1)
+
+        converter = SofficeConverter("soffice", persistent=True)
+        converter.server = server
+        with tempfile.TemporaryDirectory(prefix="wfp_soffice_timeout_test_") as tmpdir:
+            source = Path(tmpdir) / "a.doc"
+            source.write_bytes(b"legacy")
+            with self.assertRaises(SofficeTimeoutError):
+                converter.convert_to_docx(source)
+
+
+FAKE_SOFFICE_SCRIPT = """#!/usr/bin/env python3
+import pathlib, sys
+args = sys.argv[1:]
+out_dir = pathlib.Path(args[args.index("--outdir") + 1])
+calls = out_dir.parent / "calls.txt"
+with calls.open("a", encoding="utf-8") as fh:
+    fh.write("call\\n")
+for arg in args[args.index("--outdir") + 2:]:
+    source = pathlib.Path(arg)
+    if source.stem != "broken":
+        (out_dir / (source.stem + ".docx")).write_bytes(source.read_bytes())
+"""
+
+
+class BatchSofficeTests(unittest.TestCase):
+    def test_chunks_never_share_an_output_stem(self):
+        paths = [Path("a/x.doc"), Path("b/x.wps"), Path("y.doc"), Path("z.doc")]
+        chunks = SofficeConverter._chunk_by_unique_stem(paths, 2)
+        self.assertEqual(chunks, [[Path("a/x.doc"), Path("y.doc")], [Path("b/x.wps"), Path("z.doc")]])
+
+        # A repeated stem skips the chunks that already hold it, even after earlier chunks fill up.
+        paths = [Path("a/x.doc"), Path("b/X.doc"), Path("c/x.doc"), Path("y.doc"), Path("z.doc"), Path("w.doc")]
+        chunks = SofficeConverter._chunk_by_unique_stem(paths, 2)
+        self.assertEqual(
+            chunks,
+            [[Path("a/x.doc"), Path("y.doc")], [Path("b/X.doc"), Path("z.doc")], [Path("c/x.doc"), Path("w.doc")]],
+        )
+
+    @unittest.skipIf(os.name == "nt", "fake soffice is a POSIX script")
+    def test_convert_many_maps_outputs_and_failures_per_file(self):
+        with tempfile.TemporaryDirectory(prefix="wfp_soffice_batch_test_") as tmpdir:
+            root = Path(tmpdir)
+            fake = root / "soffice"
+            fake.write_text(FAKE_SOFFICE_SCRIPT, encoding="utf-8")
+            fake.chmod(0o755)
+            sources = []
+            for name in ("one.doc", "two.wps", "broken.doc", "three.doc"):
+                source = root / name
+                source.write_bytes(name.encode())
+                sources.append(source)
+
+            processor = WordProcessor(DEFAULT_CONFIG.copy(), soffice_path=str(fake))
+            try:
+                converted = processor.preconvert_legacy_files(sources + [root / "plain.docx"], chunk_size=3)
+                self.assertEqual(converted, 3)
+                work_dir = processor._preconvert_dirs[0]
+                self.assertEqual((work_dir / "calls.txt").read_text().count("call"), 2)
+
+                temp_docx = processor._make_temp_docx_path("converted", "two")
+                processor._convert_legacy_with_soffice(str(root / "two.wps"), temp_docx)
+                self.assertEqual(Path(temp_docx).read_bytes(), b"two.wps")
+                with self.assertRaises(RuntimeError):
+                    processor._convert_legacy_with_soffice(str(root / "broken.doc"), temp_docx)
+            finally:
+                processor._cleanup_temp_files()
+                processor.close_soffice_converter()
+            self.assertFalse(work_dir.exists())
+
+
+class ConversionCacheTests(unittest.TestCase):
+    def test_cache_is_content_addressed_and_lru_bounded(self):
+        with tempfile.TemporaryDirectory(prefix="wfp_conv_cache_test_") as tmpdir:
+            root = Path(tmpdir)
+            cache = ConversionCache(root / "cache", max_bytes=250)
+            first = root / "first.doc"
+            renamed = root / "renamed.doc"
+            first.write_bytes(b"same bytes")
+            renamed.write_bytes(b"same bytes")
+            self.assertEqual(cache.key(first, "soffice:a"), cache.key(renamed, "soffice:a"))
+            self.assertNotEqual(cache.key(first, "soffice:a"), cache.key(first, "soffice:b"))
+
+            payloads = {}
+            for name in ("a", "b", "c"):
+                payload = root / f"{name}.docx"
+                payload.write_bytes(name.encode() * 100)
+                payloads[name] = cache.key(payload, "com")
+                cache.put(payloads[name], payload)
+                os.utime(cache._entry_path(payloads[name]), (len(payloads), len(payloads)))
+
+            restored = root / "restored.docx"
+            self.assertFalse(cache.get(payloads["a"], restored))
+            self.assertTrue(cache.get(payloads["c"], restored))
+            self.assertEqual(restored.read_bytes(), b"c" * 100)
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    @unittest.skipIf(os.name == "nt", "fake soffice is a POSIX script")
+    def test_legacy_conversion_is_reused_from_cache(self):
+        with tempfile.TemporaryDirectory(prefix="wfp_conv_cache_test_") as tmpdir:
+            root = Path(tmpdir)
+            fake = root / "soffice"
+            fake.write_text(FAKE_SOFFICE_SCRIPT, encoding="utf-8")
+            fake.chmod(0o755)
+            source = root / "legacy.doc"
+            source_doc = Document()
+            source_doc.add_paragraph("旧格式正文")
+            source_doc.save(source)
+
+            for expected_hits in (0, 1):
+                cache = ConversionCache(root / "cache")
+                processor = WordProcessor(
+                    DEFAULT_CONFIG.copy(), soffice_path=str(fake), conversion_cache=cache
+                )
+                try:
+                    processor.format_document(str(source), str(root / "out.docx"))
+                finally:
+                    processor._cleanup_temp_files()
+                self.assertEqual(cache.hits, expected_hits)
+
+
 class LegacyFormatTests(unittest.TestCase):
     def test_format_document_handles_doc_via_soffice_when_available(self):
         converter = SofficeConverter()
@@ -296,6 +780,505 @@ class EndToEndFormatTests(unittest.TestCase):
                 finally:
                     processor._cleanup_temp_files()
 
+    def test_log_level_gates_per_paragraph_messages(self):
+        with tempfile.TemporaryDirectory(prefix="wfp_log_level_test_") as tmpdir:
+            source = Path(tmpdir) / "source.docx"
+            source_doc = Document()
+            source_doc.add_paragraph("一、标题")
+            source_doc.add_paragraph("正文")
+            source_doc.save(source)
+            output = str(Path(tmpdir) / "out.docx")
+
+            silent = WordProcessor(DEFAULT_CONFIG.copy())
+            silent._preview = None  # Any message construction would call it.
+            silent.format_document(str(source), output)
+
+            summary_lines = []
+            WordProcessor(DEFAULT_CONFIG.copy(), summary_lines.append).format_document(str(source), output)
+            self.assertIn("排版统计：一级标题 1，正文 1。", summary_lines)
+            self.assertFalse([line for line in summary_lines if line.startswith("段落 ")])
+
+            detail_lines = []
+            WordProcessor(
+                DEFAULT_CONFIG.copy(), detail_lines.append, log_level=logging.DEBUG
+            ).format_document(str(source), output)
+            self.assertIn('段落 1: 一级标题 - "一、标题..."', detail_lines)
+            self.assertIn("排版统计：一级标题 1，正文 1。", detail_lines)
+
+    def test_punctuation_precheck_skips_paragraphs_without_candidates(self):
+        with tempfile.TemporaryDirectory(prefix="wfp_symbol_precheck_test_") as tmpdir:
+            source = Path(tmpdir) / "source.docx"
+            source_doc = Document()
+            source_doc.add_paragraph("各部门要高度重视，确保按期完成。")
+            source_doc.add_paragraph("请于5日前报送,逾期通报.")
+            source_doc.add_paragraph("Version 2.0, final")
+            source_doc.add_table(rows=2, cols=2).cell(0, 0).text = "序号（一）"
+            source_doc.save(source)
+            output = Path(tmpdir) / "out.docx"
+
+            for streaming in (False, True):
+                config = dict(DEFAULT_CONFIG, normalize_punctuation=True, streaming_mode=streaming)
+                lines = []
+                processor = WordProcessor(config, lines.append)
+                processor.format_document(str(source), str(output))
+                self.assertEqual(processor.last_symbol_stats, {'skipped': 6, 'scanned': 1})
+                self.assertIn("符号标准化完成，共修复 1 个段落/表格单元格（预检跳过 6 个段落）。", lines)
+                self.assertIn("请于5日前报送，逾期通报。", [p.text for p in Document(output).paragraphs])
+
+    def test_text_fallback_leaves_symbol_normalization_to_paragraph_path(self):
+        config = dict(DEFAULT_CONFIG, normalize_punctuation=True)
+        lines = []
+        processor = WordProcessor(config, lines.append)
+        source_lines = ["请于5日前报送,逾期通报.", "控制\r字符"]
+        with mock.patch.object(processor, "_read_source_text_lines", return_value=source_lines):
+            self.assertIsNone(processor._write_text_document("source.txt"))
+
+        self.assertEqual(lines, ["  > 文本包含控制字符，改用逐段格式化。"])
+        self.assertEqual(processor.last_symbol_stats, {})
+        self.assertEqual(source_lines[0], "请于5日前报送,逾期通报.")
+
+    def test_direct_text_writer_matches_paragraph_formatting(self):
+        sources = {
+            "sample.txt": (
+                "关于开展测试工作的通知\n\n各单位:\n一、总体要求\n"
+                "（一）工作目标。本次\"测试\"的目标.\n(二)组织领导\n1. 第一项\t& <内容>\n"
+                "（1）子项内容\n附件1\n\n测试附件标题\n附件 二：\n一、附件正文\n正文  ABC\t\t123."
+            ),
+            "heading_first.txt": "一、开头\n附件2\n（二）小节\n附件\n\n\n附件3",
+            "sample.md": "# 标题\n\n## 一、总体\n\n- 项目 **粗体**\n1. 步骤\n> 引用 [链接](http://x)",
+        }
+        configs = [
+            {},
+            {"enable_attachment_formatting": True, "normalize_punctuation": True},
+            {"set_outline": False, "use_custom_english_font": True, "english_font": "Arial"},
+        ]
+        with tempfile.TemporaryDirectory(prefix="wfp_direct_text_test_") as tmpdir:
+            root = Path(tmpdir)
+            for name, text in sources.items():
+                source = root / name
+                source.write_text(text, encoding="utf-8")
+                for overrides in configs:
+                    config = DEFAULT_CONFIG.copy()
+                    config.update(overrides)
+                    bodies = []
+                    for direct in (False, True):
+                        processor = WordProcessor(config.copy())
+                        processor.DIRECT_TEXT_WRITER = direct
+                        processor.DIRECT_TEXT_CHUNK_LINES = 3
+                        output = root / f"{source.stem}_{direct}.docx"
+                        try:
+                            processor.format_document(str(source), str(output))
+                            if direct:
+                                self.assertEqual(processor.temp_files, [])
+                        finally:
+                            processor._cleanup_temp_files()
+                        with zipfile.ZipFile(output) as package:
+                            bodies.append(package.read("word/document.xml"))
+                    self.assertEqual(bodies[0], bodies[1], f"{name} {overrides}")
+
+    def test_lxml_engine_matches_python_docx_engine(self):
+        with tempfile.TemporaryDirectory(prefix="wfp_engine_test_") as tmpdir:
+            root = Path(tmpdir)
+            source = root / "source.docx"
+            source_doc = Document()
+            title = source_doc.add_paragraph("关于开展测试工作的通知")
+            title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            subtitle = source_doc.add_paragraph("（2024年1月）")
+            subtitle.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            source_doc.add_paragraph("各单位：")
+            source_doc.add_paragraph("一、总体要求")
+            heading = source_doc.add_paragraph()
+            heading.add_run("(一)工作目标。").bold = True
+            heading.add_run("本次测试的目标")
+            body = source_doc.add_paragraph("  正文第一段")
+            body.paragraph_format.first_line_indent = Pt(-12)
+            body.paragraph_format.keep_with_next = True
+            body.paragraph_format.page_break_before = True
+            body.paragraph_format.line_spacing = 1.5
+            jc = OxmlElement("w:jc")
+            jc.set(qn("w:val"), "start")
+            body._p.get_or_add_pPr().append(jc)
+            source_doc.add_paragraph("1. 第一项")
+            source_doc.add_paragraph("（1）子项内容")
+            source_doc.add_table(rows=2, cols=2).cell(0, 0).text = "表头"
+            source_doc.add_paragraph("附件：1. 测试附件")
+            source_doc.add_paragraph("附件1")
+            source_doc.add_paragraph("测试附件标题")
+            source_doc.add_paragraph("附件正文")
+            source_doc.save(source)
+
+            for overrides in ({}, {"enable_table_formatting": True, "use_custom_english_font": True}):
+                bodies = []
+                for engine in ("python-docx", "lxml"):
+                    config = DEFAULT_CONFIG.copy()
+                    config.update(overrides, format_engine=engine)
+                    output = root / f"{engine}.docx"
+                    processor = WordProcessor(config)
+                    try:
+                        processor.format_document(str(source), str(output))
+                    finally:
+                        processor._cleanup_temp_files()
+                    with zipfile.ZipFile(output) as package:
+                        bodies.append(package.read("word/document.xml"))
+                self.assertEqual(bodies[0], bodies[1], f"{overrides}")
+
+    def test_streaming_mode_matches_in_memory_formatting(self):
+        with tempfile.TemporaryDirectory(prefix="wfp_streaming_test_") as tmpdir:
+            root = Path(tmpdir)
+            source = root / "source.docx"
+            source_doc = Document()
+            title = source_doc.add_paragraph("关于开展测试工作的通知")
+            title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            source_doc.add_paragraph("各单位：")
+            source_doc.add_paragraph("一、总体要求")
+            source_doc.add_paragraph("（一）工作目标。本次测试的目标")
+            source_doc.add_table(rows=2, cols=2).cell(0, 0).text = "表头"
+            caption = source_doc.add_paragraph("表1 测试表")
+            caption.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            source_doc.add_paragraph("正文第一段")
+            source_doc.add_section()
+            source_doc.add_paragraph("正文第二段")
+            source_doc.add_paragraph("附件1")
+            source_doc.add_paragraph("附件说明")
+            attachment_title = source_doc.add_paragraph("测试附件标题")
+            attachment_title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            source_doc.add_paragraph("附件正文")
+            source_doc.save(source)
+
+            config = DEFAULT_CONFIG.copy()
+            config.update(enable_table_formatting=True, normalize_punctuation=True)
+            packages = []
+            for streaming in (False, True):
+                processor = WordProcessor(dict(config, streaming_mode=streaming))
+                processor.STREAM_SEGMENT_BLOCKS = 1
+                output = root / f"streaming_{streaming}.docx"
+                processor.format_document(str(source), str(output))
+                with zipfile.ZipFile(output) as package:
+                    packages.append({name: package.read(name) for name in package.namelist()})
+            self.assertEqual(list(packages[0]), list(packages[1]))
+            for name, data in packages[0].items():
+                self.assertEqual(data, packages[1][name], name)
+
+    def test_raw_copied_members_round_trip_through_testzip(self):
+        with tempfile.TemporaryDirectory(prefix="wfp_raw_copy_test_") as tmpdir:
+            root = Path(tmpdir)
+            source = root / "source.zip"
+            members = {"a.xml": b"<a>" + "正文".encode() * 500 + b"</a>", "b.bin": os.urandom(2048)}
+            with zipfile.ZipFile(source, "w", zipfile.ZIP_DEFLATED) as package:
+                package.writestr("a.xml", members["a.xml"])
+                package.writestr("b.bin", members["b.bin"], compress_type=zipfile.ZIP_STORED)
+
+            for supported in (True, False):
+                target = root / f"target_{supported}.zip"
+                attrs = wfp_core.ZIPFILE_RAW_COPY_ATTRS if supported else ("_no_such_zipfile_internal",)
+                with mock.patch.object(wfp_core, "ZIPFILE_RAW_COPY_ATTRS", attrs):
+                    with zipfile.ZipFile(source) as package, zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as out:
+                        self.assertEqual(wfp_core.zip_raw_copy_supported(out), supported)
+                        for info in package.infolist():
+                            copy_zip_member_raw(package, info, out)
+                        out.writestr("c.txt", b"after")
+                with zipfile.ZipFile(source) as package, zipfile.ZipFile(target) as copied:
+                    self.assertIsNone(copied.testzip())
+                    self.assertEqual(copied.namelist(), ["a.xml", "b.bin", "c.txt"])
+                    for name, data in members.items():
+                        self.assertEqual(copied.read(name), data)
+                    stored = copied.getinfo("b.bin").compress_type
+                    self.assertEqual(stored, zipfile.ZIP_STORED if supported else zipfile.ZIP_DEFLATED)
+                    if supported:
+                        original, raw = package.getinfo("a.xml"), copied.getinfo("a.xml")
+                        self.assertEqual((original.compress_size, original.CRC), (raw.compress_size, raw.CRC))
+
+    def test_save_copies_unchanged_parts_without_recompressing(self):
+        with tempfile.TemporaryDirectory(prefix="wfp_passthrough_test_") as tmpdir:
+            root = Path(tmpdir)
+            generated = root / "generated.docx"
+            source_doc = Document()
+            source_doc.add_paragraph("一、标题")
+            source_doc.add_paragraph("正文")
+            source_doc.save(generated)
+            # Re-pack with a Word-style XML declaration, which python-docx would rewrite on save.
+            source = root / "source.docx"
+            with zipfile.ZipFile(generated) as package, zipfile.ZipFile(source, "w", zipfile.ZIP_DEFLATED) as repacked:
+                for name in package.namelist():
+                    data = package.read(name)
+                    if name == "word/styles.xml":
+                        data = data.replace(b"<?xml version='1.0' encoding='UTF-8' standalone='yes'?>\n",
+                                            b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\r\n')
+                    compression = zipfile.ZIP_STORED if name == "docProps/core.xml" else zipfile.ZIP_DEFLATED
+                    repacked.writestr(name, data, compress_type=compression)
+
+            output = root / "out.docx"
+            WordProcessor(DEFAULT_CONFIG.copy()).format_document(str(source), str(output))
+
+            with zipfile.ZipFile(source) as package, zipfile.ZipFile(output) as formatted:
+                self.assertIsNone(formatted.testzip())
+                for name in ("word/styles.xml", "word/theme/theme1.xml"):
+                    original, copied = package.getinfo(name), formatted.getinfo(name)
+                    self.assertEqual(
+                        (original.compress_type, original.compress_size, original.CRC, original.date_time),
+                        (copied.compress_type, copied.compress_size, copied.CRC, copied.date_time),
+                        name,
+                    )
+                # A stored member in a deflated package is recompressed to the output method.
+                self.assertEqual(package.getinfo("docProps/core.xml").compress_type, zipfile.ZIP_STORED)
+                self.assertEqual(formatted.getinfo("docProps/core.xml").compress_type, zipfile.ZIP_DEFLATED)
+                self.assertEqual(package.read("docProps/core.xml"), formatted.read("docProps/core.xml"))
+                self.assertNotEqual(package.read("word/document.xml"), formatted.read("word/document.xml"))
+            self.assertEqual(Document(output).paragraphs[0].text, "一、标题")
+
+            stored = root / "stored.docx"
+            WordProcessor(dict(DEFAULT_CONFIG, output_compression="store")).format_document(str(source), str(stored))
+            with zipfile.ZipFile(source) as package, zipfile.ZipFile(stored) as formatted:
+                self.assertEqual({info.compress_type for info in formatted.infolist()}, {zipfile.ZIP_STORED})
+                self.assertEqual(package.read("word/styles.xml"), formatted.read("word/styles.xml"))
+
+    def test_format_document_records_phase_timings(self):
+        with tempfile.TemporaryDirectory(prefix="wfp_timings_test_") as tmpdir:
+            root = Path(tmpdir)
+            source = root / "source.docx"
+            source_doc = Document()
+            source_doc.add_paragraph("关于开展测试工作的通知").alignment = WD_ALIGN_PARAGRAPH.CENTER
+            source_doc.add_paragraph("一、总体要求")
+            source_doc.add_table(rows=2, cols=2).cell(0, 0).text = "表头"
+            source_doc.save(source)
+
+            config = DEFAULT_CONFIG.copy()
+            config.update(enable_table_formatting=True, normalize_punctuation=True)
+            for streaming in (False, True):
+                processor = WordProcessor(dict(config, streaming_mode=streaming))
+                self.assertIsNone(processor.last_timings)
+                processor.format_document(str(source), str(root / f"out_{streaming}.docx"))
+                timings = processor.last_timings
+                self.assertEqual(
+                    list(timings),
+                    ["parse", "normalize_symbols", "caption_scan", "title_detection",
+                     "paragraphs", "tables", "page_setup", "save", "total"],
+                )
+                phase_wall = sum(spent["wall"] for name, spent in timings.items() if name != "total")
+                self.assertLessEqual(phase_wall, timings["total"]["wall"] + 1e-5)
+                self.assertTrue(all(spent["wall"] >= 0 and spent["cpu"] >= 0 for spent in timings.values()))
+
+        processor = WordProcessor(config)
+        processor.memory_report = True
+        with tempfile.TemporaryDirectory(prefix="wfp_memory_test_") as tmpdir:
+            source = Path(tmpdir) / "source.docx"
+            source_doc = Document()
+            source_doc.add_paragraph("关于开展测试工作的通知").alignment = WD_ALIGN_PARAGRAPH.CENTER
+            source_doc.add_paragraph("一、总体要求")
+            source_doc.save(source)
+            processor.format_document(str(source), str(Path(tmpdir) / "out.docx"))
+        report = processor.last_memory_report
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(list(report["phases"]), ["parse", "normalize_symbols", "paragraphs", "tables", "page_setup", "save"])
+        self.assertGreater(report["traced_peak"], 0)
+        self.assertEqual(report["traced_peak"], max(phase["traced_peak"] for phase in report["phases"].values()))
+        self.assertTrue(report["top"] and all(site["size"] > 0 for site in report["top"]))
+        if sys.platform.startswith("linux"):
+            self.assertGreater(report["rss_peak"], 0)
+
+        summary = summarize_timings([
+            {"parse": {"wall": float(n), "cpu": 0.0}, "total": {"wall": float(n), "cpu": 0.0}} for n in range(1, 21)
+        ] + [{"save": {"wall": 5.0, "cpu": 1.0}}])
+        self.assertEqual(list(summary), ["parse", "save", "total"])
+        self.assertEqual(summary["parse"]["wall"], {"p50": 10.0, "p95": 19.0, "max": 20.0})
+        self.assertEqual(summary["save"]["cpu"], {"p50": 0.0, "p95": 0.0, "max": 1.0})
+
+
+class BenchTests(unittest.TestCase):
+    def test_corpus_is_deterministic_and_follows_spec(self):
+        spec = wfp_bench.CorpusSpec(paragraphs=12, h1=2, h2=3, h3=2, h4=2, attachments=2, tables=1, images=1)
+        with tempfile.TemporaryDirectory(prefix="wfp_bench_corpus_test_") as tmpdir:
+            root = Path(tmpdir)
+            first = wfp_bench.generate_corpus(root / "first", spec, seed=7)
+            second = wfp_bench.generate_corpus(root / "second", spec, seed=7)
+            other = wfp_bench.generate_corpus(root / "other", spec, seed=8)
+
+            self.assertEqual([p.name for p in first], ["bench_001.docx", "bench_001.txt", "bench_001.md"])
+            for a, b in zip(first[1:], second[1:]):
+                self.assertEqual(a.read_bytes(), b.read_bytes())
+            with zipfile.ZipFile(first[0]) as a, zipfile.ZipFile(second[0]) as b:
+                self.assertEqual(a.read("word/document.xml"), b.read("word/document.xml"))
+            self.assertNotEqual(first[1].read_text(encoding="utf-8"), other[1].read_text(encoding="utf-8"))
+
+            lines = first[1].read_text(encoding="utf-8").splitlines()
+            self.assertEqual(sum(line.startswith(("一、", "二、")) for line in lines), 2)
+            self.assertEqual(sum(line in ("附件1", "附件2") for line in lines), 2)
+            doc = Document(str(first[0]))
+            self.assertEqual(len(doc.tables), 1)
+            self.assertEqual(len(doc.inline_shapes), 1)
+        self.assertEqual(
+            [wfp_bench.chinese_number(n) for n in (3, 10, 15, 20, 101, 1010)],
+            ["三", "十", "十五", "二十", "一百零一", "一千零一十"],
+        )
+
+    def test_benchmark_results_compare_against_baseline(self):
+        spec = wfp_bench.CorpusSpec(paragraphs=5, h2=1, h3=1, h4=1, attachments=1, tables=1, images=1, formats=("docx", "md"))
+        with tempfile.TemporaryDirectory(prefix="wfp_bench_run_test_") as tmpdir:
+            paths = wfp_bench.generate_corpus(tmpdir, spec)
+            results = wfp_bench.run_benchmark(paths, DEFAULT_CONFIG.copy(), repeat=1, warmup=0)
+        self.assertEqual(list(results["documents"]), ["bench_001.docx", "bench_001.md"])
+        self.assertIn("paragraphs", results["documents"]["bench_001.docx"])
+        self.assertGreater(results["documents"]["bench_001.docx"]["total"]["wall"], 0)
+
+        baseline = {"documents": {"a.docx": {"total": {"wall": 1.0, "cpu": 1.0}, "parse": {"wall": 0.001, "cpu": 0.001}}}}
+        current = {"documents": {
+            "a.docx": {"total": {"wall": 1.3, "cpu": 1.0}, "parse": {"wall": 0.003, "cpu": 0.003}},
+            "new.docx": {"total": {"wall": 9.0, "cpu": 9.0}},
+        }}
+        self.assertEqual(wfp_bench.compare_results(current, baseline), [("a.docx", "total", 1.0, 1.3)])
+        self.assertEqual(wfp_bench.compare_results(current, baseline, threshold=0.5), [])
+        self.assertEqual(wfp_bench.compare_results(current, baseline, clock="cpu"), [])
+
+
+class StartupTests(unittest.TestCase):
+    # Cumulative import time of wfp_cli (python -X importtime), best of three
+    # runs. About 0.05 s without wfp_core and 0.25 s with it.
+    IMPORT_BUDGET_SECONDS = 0.15
+    HEAVY_MODULES = ("wfp_core", "docx", "lxml")
+
+    def _run_python(self, code, *options):
+        return subprocess.run(
+            [sys.executable, *options, "-c", code],
+            cwd=str(Path(wfp_cli.__file__).resolve().parent),
+            capture_output=True, text=True, encoding="utf-8", check=True,
+        )
+
+    def test_light_commands_do_not_import_formatting_engine(self):
+        code = (
+            "import contextlib, io, sys, wfp_cli\n"
+            "with contextlib.redirect_stdout(io.StringIO()):\n"
+            "    for argv in (['show-config'], ['install-help']):\n"
+            "        wfp_cli.main(argv)\n"
+            f"print(sorted(m for m in {self.HEAVY_MODULES!r} if m in sys.modules))"
+        )
+        self.assertEqual(self._run_python(code).stdout.strip(), "[]")
+
+    def test_cli_import_time_within_budget(self):
+        best = None
+        for _ in range(3):
+            stderr = self._run_python("import wfp_cli", "-X", "importtime").stderr
+            line = next(line for line in stderr.splitlines() if line.rstrip().endswith("| wfp_cli"))
+            seconds = int(line.split("|")[1]) / 1e6
+            best = seconds if best is None else min(best, seconds)
+        self.assertLess(best, self.IMPORT_BUDGET_SECONDS)
+
+
+class CliBatchTests(unittest.TestCase):
+    def _run_cli(self, argv):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            code = wfp_cli.main(argv)
+        return code, stdout.getvalue().splitlines(), stderr.getvalue()
+
+    def test_parallel_jobs_keep_stdout_contract_in_input_order(self):
+        with tempfile.TemporaryDirectory(prefix="wfp_cli_jobs_test_") as tmpdir:
+            root = Path(tmpdir)
+            source_dir = root / "inputs"
+            source_dir.mkdir()
+            for name in ("a", "b", "c"):
+                (source_dir / f"{name}.txt").write_text(f"{name}标题\n\n正文", encoding="utf-8")
+            (source_dir / "broken.docx").write_bytes(b"not a zip")
+
+            code, lines, stderr = self._run_cli(
+                ["format", str(source_dir), "-o", str(root / "out"), "--jobs", "2", "--ordered"]
+            )
+
+            self.assertEqual(code, 1)
+            expected = [str((root / "out" / f"{name}_formatted.docx").resolve()) for name in ("a", "b", "c")]
+            self.assertEqual(lines, expected)
+            self.assertIn("broken.docx", stderr)
+            self.assertIn("1 个文件失败", stderr)
+
+    def test_incremental_manifest_skips_unchanged_inputs(self):
+        with tempfile.TemporaryDirectory(prefix="wfp_cli_incremental_test_") as tmpdir:
+            root = Path(tmpdir)
+            source_dir = root / "inputs"
+            source_dir.mkdir()
+            (source_dir / "a.txt").write_text("甲标题\n正文", encoding="utf-8")
+            (source_dir / "b.txt").write_text("乙标题\n正文", encoding="utf-8")
+            manifest = root / "manifest.json"
+            base = ["format", str(source_dir), "-o", str(root / "out"), "--incremental", str(manifest)]
+
+            code, lines, stderr = self._run_cli(base)
+            self.assertEqual((code, len(lines)), (0, 2))
+            self.assertIn("0 个文件未变化已跳过，2 个文件需要处理", stderr)
+
+            (source_dir / "b.txt").write_text("乙标题\n新正文", encoding="utf-8")
+            code, lines, stderr = self._run_cli(base)
+            self.assertEqual((code, len(lines)), (0, 2))
+            self.assertIn("1 个文件未变化已跳过，1 个文件需要处理", stderr)
+
+            _code, _lines, stderr = self._run_cli(base + ["--set", "body_size=12"])
+            self.assertIn("0 个文件未变化已跳过，2 个文件需要处理", stderr)
+
+            _code, _lines, stderr = self._run_cli(base + ["--set", "body_size=12", "--force"])
+            self.assertIn("0 个文件未变化已跳过，2 个文件需要处理", stderr)
+
+    def test_timings_flag_reports_json_lines_and_summary(self):
+        with tempfile.TemporaryDirectory(prefix="wfp_cli_timings_test_") as tmpdir:
+            root = Path(tmpdir)
+            for name in ("a", "b"):
+                (root / f"{name}.txt").write_text(f"{name}标题\n正文", encoding="utf-8")
+
+            code, lines, stderr = self._run_cli(["format", str(root), "-o", str(root / "out"), "--timings"])
+
+            self.assertEqual((code, len(lines)), (0, 2))
+            reports = [json.loads(line) for line in stderr.splitlines() if line.startswith("{")]
+            self.assertEqual(sorted(Path(r["source"]).name for r in reports), ["a.txt", "b.txt"])
+            self.assertIn("save", reports[0]["timings"])
+            self.assertIn("阶段耗时汇总（2 个文件", stderr)
+            self.assertRegex(stderr, r"total\s+p50 \d+\.\d{3}/\d+\.\d{3}")
+
+    def test_profile_writes_prof_per_job_and_batch_trace(self):
+        with tempfile.TemporaryDirectory(prefix="wfp_cli_profile_test_") as tmpdir:
+            root = Path(tmpdir)
+            (root / "a.txt").write_text("甲标题\n正文", encoding="utf-8")
+            (root / "b.md").write_text("# 乙标题\n\n正文", encoding="utf-8")
+            profile_dir = root / "profile"
+
+            code, lines, _stderr = self._run_cli(
+                ["format", str(root / "a.txt"), str(root / "b.md"), "-o", str(root / "out"),
+                 "--profile", str(profile_dir), "--profile-trace"]
+            )
+
+            self.assertEqual((code, len(lines)), (0, 2))
+            self.assertEqual(sorted(p.name for p in profile_dir.iterdir()), ["0001-a.prof", "0002-b.prof", "trace.json"])
+            stats = pstats.Stats(str(profile_dir / "0001-a.prof"))
+            self.assertTrue(any(func[2] == "format_document" for func in stats.stats))
+            events = json.loads((profile_dir / "trace.json").read_text(encoding="utf-8"))["traceEvents"]
+            spans = [event for event in events if event["ph"] == "X"]
+            names = [event["name"] for event in spans]
+            self.assertIn("batch", names)
+            self.assertIn("a.txt", names)
+            self.assertIn("save", names)
+            job = next(event for event in spans if event["name"] == "b.md")
+            save = next(event for event in spans if event["name"] == "save" and event["ts"] >= job["ts"])
+            self.assertLessEqual(save["ts"] + save["dur"], job["ts"] + job["dur"] + 1)
+
+            code, _lines, stderr = self._run_cli(["format", str(root / "a.txt"), "-o", str(root / "out"), "--profile-trace"])
+            self.assertEqual(code, 1)
+            self.assertIn("--profile DIR", stderr)
+
+    def test_memory_report_prints_json_lines_and_peak_summary(self):
+        with tempfile.TemporaryDirectory(prefix="wfp_cli_memory_test_") as tmpdir:
+            root = Path(tmpdir)
+            (root / "a.txt").write_text("甲标题\n正文", encoding="utf-8")
+
+            code, lines, stderr = self._run_cli(["format", str(root / "a.txt"), "-o", str(root / "out"), "--memory-report"])
+
+            self.assertEqual((code, len(lines)), (0, 1))
+            report = json.loads(next(line for line in stderr.splitlines() if line.startswith("{")))
+            self.assertEqual(Path(report["source"]).name, "a.txt")
+            self.assertIn("save", report["memory"]["phases"])
+            self.assertIn("内存峰值汇总（1 个文件）", stderr)
+            self.assertIn("Python 堆峰值: p50", stderr)
+
+    def test_in_input_order_releases_results_as_soon_as_possible(self):
+        results = [wfp_cli.JobResult(index, Path(str(index)), "ok") for index in (2, 1, 4, 3)]
+        self.assertEqual([r.index for r in wfp_cli.in_input_order(results)], [1, 2, 3, 4])
+        self.assertEqual(wfp_cli.resolve_job_count(8, 3), 3)
+        self.assertEqual(wfp_cli.resolve_job_count(1, 100), 1)
+
 
 def main(argv=None):
     suite = unittest.defaultTestLoader.loadTestsFromModule(__import__(__name__))